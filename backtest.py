@@ -0,0 +1,338 @@
+# -----------------------------------------------------------------------------
+# backtest.py - اختبار الاستراتيجيات الأربع على بيانات تاريخية محلية (حساب متجه)
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import inspect
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+# ترتيب أعمدة ملفات Binance الخام (data.binance.vision) التي لا تحتوي على عناوين
+BINANCE_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+                   'quote_av', 'trades', 'tb_base_av', 'tb_quote_av', 'ignore']
+DEFAULT_FEE = 0.001   # عمولة كل جهة (0.1%)
+
+
+# --- تحميل البيانات ---
+def _read_table(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)   # يتطلب pyarrow أو fastparquet
+    df = pd.read_csv(path)
+    if 'open' not in df.columns:
+        df = pd.read_csv(path, header=None, names=BINANCE_COLUMNS)
+    return df
+
+
+def _normalize(df):
+    time_column = 'open_time' if 'open_time' in df.columns else 'timestamp'
+    times = df[time_column]
+    if not np.issubdtype(times.dtype, np.number):
+        times = pd.to_datetime(times, utc=True).astype('int64') // 10 ** 6
+    out = pd.DataFrame({f: pd.to_numeric(df[f], errors='coerce') for f in FIELDS})
+    out.index = times.astype('int64').values
+    out.index.name = 'open_time'
+    return out[~out.index.duplicated(keep='last')].sort_index()
+
+
+def load_history(path, symbols=None):
+    """
+    يحمّل الشموع من ملف CSV/Parquet واحد فيه عمود symbol، أو من مجلد فيه ملف لكل
+    عملة (BTCUSDT.csv / BTCUSDT.parquet). تُرجع لوحة {الحقل: DataFrame (الوقت × العملات)}
+    بحيث تُحسب المؤشرات لكل العملات في تمريرة واحدة.
+    """
+    frames = {}
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            symbol, ext = os.path.splitext(name)
+            if ext not in ('.csv', '.parquet') or (symbols and symbol not in symbols):
+                continue
+            frames[symbol] = _normalize(_read_table(os.path.join(path, name)))
+    else:
+        table = _read_table(path)
+        for symbol, df in table.groupby('symbol'):
+            if not symbols or symbol in symbols:
+                frames[symbol] = _normalize(df)
+    if not frames:
+        raise ValueError(f"لا توجد بيانات صالحة في {path}")
+    return {f: pd.DataFrame({s: df[f] for s, df in frames.items()}).sort_index() for f in FIELDS}
+
+
+def synthetic_history(symbols=300, candles=24 * 365 * 2, interval_ms=3_600_000, seed=7):
+    """بيانات عشوائية (مسار سعري لوغاريتمي مع قفزات حجم) لقياس الأداء دون ملفات."""
+    rng = np.random.default_rng(seed)
+    names = [f"SYM{i:04d}USDT" for i in range(symbols)]
+    returns = rng.normal(0, 0.01, (candles, symbols))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+    open_ = np.vstack([close[:1], close[:-1]]) * (1 + rng.normal(0, 0.001, (candles, symbols)))
+    spread = np.abs(rng.normal(0, 0.006, (candles, symbols)))
+    volume = rng.lognormal(10, 0.5, (candles, symbols))
+    spikes = rng.random((candles, symbols)) < 0.002
+    volume[spikes] *= 20
+    close[spikes] = open_[spikes] * 1.05
+    index = pd.Index(np.arange(candles, dtype=np.int64) * interval_ms, name='open_time')
+    arrays = {'open': open_, 'high': np.maximum(open_, close) * (1 + spread),
+              'low': np.minimum(open_, close) * (1 - spread), 'close': close, 'volume': volume}
+    return {f: pd.DataFrame(a, index=index, columns=names) for f, a in arrays.items()}
+
+
+# --- المؤشرات والإشارات لكل استراتيجية ---
+# القيم الافتراضية منسوخة من ثوابت كل بوت. المتوسطات الأسية تُحسب على كامل السلسلة
+# بدل نافذة الـ 100 شمعة في البوت، والفرق يتلاشى بعد فترة الإحماء.
+def _wilder_rsi(close, period):
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).ewm(alpha=1 / period, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1 / period, adjust=False).mean()
+    return 100 - (100 / (1 + gain / loss.replace(0, 1e-10)))
+
+
+def hybrid_indicators(panel, rsi_period=14, volume_window=100):
+    """bot.py: RSI (Wilder) + EMA9/EMA25 + MACD ومتوسط حجم نافذة الجلب."""
+    close = panel['close']
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    return {
+        'RSI': _wilder_rsi(close, rsi_period),
+        'EMA9': close.ewm(span=9, adjust=False).mean(),
+        'EMA25': close.ewm(span=25, adjust=False).mean(),
+        'MACD': macd,
+        'Signal': macd.ewm(span=9, adjust=False).mean(),
+        'VolMean': panel['volume'].rolling(volume_window, min_periods=50).mean(),
+    }
+
+
+def hybrid_signals(panel, ind, rsi_oversold=30, rsi_overbought=70, volume_factor=1.5):
+    buy = ((ind['RSI'] < rsi_oversold) & (ind['MACD'] > ind['Signal']) & (ind['EMA9'] > ind['EMA25'])
+           & (panel['volume'] > ind['VolMean'] * volume_factor))
+    sell = (ind['RSI'] > rsi_overbought) & (ind['MACD'] < ind['Signal']) & (ind['EMA9'] < ind['EMA25'])
+    return buy, sell
+
+
+def mtfa_indicators(panel, rsi_period=6, stoch_window=14, volume_window=20):
+    """ccxt_bot.py: ترتيب EMA7/25/99 + RSI6 + StochRSI + متوسط حجم 20."""
+    close = panel['close']
+    rsi = _wilder_rsi(close, rsi_period)
+    rsi_min = rsi.rolling(stoch_window).min()
+    rsi_max = rsi.rolling(stoch_window).max()
+    return {
+        'EMA7': close.ewm(span=7, adjust=False).mean(),
+        'EMA25': close.ewm(span=25, adjust=False).mean(),
+        'EMA99': close.ewm(span=99, adjust=False).mean(),
+        'RSI6': rsi,
+        'StochRSI': (rsi - rsi_min) / (rsi_max - rsi_min),
+        'VolMA': panel['volume'].rolling(volume_window).mean(),
+    }
+
+
+def mtfa_signals(panel, ind, rsi_min=60, rsi_max=80, stoch_min=0.4, stoch_max=0.6, stoch_exit=0.8):
+    close, open_ = panel['close'], panel['open']
+    buy = ((close > ind['EMA7']) & (ind['EMA7'] > ind['EMA25']) & (ind['EMA25'] > ind['EMA99'])
+           & (ind['RSI6'] >= rsi_min) & (ind['RSI6'] <= rsi_max)
+           & (ind['StochRSI'] >= stoch_min) & (ind['StochRSI'] <= stoch_max)
+           & (panel['volume'] > ind['VolMA']) & (close > open_))
+    sell = ((ind['RSI6'] > rsi_max) | (ind['StochRSI'] > stoch_exit)) & (close < open_)
+    return buy, sell
+
+
+def engulfing_indicators(panel, rsi_period=14):
+    """bot_bingx.py: RSI بمتوسط بسيط متحرك."""
+    delta = panel['close'].diff()
+    gain = delta.where(delta > 0, 0).rolling(rsi_period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(rsi_period).mean()
+    return {'RSI': 100 - (100 / (1 + gain / loss.replace(0, 1e-10)))}
+
+
+def engulfing_signals(panel, ind, rsi_oversold=30, rsi_overbought=70):
+    close, open_ = panel['close'], panel['open']
+    prev_close, prev_open = close.shift(1), open_.shift(1)
+    engulfing = (close > open_) & (prev_close < prev_open) & (close > prev_open) & (open_ < prev_close)
+    return (ind['RSI'] < rsi_oversold) & engulfing, ind['RSI'] > rsi_overbought
+
+
+def explosion_indicators(panel, lookback=50):
+    """sniper_bot.py: متوسط حجم الشموع السابقة (51 شمعة = 50 سابقة + الحالية)."""
+    return {'VolAvg': panel['volume'].shift(1).rolling(lookback).mean()}
+
+
+def explosion_signals(panel, ind, volume_multiplier=10, price_change_threshold=3.0):
+    price_change = (panel['close'] / panel['open'] - 1) * 100
+    buy = ((ind['VolAvg'] != 0) & (panel['volume'] > ind['VolAvg'] * volume_multiplier)
+           & (price_change >= price_change_threshold))
+    return buy, pd.DataFrame(False, index=buy.index, columns=buy.columns)
+
+
+# exit: 'signal' = الخروج عند إشارة SELL كما في البوت، 'bracket' = هدف ووقف خسارة ثابتان
+STRATEGIES = {
+    'hybrid':    {'indicators': hybrid_indicators, 'signals': hybrid_signals, 'exit': 'signal', 'warmup': 50},
+    'mtfa':      {'indicators': mtfa_indicators, 'signals': mtfa_signals, 'exit': 'signal', 'warmup': 100},
+    'engulfing': {'indicators': engulfing_indicators, 'signals': engulfing_signals, 'exit': 'signal', 'warmup': 16},
+    'explosion': {'indicators': explosion_indicators, 'signals': explosion_signals, 'exit': 'bracket', 'warmup': 51},
+}
+BRACKET_DEFAULTS = {'take_profit': 0.15, 'stop_loss': 0.05}
+
+
+# --- محاكاة الصفقات ---
+def simulate_signal_exits(buy, sell, close):
+    """
+    مثل bought_coins في البوت: BUY يفتح مركزاً إن لم يكن مفتوحاً، وSELL يغلقه إن كان مفتوحاً.
+    آخر حدث (BUY/SELL) قبل كل شمعة يحدد حالة المركز، فتُحسب لكل العملات بـ ffill واحد.
+    المراكز المفتوحة في النهاية تُغلق على آخر سعر.
+    """
+    events = pd.DataFrame(np.where(buy.values, 1.0, np.where(sell.values, -1.0, np.nan)),
+                          index=buy.index, columns=buy.columns)
+    position = (events.ffill().values == 1)
+    # صف إضافي مغلق في النهاية حتى يكون لكل دخول خروج مقابل
+    padded = np.vstack([np.zeros((1, position.shape[1]), bool), position, np.zeros((1, position.shape[1]), bool)])
+    # التبديل (.T) يرتب النتائج حسب العملة ثم الزمن، فيتقابل كل دخول مع خروجه بالترتيب
+    entry_cols, entry_rows = np.nonzero((padded[1:-1] & ~padded[:-2]).T)
+    exit_cols, exit_rows = np.nonzero((~padded[2:] & padded[1:-1]).T)
+    # الخروج عند إشارة SELL يكون على الشمعة التالية لآخر شمعة في المركز
+    last = len(close) - 1
+    exit_at = np.minimum(exit_rows + 1, last)
+    prices = close.ffill().values
+    return pd.DataFrame({
+        'symbol': close.columns.values[entry_cols],
+        'entry_time': close.index.values[entry_rows],
+        'exit_time': close.index.values[exit_at],
+        'entry_price': prices[entry_rows, entry_cols],
+        'exit_price': prices[exit_at, exit_cols],
+        'reason': np.where(exit_rows + 1 > last, 'end', 'signal'),
+    })
+
+
+def simulate_bracket(buy, high, low, close, take_profit=0.15, stop_loss=0.05):
+    """
+    مثل open_position في sniper_bot: هدف +15% ووقف -5% من سعر الدخول، تُفحص على قمة
+    وقاع كل شمعة لاحقة. إن لمست الشمعة الاثنين نفترض الوقف أولاً (الحالة الأسوأ).
+    لا دخول جديد للعملة قبل إغلاق مركزها.
+    """
+    records = []
+    highs, lows, closes = high.values, low.values, close.ffill().values
+    for col in np.flatnonzero(buy.values.any(axis=0)):
+        signals = np.flatnonzero(buy.values[:, col])
+        h, l, c = highs[:, col], lows[:, col], closes[:, col]
+        i = signals[0]
+        while True:
+            entry = c[i]
+            target, stop = entry * (1 + take_profit), entry * (1 - stop_loss)
+            stop_hit = l[i + 1:] <= stop
+            hit = stop_hit | (h[i + 1:] >= target)
+            if hit.any():
+                j = i + 1 + int(np.argmax(hit))
+                reason = 'stop_loss' if stop_hit[j - i - 1] else 'target'
+                price = stop if reason == 'stop_loss' else target
+            else:
+                j, reason, price = len(c) - 1, 'end', c[-1]
+            records.append((buy.columns[col], buy.index[i], buy.index[j], entry, price, reason))
+            k = np.searchsorted(signals, j, side='right')
+            if k >= len(signals):
+                break
+            i = signals[k]
+    return pd.DataFrame(records, columns=['symbol', 'entry_time', 'exit_time', 'entry_price', 'exit_price', 'reason'])
+
+
+def split_params(func, params):
+    names = set(inspect.signature(func).parameters)
+    return {k: v for k, v in params.items() if k in names}
+
+
+def strategy_params(strategy):
+    """أسماء المعاملات التي تقبلها الاستراتيجية (مؤشرات، عتبات، وحدود الخروج للـ bracket)."""
+    spec = STRATEGIES[strategy]
+    funcs = [spec['indicators'], spec['signals']] + ([simulate_bracket] if spec['exit'] == 'bracket' else [])
+    names = set()
+    for func in funcs:
+        names.update(name for name, p in inspect.signature(func).parameters.items() if p.default is not p.empty)
+    return names
+
+
+def run_backtest(panel, strategy, fee=DEFAULT_FEE, indicators=None, **params):
+    """
+    يحسب إشارات الاستراتيجية لكل العملات والشموع دفعة واحدة ثم يحاكي الصفقات.
+    indicators: مؤشرات محسوبة مسبقاً (لإعادة استخدامها عند تغيير العتبات فقط).
+    تُرجع جدول الصفقات مع عمود return بعد العمولة.
+    """
+    spec = STRATEGIES[strategy]
+    if indicators is None:
+        indicators = spec['indicators'](panel, **split_params(spec['indicators'], params))
+    buy, sell = spec['signals'](panel, indicators, **split_params(spec['signals'], params))
+    warm = panel['close'].notna().cumsum().values >= spec['warmup']
+    buy, sell = buy & warm, sell & warm
+    if spec['exit'] == 'bracket':
+        bracket = dict(BRACKET_DEFAULTS, **split_params(simulate_bracket, params))
+        trades = simulate_bracket(buy, panel['high'], panel['low'], panel['close'], **bracket)
+    else:
+        trades = simulate_signal_exits(buy, sell, panel['close'])
+    trades['return'] = trades['exit_price'] * (1 - fee) / (trades['entry_price'] * (1 + fee)) - 1
+    return trades
+
+
+def summarize(trades):
+    """الربح بحصة ثابتة لكل صفقة: المجموع، نسبة الصفقات الرابحة، وأقصى تراجع لمنحنى الرصيد."""
+    if trades.empty:
+        return {'trades': 0, 'hit_rate': 0.0, 'total_return': 0.0, 'avg_return': 0.0, 'max_drawdown': 0.0}
+    returns = trades.sort_values('exit_time')['return'].values
+    equity = np.cumsum(returns)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    return {
+        'trades': len(returns),
+        'hit_rate': float((returns > 0).mean()),
+        'total_return': float(equity[-1]),
+        'avg_return': float(returns.mean()),
+        'max_drawdown': float(drawdown.max()),
+    }
+
+
+def _format_row(name, stats):
+    return (f"{name:<12} {stats['trades']:>7} {stats['hit_rate'] * 100:>8.1f}% "
+            f"{stats['total_return'] * 100:>10.1f}% {stats['avg_return'] * 100:>8.2f}% "
+            f"{stats['max_drawdown'] * 100:>9.1f}%")
+
+
+def parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            continue
+    return text
+
+
+# --- واجهة سطر الأوامر ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="اختبار الاستراتيجيات على بيانات تاريخية")
+    parser.add_argument('path', nargs='?', help="ملف CSV/Parquet أو مجلد بملف لكل عملة")
+    parser.add_argument('--strategy', choices=['all'] + list(STRATEGIES), default='all')
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE)
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="تعديل معامل، مثل --set rsi_oversold=25 --set take_profit=0.1")
+    parser.add_argument('--per-symbol', action='store_true', help="عرض أفضل وأسوأ العملات")
+    parser.add_argument('--synthetic', type=int, metavar='SYMBOLS',
+                        help="بيانات عشوائية لسنتين من شموع الساعة بدل الملف (لقياس الأداء)")
+    args = parser.parse_args()
+    if not args.path and not args.synthetic:
+        parser.error("حدد مسار البيانات أو --synthetic")
+
+    start = time.perf_counter()
+    panel = synthetic_history(args.synthetic) if args.synthetic else load_history(args.path)
+    rows, symbols = panel['close'].shape
+    print(f"تم تحميل {symbols} عملة × {rows} شمعة في {time.perf_counter() - start:.2f} ث\n")
+
+    params = dict(item.split('=', 1) for item in args.set)
+    params = {k: parse_value(v) for k, v in params.items()}
+    names = list(STRATEGIES) if args.strategy == 'all' else [args.strategy]
+    print(f"{'strategy':<12} {'trades':>7} {'hit':>9} {'pnl':>11} {'avg':>9} {'max_dd':>10}   time")
+    for name in names:
+        start = time.perf_counter()
+        trades = run_backtest(panel, name, fee=args.fee, **params)
+        elapsed = time.perf_counter() - start
+        print(f"{_format_row(name, summarize(trades))}   {elapsed:.2f}s")
+        if args.per_symbol and not trades.empty:
+            by_symbol = trades.groupby('symbol')['return'].sum().sort_values()
+            print("   الأسوأ:", ", ".join(f"{s} {r * 100:.1f}%" for s, r in by_symbol.head(3).items()))
+            print("   الأفضل:", ", ".join(f"{s} {r * 100:.1f}%" for s, r in by_symbol.tail(3).items()))
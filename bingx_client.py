@@ -0,0 +1,158 @@
+# -----------------------------------------------------------------------------
+# bingx_client.py - عميل BingX غير متزامن (اتصالات دائمة + توقيع HMAC)
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import hmac
+import random
+import hashlib
+import logging
+import asyncio
+from urllib.parse import urlencode
+import aiohttp
+from metrics import METRICS
+from weight_governor import get_governor, HIGH, NORMAL, LOW
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BINGX_BASE_URL = os.environ.get("BINGX_BASE_URL", "https://open-api.bingx.com")
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TIMEOUT_SECONDS = 10
+DEFAULT_RETRIES = 3
+KEEPALIVE_SECONDS = 30
+RETRY_BASE_DELAY = 0.3
+
+
+class BingXError(Exception):
+    """خطأ منطقي من BingX (code != 0 في جسم الاستجابة)."""
+
+    def __init__(self, code, msg):
+        super().__init__(f"BingX error {code}: {msg}")
+        self.code = code
+
+
+class BingXClient:
+    """
+    جلسة aiohttp واحدة بمجمع اتصالات دائمة (keep-alive) وحد للتزامن،
+    مع إعادة المحاولة بتأخير عشوائي (jitter) على أخطاء 5xx والمهلات،
+    وتوقيع HMAC-SHA256 لنقاط الحساب الخاصة.
+    """
+
+    exchange = 'bingx'
+
+    def __init__(self, api_key=None, api_secret=None, base_url=BINGX_BASE_URL,
+                 concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 retries=DEFAULT_RETRIES, governor=None):
+        self.api_key = api_key
+        self.governor = governor or get_governor(self.exchange)
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+        self._semaphore = None
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=KEEPALIVE_SECONDS)
+            headers = {"X-BX-APIKEY": self.api_key} if self.api_key else {}
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def sign(self, params):
+        """يضيف timestamp و signature (HMAC-SHA256 لسلسلة الاستعلام بنفس ترتيب الإرسال)."""
+        if not self.api_secret:
+            raise BingXError(-1, "BINGX_SECRET_KEY غير مضبوط")
+        params = dict(params or {}, timestamp=int(time.time() * 1000))
+        query = urlencode(params)
+        signature = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def request(self, method, path, params=None, signed=False, priority=NORMAL):
+        session = await self._get_session()
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                await self.governor.acquire(1, priority)
+                # التوقيع يُعاد لكل محاولة (وبعد انتظار الميزانية) لأن timestamp يجب أن يكون حديثاً
+                query = self.sign(params) if signed else urlencode(params or {})
+                url = f"{self.base_url}{path}?{query}" if query else f"{self.base_url}{path}"
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    async with session.request(method, url,
+                                               timeout=aiohttp.ClientTimeout(total=self.timeout)) as r:
+                        METRICS.add_weight(self.exchange, path)
+                        await self.governor.observe(r.status, r.headers)
+                        r.raise_for_status()
+                        payload = await r.json(content_type=None)
+                    METRICS.observe_latency(self.exchange, time.perf_counter() - start)
+                if payload.get("code", 0) != 0:
+                    METRICS.count_error(self.exchange)
+                    raise BingXError(payload.get("code"), payload.get("msg", ""))
+                return payload.get("data")
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                last_error = e
+                METRICS.count_error(self.exchange)
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+                METRICS.count_error(self.exchange)
+                if e.status < 500 and e.status != 429:
+                    break
+            if attempt < self.retries:
+                await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+        raise last_error
+
+    # --- بيانات السوق (عامة) ---
+    async def symbols(self):
+        data = await self.request("GET", "/openApi/spot/v1/common/symbols", priority=LOW) or {}
+        return data.get("symbols", [])
+
+    async def tickers(self):
+        return await self.request("GET", "/openApi/spot/v1/market/ticker", priority=LOW) or []
+
+    async def prices(self, symbols):
+        """أسعار عدة عملات من طلب ticker واحد (نفس واجهة FetchEngine.prices)، بأولوية عالية."""
+        wanted = set(symbols)
+        if not wanted:
+            return {}
+        tickers = await self.request("GET", "/openApi/spot/v1/market/ticker", priority=HIGH) or []
+        return {t['symbol']: float(t['lastPrice']) for t in tickers if t['symbol'] in wanted}
+
+    async def top_usdt_pairs(self, limit=150):
+        usdt_pairs = [t for t in await self.tickers() if t['symbol'].endswith("USDT")]
+        return [p['symbol'] for p in sorted(usdt_pairs, key=lambda x: float(x.get('quoteVolume', 0)), reverse=True)[:limit]]
+
+    async def klines(self, symbol, interval, limit, start_time=None):
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        data = await self.request("GET", "/openApi/spot/v1/market/kline", params) or []
+        # الترتيب تصاعدي حسب وقت الفتح كما تتوقعه ذاكرة الشموع ودوال التحليل
+        return sorted(data, key=lambda k: int(k[0]))
+
+    async def klines_many(self, symbols, interval, limit, cache=None):
+        async def fetch_one(symbol):
+            try:
+                if cache is not None:
+                    return symbol, await cache.fetch((self.exchange, symbol, interval), limit, self.klines)
+                return symbol, await self.klines(symbol, interval, limit)
+            except Exception as e:
+                logger.error(f"[BingX] فشل في جلب الشموع لـ {symbol}: {e}")
+                return symbol, None
+
+        results = await asyncio.gather(*(fetch_one(s) for s in symbols))
+        return dict(results)
+
+    # --- الحساب (طلبات موقعة) ---
+    async def balances(self):
+        data = await self.request("GET", "/openApi/spot/v1/account/balance", signed=True) or {}
+        return data.get("balances", [])
@@ -5,33 +5,48 @@
 import os
 import logging
 import asyncio
-from threading import Thread
-from flask import Flask
+import threading
+from collections import deque
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-from binance.client import Client
-import pandas as pd
-import requests
+from fetch_engine import FetchEngine
+from indicators import IndicatorState
+from kline_parser import closed_rows, parse_klines
+from kline_cache import KlineCache
+from telegram_dispatcher import TelegramDispatcher
+from metrics import METRICS
+from health_server import HEALTH, READY, start_health_server
+from symbol_universe import SymbolUniverse, binance_sources
+from scheduler import schedule_aligned, select_batch
+from news_watcher import NewsWatcher, coinmarketcal_source, binance_announcements_source
+from position_store import open_book
+from market_snapshot import register_snapshot, register_commands, listed_in
 
 # --- إعدادات التسجيل ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- 1. إعداد خادم الويب ---
-app = Flask(__name__)
-@app.route('/')
-def health_check():
-    return "Falcon Bot Service (Binance - Hybrid Sniper v7.1) is Running!", 200
+# --- 1. خادم الصحة ---
 def run_server():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host='0.0.0.0', port=port)
+    # مكتبة قياسية فقط: المنفذ يُربط فوراً ويُبلغ /ready بالجاهزية بعد تهيئة الخدمات
+    start_health_server(int(os.environ.get("PORT", 10000)))
 
 # --- 2. إعدادات الاستراتيجية ---
+BOT_NAME = "hybrid"
 RSI_PERIOD = 14
 RSI_OVERSOLD = 30
 RSI_OVERBOUGHT = 70
 SCAN_INTERVAL_SECONDS = 15 * 60
-bought_coins = []
+TIME_INTERVAL = "1h"
+KLINES_LIMIT = 100
+TOP_PAIRS_LIMIT = int(os.environ.get("TOP_PAIRS_LIMIT", 100))
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 10))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("FETCH_TIMEOUT_SECONDS", 10))
+bought_coins = open_book(BOT_NAME)   # {الرمز: {'buy_price'}} محفوظة في SQLite وتُستعاد في run_bot/register
+news_watchlist = deque(maxlen=20)   # عملات إعلانات الإدراج تُضاف للفحص فوراً
+indicator_states = {}   # حالة المؤشرات التزايدية لكل عملة بين الجولات
+indicator_lock = threading.Lock()   # الجولة والأخبار و/check تستدعي sync من خيوط to_thread متزامنة
+kline_cache = KlineCache()
 
 # --- دوال التحليل الفني ---
 def calculate_indicators(df):
@@ -54,33 +69,36 @@ def calculate_indicators(df):
 
     return df
 
-def get_top_usdt_pairs(client, limit=100):
+async def get_top_usdt_pairs(universe, limit=100):
     try:
-        all_tickers = client.get_ticker()
-        usdt_pairs = [t for t in all_tickers if t['symbol'].endswith('USDT') and 'UP' not in t['symbol'] and 'DOWN' not in t['symbol']]
-        return [p['symbol'] for p in sorted(usdt_pairs, key=lambda x: float(x['quoteVolume']), reverse=True)[:limit]]
+        return await universe.top_by_volume(limit)
     except Exception as e:
+        METRICS.count_error('binance')
         logger.error(f"[Binance] فشل في جلب قائمة العملات: {e}")
         return []
 
-def analyze_symbol(client, symbol):
+def analyze_klines(symbol, klines_1h):
     try:
-        klines_1h = client.get_klines(symbol=symbol, interval=Client.KLINE_INTERVAL_1HOUR, limit=100)
-        if len(klines_1h) < 50: return 'HOLD', None
+        # القرار على آخر شمعة ساعة مغلقة، لا على الشمعة التي بدأت قبل ثوان (أو دقائق في جولات الربع)
+        klines_1h = closed_rows(klines_1h)
+        if not klines_1h or len(klines_1h) < 50: return 'HOLD', None
 
-        df = pd.DataFrame(klines_1h, columns=['timestamp','open','high','low','close','volume','close_time','quote_av','trades','tb_base_av','tb_quote_av','ignore'])
-        df[['close','open','volume']] = df[['close','open','volume']].apply(pd.to_numeric)
+        k = parse_klines(klines_1h)
+        volumes = k.volume
 
-        df = calculate_indicators(df)
-        last = df.iloc[-1]
-        current_price = last['close']
+        # تحديث O(1) للشموع المغلقة الجديدة فقط، بنفس قيم pandas على نافذة REST (test_indicators.py)
+        with indicator_lock:
+            state = indicator_states.setdefault(symbol, IndicatorState(RSI_PERIOD, KLINES_LIMIT))
+            last = state.sync(k.open_time.tolist(), k.close.tolist())
+        current_price = float(k.close[-1])
+        snapshot.note(symbol, close=current_price, VolX=float(volumes[-1] / volumes.mean()), **last)
 
         # شروط الشراء
         buy_signal = (
             last['RSI'] < RSI_OVERSOLD and
             last['MACD'] > last['Signal'] and
             last['EMA9'] > last['EMA25'] and
-            last['volume'] > df['volume'].mean() * 1.5
+            volumes[-1] > volumes.mean() * 1.5
         )
 
         # شروط البيع
@@ -100,73 +118,92 @@ def analyze_symbol(client, symbol):
 
     return 'HOLD', None
 
-# --- دوال الأخبار ---
-def check_coinmarketcal():
-    url = "https://api.coinmarketcal.com/v1/events"
-    # يجب الحصول على مفتاح API من CoinMarketCal وإضافته كمتغير بيئة
-    api_key = os.getenv("COINMARKETCAL_API_KEY")
-    if not api_key:
-        return []
-    headers = {"Accept": "application/json", "x-api-key": api_key}
-    params = {"sortBy": "created_desc", "max": 5} # أحدث 5 أحداث
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response.json().get("body", [])
-    except Exception as e:
-        logger.error(f"[News] خطأ CoinMarketCal: {e}")
-    return []
+def analyze_many(klines_map):
+    # تُستدعى داخل خيط منفصل حتى لا يحجب حساب المؤشرات حلقة تيليجرام
+    return {symbol: analyze_klines(symbol, klines) for symbol, klines in klines_map.items()}
 
-def check_binance_announcements():
-    url = "https://www.binance.com/bapi/composite/v1/public/cms/article/list/query?type=1&pageSize=5&page=1"
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json().get("data", {}).get("articles", [])
-    except Exception as e:
-        logger.error(f"[News] خطأ Binance Announcements: {e}")
-    return []
+# آخر القرارات والمؤشرات في الذاكرة لأوامر /status و /check و /positions
+snapshot = register_snapshot(BOT_NAME, TIME_INTERVAL, analyze_many, positions=bought_coins)
+
+def attach_snapshot(engine, universe):
+    snapshot.attach(lambda symbols: engine.klines_many(symbols, TIME_INTERVAL, KLINES_LIMIT, cache=kline_cache),
+                    listed_in(universe))
 
 # --- فحص السوق ---
-async def scan_market(context):
-    global bought_coins
-    logger.info("--- [Binance] بدء جولة فحص (Hybrid Sniper v7.1) ---")
-    client = context.job.data['binance_client']
-    chat_id = context.job.data['chat_id']
+async def evaluate_symbols(engine, dispatcher, chat_id, symbols):
+    held_coins = [s for s in symbols if s in bought_coins]
+    with METRICS.phase(BOT_NAME, 'kline_fetch'):
+        klines_map = await engine.klines_many(symbols, TIME_INTERVAL, KLINES_LIMIT, cache=kline_cache)
+    with METRICS.phase(BOT_NAME, 'indicator_compute'):
+        signals = snapshot.record(await asyncio.to_thread(analyze_many, klines_map))
 
     # فحص العملات المشتراة
-    for symbol in list(bought_coins):
-        status, price = analyze_symbol(client, symbol)
+    for symbol in held_coins:
+        status, price = signals.get(symbol, ('HOLD', None))
         if status == 'SELL':
             message = f"💰 *[Sniper] إشارة بيع*\n\n• العملة: `{symbol}`\n• السعر الحالي: `{price}`"
-            await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-            bought_coins.remove(symbol)
-        await asyncio.sleep(1)
+            dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+            del bought_coins[symbol]
+            bought_coins.record_signal(symbol, 'SELL', price)
 
     # فحص السوق
-    symbols_to_scan = get_top_usdt_pairs(client, limit=100)
-    for symbol in symbols_to_scan:
-        if symbol in bought_coins: continue
-        status, current_price = analyze_symbol(client, symbol)
+    for symbol in symbols:
+        if symbol in held_coins: continue
+        status, current_price = signals.get(symbol, ('HOLD', None))
         if status == 'BUY':
             message = f"🎯 *[Hybrid Sniper] إشارة شراء مؤكدة!*\n\n• العملة: `{symbol}`\n• السعر الحالي: `{current_price}`"
-            await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-            bought_coins.append(symbol)
-        await asyncio.sleep(1)
-
-    # الأخبار
-    news_events = check_coinmarketcal()
-    for event in news_events:
-        msg = f"📰 *[News]* حدث مهم:\n\n• {event.get('title','')}\n• التاريخ: {event.get('date_event','')}"
-        await context.bot.send_message(chat_id=chat_id, text=msg, parse_mode='Markdown')
+            dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+            bought_coins[symbol] = {'buy_price': current_price}
+            bought_coins.record_signal(symbol, 'BUY', current_price)
 
-    binance_news = check_binance_announcements()
-    for article in binance_news:
-        msg = f"📢 *[Binance]* إعلان جديد:\n\n• {article.get('title','')}"
-        await context.bot.send_message(chat_id=chat_id, text=msg, parse_mode='Markdown')
+@METRICS.track_cycle(BOT_NAME, SCAN_INTERVAL_SECONDS)
+async def scan_market(context):
+    logger.info("--- [Binance] بدء جولة فحص (Hybrid Sniper v7.1) ---")
+    engine = context.job.data['fetch_engine']
+    dispatcher = context.job.data['dispatcher']
+    chat_id = context.job.data['chat_id']
 
+    # جلب قائمة العملات ثم شموع الكون كاملاً بالتوازي (حد التزامن ومهلة كل طلب من FetchEngine)
+    # الأخبار لم تعد هنا: NewsWatcher يعمل بإيقاعه الخاص فلا يحجب مصدر أخبار بطيء الجولة
+    with METRICS.phase(BOT_NAME, 'universe_fetch'):
+        top_pairs = await get_top_usdt_pairs(context.job.data['universe'], limit=TOP_PAIRS_LIMIT)
+    candidates = list(bought_coins) + [s for s in list(news_watchlist) + top_pairs if s not in bought_coins]
+    symbols = select_batch(list(dict.fromkeys(candidates)), context)
+    await evaluate_symbols(engine, dispatcher, chat_id, symbols)
     logger.info("--- [Binance] انتهاء جولة الفحص. ---")
 
+# --- الأخبار ---
+def build_news_watcher(engine, dispatcher, chat_id, universe):
+    sources = [binance_announcements_source()]
+    # يجب الحصول على مفتاح API من CoinMarketCal وإضافته كمتغير بيئة
+    api_key = os.getenv("COINMARKETCAL_API_KEY")
+    if api_key:
+        sources.append(coinmarketcal_source(api_key))
+
+    async def on_item(source, item, message):
+        dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+
+    async def on_tickers(tickers):
+        trading = set(await universe.usdt_pairs())
+        symbols = [f"{t}USDT" for t in tickers if f"{t}USDT" in trading]
+        if not symbols: return
+        logger.info(f"[News] إعلان إدراج: فحص فوري لـ {symbols}")
+        for symbol in symbols:
+            if symbol not in news_watchlist: news_watchlist.append(symbol)
+        await evaluate_symbols(engine, dispatcher, chat_id, symbols)
+
+    return NewsWatcher(sources, on_item, on_tickers)
+
+async def start_services(engine, dispatcher, chat_id, universe):
+    """يشغّل مراقب الأخبار ويُرجع دالة الإيقاف (تُستخدم في run_bot وفي runtime.py)."""
+    news_watcher = build_news_watcher(engine, dispatcher, chat_id, universe)
+    task = asyncio.create_task(news_watcher.run())
+
+    async def stop():
+        await news_watcher.stop()
+        task.cancel()
+    return stop
+
 # --- أوامر البوت ---
 async def start(update, context):
     user = update.effective_user
@@ -178,32 +215,57 @@ async def start(update, context):
 def run_bot():
     TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
     TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
-    BINANCE_API_KEY = os.environ.get("BINANCE_API_KEY")
-    BINANCE_SECRET_KEY = os.environ.get("BINANCE_SECRET_KEY")
-    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, BINANCE_API_KEY, BINANCE_SECRET_KEY]):
+    # البيانات العامة لا تحتاج مفاتيح بينانس، ولا اتصال تجريبي يؤخر بدء التشغيل
+    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID]):
         logger.critical("!!! [Binance] فشل: متغيرات البيئة غير كاملة. !!!")
         return
-    try:
-        binance_client = Client(BINANCE_API_KEY, BINANCE_SECRET_KEY)
-    except Exception as e:
-        logger.critical(f"فشل الاتصال ببينانس: {e}")
-        return
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    bought_coins.open()
+    fetch_engine = FetchEngine(concurrency=FETCH_CONCURRENCY, timeout=FETCH_TIMEOUT_SECONDS)
+    # ترتيب الحجم يُحدّث كل ساعة بدل تنزيل قائمة 24hr الكاملة في كل جولة
+    universe = SymbolUniverse(*binance_sources(fetch_engine), ranking_ttl=60 * 60)
+
+    stop_callbacks = []
+
+    async def post_init(application):
+        dispatcher.start()
+        stop_callbacks.append(await start_services(fetch_engine, dispatcher, TELEGRAM_CHAT_ID, universe))
+        HEALTH.set(READY)
+
+    async def post_shutdown(application):
+        for stop in stop_callbacks:
+            await stop()
+        await dispatcher.stop()
+        await fetch_engine.close()
+
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     application.add_handler(CommandHandler("start", start))
-    job_data = {'binance_client': binance_client, 'chat_id': TELEGRAM_CHAT_ID}
+    register_commands(application)
+    attach_snapshot(fetch_engine, universe)
+    dispatcher = TelegramDispatcher(application.bot)
+    job_data = {'fetch_engine': fetch_engine, 'dispatcher': dispatcher,
+                'universe': universe, 'chat_id': TELEGRAM_CHAT_ID}
     job_queue = application.job_queue
-    job_queue.run_repeating(scan_market, interval=SCAN_INTERVAL_SECONDS, first=10, data=job_data)
+    # بعد إغلاق كل شمعة 15 دقيقة (ومنها إغلاق شمعة الساعة) بدل إزاحة عشوائية من وقت التشغيل
+    schedule_aligned(job_queue, scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
     logger.info("--- [Binance] البوت جاهز ويعمل. ---")
     application.run_polling()
 
+# --- التشغيل ضمن runtime.py (عملية واحدة لعدة استراتيجيات) ---
+def register(runtime):
+    bought_coins.open()
+    engine = runtime.market('binance')
+    universe = runtime.universe('binance', ranking_ttl=60 * 60)
+    attach_snapshot(engine, universe)
+    runtime.add_service(lambda: start_services(engine, runtime.dispatcher, runtime.chat_id, universe))
+    job_data = {'fetch_engine': engine, 'dispatcher': runtime.dispatcher, 'universe': universe, 'chat_id': runtime.chat_id}
+    runtime.schedule(scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
+
 # --- نقطة البداية الرئيسية (تم الإصلاح هنا) ---
 if __name__ == "__main__":
     logger.info("--- [Hybrid Sniper] Starting Main Application ---")
     
     # الخطوة 1: تشغيل خادم الويب في الخلفية
-    server_thread = Thread(target=run_server)
-    server_thread.daemon = True
-    server_thread.start()
+    run_server()
     logger.info("--- [Hybrid Sniper] Web Server has been started. ---")
     
     # الخطوة 2: تشغيل بوت التليجرام الرئيسي
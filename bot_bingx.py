@@ -5,119 +5,130 @@
 import os
 import logging
 import asyncio
-import time
-from threading import Thread
-from flask import Flask
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-import pandas as pd
-import requests
-import hmac, hashlib
-from urllib.parse import urlencode
+import numpy as np
+from bingx_client import BingXClient
+from kline_parser import closed_rows, parse_klines
+from kline_cache import KlineCache
+from telegram_dispatcher import TelegramDispatcher
+from metrics import METRICS
+from health_server import HEALTH, READY, start_health_server
+from symbol_universe import SymbolUniverse, bingx_sources
+from scheduler import schedule_aligned, select_batch
+from position_store import open_book
+from market_snapshot import register_snapshot, register_commands, listed_in
 
 # --- إعدادات التسجيل (Logging) ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- 1. إعداد خادم الويب ---
-app = Flask(__name__)
-@app.route('/')
-def health_check():
-    return "Falcon Bot Service (BingX - Simple & Effective) is Running!", 200
+# --- 1. خادم الصحة ---
 def run_server():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host='0.0.0.0', port=port)
+    # مكتبة قياسية فقط: المنفذ يُربط فوراً ويُبلغ /ready بالجاهزية بعد تهيئة الخدمات
+    start_health_server(int(os.environ.get("PORT", 10000)))
 
 # --- 2. كل ما يتعلق بالبوت ---
 
 # --- إعدادات الاستراتيجية ---
+BOT_NAME = "bingx"
 RSI_PERIOD = 14
 RSI_OVERSOLD = 30
 RSI_OVERBOUGHT = 70
 SCAN_INTERVAL_SECONDS = 15 * 60
-bought_coins = []
+KLINE_INTERVAL = "15m"
+KLINES_LIMIT = RSI_PERIOD + 50
+TOP_PAIRS_LIMIT = int(os.environ.get("TOP_PAIRS_LIMIT", 150))
+bought_coins = open_book(BOT_NAME)   # {الرمز: {'buy_price'}} محفوظة في SQLite وتُستعاد في run_bot/register
+kline_cache = KlineCache()
 
 # --- إعدادات BingX ---
 API_KEY = os.environ.get("BINGX_API_KEY")
 API_SECRET = os.environ.get("BINGX_SECRET_KEY")
-BASE_URL = "https://open-api.bingx.com"
-session = requests.Session()
-session.headers.update({"X-BingX-ApiKey": API_KEY})
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 10))
 
 # --- دوال التحليل ---
-def calculate_rsi(df, period=14):
-    delta = df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss.replace(0, 1e-10)
+def calculate_rsi(close, period=14):
+    # RSI بمتوسط بسيط لآخر period فرق سعري (نفس rolling(period).mean() عند آخر شمعة)
+    delta = np.diff(close[-(period + 1):])
+    gain = delta[delta > 0].sum() / period
+    loss = -delta[delta < 0].sum() / period
+    rs = gain / (loss if loss != 0 else 1e-10)
     return 100 - (100 / (1 + rs))
 
-def get_top_usdt_pairs(limit=150):
+async def get_top_usdt_pairs(universe, limit=150):
     try:
-        url = f"{BASE_URL}/openApi/spot/v1/market/ticker"
-        r = session.get(url, timeout=10)
-        r.raise_for_status()
-        all_tickers = r.json().get("data", [])
-        usdt_pairs = [t for t in all_tickers if t['symbol'].endswith("USDT")]
-        return [p['symbol'] for p in sorted(usdt_pairs, key=lambda x: float(x.get('quoteVolume', 0)), reverse=True)[:limit]]
+        return await universe.top_by_volume(limit, exclude=())
     except Exception as e:
         logger.error(f"[BingX] فشل في جلب قائمة العملات: {e}")
         return []
 
-def get_klines(symbol, interval="15m", limit=100):
+def analyze_klines(symbol, klines):
     try:
-        url = f"{BASE_URL}/openApi/spot/v1/market/kline"
-        params = {"symbol": symbol, "interval": interval, "limit": limit}
-        r = session.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json().get("data", [])
-    except Exception as e:
-        logger.error(f"[BingX] فشل في جلب الشموع لـ {symbol}: {e}")
-        return []
-
-def analyze_symbol(symbol):
-    try:
-        klines = get_klines(symbol, interval="15m", limit=RSI_PERIOD + 50)
-        if len(klines) < RSI_PERIOD + 2: return 'HOLD', None
-        df = pd.DataFrame(klines, columns=['open','close','high','low','volume','timestamp'])
-        df[['open','close']] = df[['open','close']].apply(pd.to_numeric)
-        df['RSI'] = calculate_rsi(df, RSI_PERIOD)
-        last_candle = df.iloc[-1]
-        prev_candle = df.iloc[-2]
-        current_price = last_candle['close']
-        rsi_is_oversold = last_candle['RSI'] < RSI_OVERSOLD
-        is_bullish_engulfing = (last_candle['close'] > last_candle['open'] and prev_candle['close'] < prev_candle['open'] and last_candle['close'] > prev_candle['open'] and last_candle['open'] < prev_candle['close'])
+        # شمعة الابتلاع و RSI على آخر شمعة مغلقة، لا على المتشكلة منذ ثوان
+        klines = closed_rows(klines, 'bingx')
+        if not klines or len(klines) < RSI_PERIOD + 2: return 'HOLD', None
+        # صف BingX: [openTime, open, high, low, close, volume, closeTime, quoteVolume]
+        k = parse_klines(klines, 'bingx')
+        close, open_ = k.close, k.open
+        rsi = calculate_rsi(close, RSI_PERIOD)
+        current_price = float(close[-1])
+        rsi_is_oversold = rsi < RSI_OVERSOLD
+        is_bullish_engulfing = (close[-1] > open_[-1] and close[-2] < open_[-2] and close[-1] > open_[-2] and open_[-1] < close[-2])
+        snapshot.note(symbol, close=current_price, RSI=float(rsi), Engulfing=bool(is_bullish_engulfing))
         if rsi_is_oversold and is_bullish_engulfing:
             return 'BUY', current_price
-        rsi_is_overbought = last_candle['RSI'] > RSI_OVERBOUGHT
+        rsi_is_overbought = rsi > RSI_OVERBOUGHT
         if rsi_is_overbought:
             return 'SELL', current_price
     except Exception as e:
         logger.error(f"[BingX] خطأ أثناء فحص {symbol}: {e}")
     return 'HOLD', None
 
+def analyze_many(klines_map):
+    return {symbol: analyze_klines(symbol, klines) for symbol, klines in klines_map.items()}
+
+# آخر القرارات والمؤشرات في الذاكرة لأوامر /status و /check و /positions
+snapshot = register_snapshot(BOT_NAME, KLINE_INTERVAL, analyze_many, positions=bought_coins, symbol_format="{}-USDT")
+
+def attach_snapshot(client, universe):
+    snapshot.attach(lambda symbols: client.klines_many(symbols, KLINE_INTERVAL, KLINES_LIMIT, cache=kline_cache),
+                    listed_in(universe))
+
 # --- مهمة الفحص الدوري ---
+@METRICS.track_cycle(BOT_NAME, SCAN_INTERVAL_SECONDS)
 async def scan_market(context):
-    global bought_coins
     logger.info("--- [BingX] بدء جولة فحص السوق (Simple & Effective) ---")
     chat_id = context.job.data['chat_id']
-    symbols_to_scan = get_top_usdt_pairs(limit=150)
+    dispatcher = context.job.data['dispatcher']
+    client = context.job.data['client']
+    with METRICS.phase(BOT_NAME, 'universe_fetch'):
+        symbols_to_scan = await get_top_usdt_pairs(context.job.data['universe'], limit=TOP_PAIRS_LIMIT)
     logger.info(f"[BingX] Found {len(symbols_to_scan)} symbols to scan.")
-    for symbol in symbols_to_scan:
-        if symbol in bought_coins: continue
-        status, price = analyze_symbol(symbol)
+
+    # كل الشموع بالتوازي عبر مجمع اتصالات BingXClient، ثم التحليل في خيط منفصل
+    held_coins = list(bought_coins)
+    symbols = select_batch(held_coins + [s for s in symbols_to_scan if s not in bought_coins], context)
+    with METRICS.phase(BOT_NAME, 'kline_fetch'):
+        klines_map = await client.klines_many(symbols, KLINE_INTERVAL, KLINES_LIMIT, cache=kline_cache)
+    with METRICS.phase(BOT_NAME, 'indicator_compute'):
+        signals = snapshot.record(await asyncio.to_thread(analyze_many, klines_map))
+
+    for symbol in symbols:
+        if symbol in held_coins: continue
+        status, price = signals.get(symbol, ('HOLD', None))
         if status == 'BUY':
             message = f"🚨 **[BingX] إشارة شراء (RSI + Engulfing)** 🚨\n\n• **العملة:** `{symbol}`\n• **السعر الحالي:** `{price}`"
-            await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2')
-            bought_coins.append(symbol)
-        await asyncio.sleep(0.5)
-    for symbol in list(bought_coins):
-        status, price = analyze_symbol(symbol)
+            dispatcher.enqueue(chat_id, message, parse_mode='MarkdownV2')
+            bought_coins[symbol] = {'buy_price': price}
+            bought_coins.record_signal(symbol, 'BUY', price)
+    for symbol in held_coins:
+        status, price = signals.get(symbol, ('HOLD', None))
         if status == 'SELL':
             message = f"💰 **[BingX] إشارة بيع (RSI Overbought)** 💰\n\n• **العملة:** `{symbol}`\n• **السعر الحالي:** `{price}`"
-            await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2')
-            bought_coins.remove(symbol)
-        await asyncio.sleep(0.5)
+            dispatcher.enqueue(chat_id, message, parse_mode='MarkdownV2')
+            del bought_coins[symbol]
+            bought_coins.record_signal(symbol, 'SELL', price)
     logger.info(f"--- [BingX] انتهاء جولة الفحص. ---")
 
 # --- أمر /start ---
@@ -135,20 +146,42 @@ def run_bot():
     if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, API_KEY, API_SECRET]):
         logger.critical("!!! [BingX] فشل: متغيرات البيئة غير كاملة.")
         return
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    bought_coins.open()
+    # العميل وكون العملات للتشغيل المنفرد فقط؛ runtime.py يمرر عميله المشترك في register
+    bingx = BingXClient(API_KEY, API_SECRET, concurrency=FETCH_CONCURRENCY)
+    universe = SymbolUniverse(*bingx_sources(bingx), name='bingx')
+
+    async def post_init(application):
+        dispatcher.start()
+        HEALTH.set(READY)
+
+    async def post_shutdown(application):
+        await dispatcher.stop()
+        await bingx.close()
+
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     application.add_handler(CommandHandler("start", start))
-    job_data = {'chat_id': TELEGRAM_CHAT_ID}
+    register_commands(application)
+    attach_snapshot(bingx, universe)
+    dispatcher = TelegramDispatcher(application.bot)
+    job_data = {'chat_id': TELEGRAM_CHAT_ID, 'dispatcher': dispatcher, 'client': bingx, 'universe': universe}
     job_queue = application.job_queue
-    job_queue.run_repeating(scan_market, interval=SCAN_INTERVAL_SECONDS, first=10, data=job_data)
+    schedule_aligned(job_queue, scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
     logger.info("--- [BingX] البوت جاهز ويعمل. ---")
     application.run_polling()
 
+# --- التشغيل ضمن runtime.py (عملية واحدة لعدة استراتيجيات) ---
+def register(runtime):
+    bought_coins.open()
+    job_data = {'chat_id': runtime.chat_id, 'dispatcher': runtime.dispatcher,
+                'client': runtime.market('bingx'), 'universe': runtime.universe('bingx')}
+    attach_snapshot(job_data['client'], job_data['universe'])
+    runtime.schedule(scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
+
 # --- نقطة البداية الرئيسية ---
 if __name__ == "__main__":
     logger.info("--- [BingX] Starting Main Application ---")
-    server_thread = Thread(target=run_server)
-    server_thread.daemon = True
-    server_thread.start()
+    run_server()
     logger.info("--- [BingX] Web Server has been started. ---")
     run_bot()
 
@@ -1,27 +1,52 @@
 # -----------------------------------------------------------------------------
-# bot_webhook.py - نسخة v5.0 (MTFA 1H, EMA+RSI+StochRSI+Volume, Webhook + Flask)
+# ccxt_bot.py - نسخة v5.2 (MTFA 1H + تأكيد 4H مشتق محلياً من 15m, EMA+RSI+StochRSI+Volume, Webhook aiohttp)
 # -----------------------------------------------------------------------------
 
 import os
+import hmac
+import signal
+import secrets
 import logging
 import asyncio
-from flask import Flask, request
+from aiohttp import web
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-
-from binance.client import Client
-import pandas as pd
+from fetch_engine import FetchEngine
+from resampler import TimeframeCache
+from telegram_dispatcher import TelegramDispatcher
+from metrics import METRICS, register_aiohttp_routes
+from health_server import HEALTH, WARMING, READY, register_aiohttp_health
+from symbol_universe import SymbolUniverse, binance_sources
+from scheduler import schedule_aligned, select_batch
+from position_store import open_book
+from market_snapshot import register_snapshot, register_commands, listed_in
 
 # --- إعدادات التسجيل ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- إعداد Flask ---
-app = Flask(__name__)
-
 # --- إعدادات الاستراتيجية ---
+BOT_NAME = "mtfa"
 SCAN_INTERVAL_SECONDS = 60 * 60   # فحص كل ساعة
-bought_coins = []
+TIME_INTERVAL = "1h"      # فاصل قواعد الدخول والخروج
+RULE_CANDLES = 120        # نافذة مؤشرات 1h كما في طلب REST السابق (limit=120): بذرة EMA99 بنفس وزنها
+BASE_INTERVAL = "15m"     # الفاصل الوحيد الذي يُجلب؛ 1h و 4h و 1d تُشتق منه محلياً (resampler.py)
+BASE_LIMIT = 1000         # التحميل الأول ~10 أيام: 250 شمعة 1h و 62 شمعة 4h و 10 شموع 1d، ثم الجديد فقط
+# فواصل تأكيد الاتجاه قبل الشراء (فارغة = 1h وحدها كما في السابق). 1d لا يُفعّل افتراضياً: BASE_LIMIT
+# يعطي ~10 شموع يومية فقط، أي أقل من TREND_MIN_CANDLES فلا يُؤكَّد اتجاهه أبداً
+CONFIRM_INTERVALS = tuple(i.strip() for i in os.environ.get("MTFA_CONFIRM", "4h").split(",") if i.strip())
+TREND_MIN_CANDLES = 25   # EMA25 على أقل من 25 شمعة مغلقة لا معنى لها
+TOP_PAIRS_LIMIT = int(os.environ.get("TOP_PAIRS_LIMIT", 100))
+bought_coins = open_book(BOT_NAME)   # يُفتح في main/register لا عند الاستيراد
+# الفحص ينطلق بعد إغلاق شمعة 1h بثوان: الإطارات تنتهي عند آخر شمعة مغلقة لكل فاصل
+timeframe_cache = TimeframeCache(tuple(dict.fromkeys((BASE_INTERVAL, TIME_INTERVAL) + CONFIRM_INTERVALS)),
+                                 closed_only=True)
+
+# --- إعدادات Webhook ---
+# WEBHOOK_URL: العنوان العام للخدمة (مثل https://falcon.onrender.com) لتسجيل webhook لدى تيليجرام
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL") or os.environ.get("RENDER_EXTERNAL_URL")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
 
 # --- دوال التحليل (مؤشرات جديدة) ---
 def calculate_indicators(df):
@@ -42,18 +67,37 @@ def calculate_indicators(df):
     df['VolMA20'] = df['volume'].rolling(window=20).mean()
     return df.dropna()
 
-def analyze_symbol(client, symbol):
+def trend_up(k):
+    """اتجاه فاصل التأكيد على شموعه المغلقة: الإغلاق فوق EMA7 و EMA7 فوق EMA25 (False قبل TREND_MIN_CANDLES شمعة)."""
+    if len(k) < TREND_MIN_CANDLES:
+        return False
+    import pandas as pd
+    close = pd.Series(k.close)
+    ema7 = close.ewm(span=7, adjust=False).mean().iloc[-1]
+    ema25 = close.ewm(span=25, adjust=False).mean().iloc[-1]
+    return bool(close.iloc[-1] > ema7 > ema25)
+
+def analyze_klines(symbol, frames):
+    """frames: {الفاصل: Klines} من TimeframeCache، كل فاصل منتهٍ عند آخر شمعة مغلقة فيه."""
     try:
-        klines_1h = client.get_klines(symbol=symbol, interval=Client.KLINE_INTERVAL_1HOUR, limit=120)
-        if len(klines_1h) < 100: 
+        k = frames.get(TIME_INTERVAL) if frames else None
+        if k is None or len(k) < 100:
             return 'HOLD', None
 
-        df_1h = pd.DataFrame(klines_1h, columns=['timestamp','open','high','low','close','volume','close_time','quote_av','trades','tb_base_av','tb_quote_av','ignore'])
-        df_1h[['close','open','volume']] = df_1h[['close','open','volume']].apply(pd.to_numeric)
+        # pandas تُستورد عند أول تحليل لا عند بدء العملية (أثقل استيراد في الوحدة)
+        import pandas as pd
+        # الإطار المشتق أطول (~250 شمعة)؛ EMA بـ adjust=False تتأثر ببداية السلسلة، فتُقصّ إلى نفس النافذة
+        window = slice(-RULE_CANDLES, None)
+        df_1h = pd.DataFrame({'open': k.open[window], 'close': k.close[window], 'volume': k.volume[window]},
+                             copy=False)
         df_1h = calculate_indicators(df_1h)
+        trends = {interval: trend_up(frames[interval]) for interval in CONFIRM_INTERVALS}
 
         last = df_1h.iloc[-1]
         current_price = last['close']
+        snapshot.note(symbol, **{name: float(last[name]) for name in
+                                 ('close', 'EMA7', 'EMA25', 'EMA99', 'RSI6', 'StochRSI', 'VolMA20')},
+                      **{f"Trend{interval}": ok for interval, ok in trends.items()})
 
         ema_trend_up = last['close'] > last['EMA7'] > last['EMA25'] > last['EMA99']
         rsi_ok = 60 <= last['RSI6'] <= 80
@@ -61,7 +105,7 @@ def analyze_symbol(client, symbol):
         volume_ok = last['volume'] > last['VolMA20']
         bullish_candle = last['close'] > last['open']
 
-        if ema_trend_up and rsi_ok and stoch_mid and volume_ok and bullish_candle:
+        if ema_trend_up and rsi_ok and stoch_mid and volume_ok and bullish_candle and all(trends.values()):
             return 'BUY', current_price
 
         rsi_high = last['RSI6'] > 80
@@ -76,34 +120,176 @@ def analyze_symbol(client, symbol):
 
     return 'HOLD', None
 
+def analyze_many(klines_map):
+    return {symbol: analyze_klines(symbol, klines) for symbol, klines in klines_map.items()}
+
+# آخر القرارات والمؤشرات في الذاكرة لأوامر /status و /check و /positions
+snapshot = register_snapshot(BOT_NAME, "+".join((TIME_INTERVAL,) + CONFIRM_INTERVALS), analyze_many,
+                             positions=bought_coins)
+
+def attach_snapshot(engine, universe):
+    snapshot.attach(lambda symbols: engine.klines_many(symbols, BASE_INTERVAL, BASE_LIMIT, cache=timeframe_cache),
+                    listed_in(universe))
+
+# --- مهمة الفحص كل ساعة ---
+@METRICS.track_cycle(BOT_NAME, SCAN_INTERVAL_SECONDS)
+async def scan_market(context):
+    logger.info("--- [MTFA] بدء جولة فحص (1H) ---")
+    engine = context.job.data['fetch_engine']
+    dispatcher = context.job.data['dispatcher']
+    chat_id = context.job.data['chat_id']
+    with METRICS.phase(BOT_NAME, 'universe_fetch'):
+        try:
+            top_pairs = await context.job.data['universe'].top_by_volume(TOP_PAIRS_LIMIT)
+        except Exception as e:
+            METRICS.count_error('binance')
+            logger.error(f"[MTFA] فشل في جلب قائمة العملات: {e}")
+            top_pairs = []
+    symbols = select_batch(list(bought_coins) + [s for s in top_pairs if s not in bought_coins], context)
+    with METRICS.phase(BOT_NAME, 'kline_fetch'):
+        # طلب 15m واحد لكل عملة (كامل أول مرة ثم الشموع الجديدة فقط) يعطي كل الفواصل
+        klines_map = await engine.klines_many(symbols, BASE_INTERVAL, BASE_LIMIT, cache=timeframe_cache)
+    with METRICS.phase(BOT_NAME, 'indicator_compute'):
+        signals = snapshot.record(await asyncio.to_thread(analyze_many, klines_map))
+
+    for symbol in symbols:
+        status, price = signals.get(symbol, ('HOLD', None))
+        if status == 'BUY' and symbol not in bought_coins:
+            message = f"📈 *[MTFA 1H] إشارة شراء*\n\n• العملة: `{symbol}`\n• السعر الحالي: `{price}`"
+            dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+            bought_coins[symbol] = {'buy_price': price}
+            bought_coins.record_signal(symbol, 'BUY', price)
+        elif status == 'SELL' and symbol in bought_coins:
+            message = f"📉 *[MTFA 1H] إشارة بيع*\n\n• العملة: `{symbol}`\n• السعر الحالي: `{price}`"
+            dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+            del bought_coins[symbol]
+            bought_coins.record_signal(symbol, 'SELL', price)
+    logger.info("--- [MTFA] انتهاء جولة الفحص. ---")
+
 # --- أمر /start ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    message = (f"👋 أهلاً بك يا {user.mention_html()}!<br><br>"
-               f"أنا <b>بوت التداول الفوري (Binance - استراتيجية MTFA 1H)</b>.<br>"
+    message = (f"👋 أهلاً بك يا {user.mention_html()}!\n\n"
+               f"أنا <b>بوت التداول الفوري (Binance - استراتيجية MTFA 1H)</b>.\n"
                f"<i>صنع بواسطه المطور عبدالرحمن محمد</i>")
     await update.message.reply_html(message)
 
-# --- إعداد Webhook ---
-TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
-BINANCE_API_KEY = os.environ.get("BINANCE_API_KEY")
-BINANCE_SECRET_KEY = os.environ.get("BINANCE_SECRET_KEY")
+# --- خادم Webhook (aiohttp في نفس حلقة PTB) ---
+def create_web_app(application, secret_token, path=WEBHOOK_PATH):
+    """
+    يستقبل التحديثات من تيليجرام ويضعها مباشرة في update_queue للتطبيق العامل.
+    أي طلب لا يحمل الرمز السري الصحيح يُرفض بـ 403 قبل قراءة جسمه.
+    """
+    expected = secret_token.encode()
+
+    async def webhook(request):
+        received = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(received, expected):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logger.warning(f"[Webhook] تحديث غير صالح: {e}")
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response(text="ok")
 
-application = Application.builder().token(TELEGRAM_TOKEN).build()
-application.add_handler(CommandHandler("start", start))
+    async def index(request):
+        return web.Response(text="Falcon Bot Webhook Service is Running!")
 
-@app.route(f"/{TELEGRAM_TOKEN}", methods=["POST"])
-def webhook():
-    update = Update.de_json(request.get_json(force=True), application.bot)
-    application.update_queue.put_nowait(update)
-    return "ok", 200
+    app = web.Application()
+    app.router.add_post(f"/{path}", webhook)
+    app.router.add_get("/", index)
+    register_aiohttp_routes(app)
+    register_aiohttp_health(app)
+    return app
 
-@app.route("/")
-def index():
-    return "Falcon Bot Webhook Service is Running!", 200
+def build_application(token, **builder_options):
+    # التحديثات تصل من webhook فقط: لا حاجة لـ Updater (getUpdates)
+    builder = Application.builder().token(token).updater(None)
+    for name, value in builder_options.items():
+        builder = getattr(builder, name)(value)
+    application = builder.build()
+    application.add_handler(CommandHandler("start", start))
+    register_commands(application)
+    return application
+
+async def serve(application, secret_token, port, webhook_url=WEBHOOK_URL, on_started=None, stop_event=None):
+    """يشغّل التطبيق وخادم aiohttp معاً حتى stop_event (أو SIGINT/SIGTERM)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    runner = web.AppRunner(create_web_app(application, secret_token), access_log=None)
+    # المنفذ يُربط أولاً: initialize تنتظر رد تيليجرام (getMe) والمنصة تفحص المنفذ منذ البداية
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    HEALTH.set(WARMING, phase='telegram', port=port)
+    started = False
+    try:
+        await application.initialize()
+        await application.start()
+        started = True
+        if webhook_url:
+            await application.bot.set_webhook(f"{webhook_url.rstrip('/')}/{WEBHOOK_PATH}", secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+            logger.info(f"[Webhook] تم تسجيل {webhook_url.rstrip('/')}/{WEBHOOK_PATH}")
+        else:
+            logger.warning("[Webhook] WEBHOOK_URL غير مضبوط: لن يُسجَّل webhook لدى تيليجرام")
+        if on_started is not None:
+            await on_started()
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+        if started:
+            await application.stop()
+        await application.shutdown()
+
+# --- التشغيل ضمن runtime.py (عملية واحدة لعدة استراتيجيات) ---
+def register(runtime):
+    bought_coins.open()
+    engine = runtime.market('binance')
+    job_data = {'fetch_engine': engine, 'dispatcher': runtime.dispatcher,
+                'universe': runtime.universe('binance', ranking_ttl=60 * 60), 'chat_id': runtime.chat_id}
+    attach_snapshot(engine, job_data['universe'])
+    runtime.schedule(scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
 
 # --- نقطة البداية ---
+def main():
+    TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
+    TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID]):
+        logger.critical("!!! [MTFA] فشل: متغيرات البيئة غير كاملة. !!!")
+        return
+    bought_coins.open()
+    # بدون WEBHOOK_SECRET يُولَّد رمز جديد مع كل تشغيل ويُسجَّل مع webhook
+    secret_token = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    port = int(os.environ.get("PORT", 10000))
+
+    application = build_application(TELEGRAM_TOKEN)
+    dispatcher = TelegramDispatcher(application.bot)
+    fetch_engine = FetchEngine()
+    universe = SymbolUniverse(*binance_sources(fetch_engine), ranking_ttl=60 * 60)
+    attach_snapshot(fetch_engine, universe)
+    job_data = {'fetch_engine': fetch_engine, 'dispatcher': dispatcher, 'universe': universe, 'chat_id': TELEGRAM_CHAT_ID}
+    schedule_aligned(application.job_queue, scan_market, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
+
+    async def run():
+        async def on_started():
+            dispatcher.start()
+            HEALTH.set(READY)
+            logger.info(f"--- [MTFA] البوت جاهز على المنفذ {port} ---")
+        try:
+            await serve(application, secret_token, port, on_started=on_started)
+        finally:
+            await dispatcher.stop()
+            await fetch_engine.close()
+
+    asyncio.run(run())
+
 if __name__ == "__main__":
     logger.info("--- [Binance] Starting Webhook Application ---")
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
+    main()
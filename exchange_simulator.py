@@ -0,0 +1,417 @@
+# -----------------------------------------------------------------------------
+# exchange_simulator.py - خادم محلي يحاكي نقاط Binance و BingX (و Bot API تيليجرام) التي تستخدمها البوتات
+# -----------------------------------------------------------------------------
+# REST على /api/v3/* و /openApi/* وبث الشموع على ws://127.0.0.1:<port>/stream (BINANCE_WS_URL)
+# بنفس صيغة البثوث المركبة، مع قطع إجباري للاتصالات (--ws-drop-seconds أو POST /__drop).
+
+import os
+import json
+import time
+import zlib
+import random
+import asyncio
+import logging
+import argparse
+import numpy as np
+from aiohttp import web, WSMsgType
+from metrics import REQUEST_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+DEFAULT_PORT = 8900
+HISTORY_CANDLES = 500     # عدد الشموع المولدة لكل (عملة، فترة) عند أول طلب
+MAX_KLINES_LIMIT = 1000
+PUMP_RATE = 0.01          # نسبة العملات التي تشهد انفجاراً سعرياً في الشمعة الحالية
+RESAMPLE_HISTORY_DAYS = 30   # عمق الفاصل الأساسي مع --resample-from (حتى تظهر شموع 1d كافية)
+WS_PUSH_SECONDS = 1.0     # Binance يدفع تحديث الشمعة كل ثانية إلى ثانيتين
+INTERVAL_MS = {'1m': 60_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+               '1h': 3_600_000, '4h': 14_400_000, '1d': 86_400_000}
+
+
+class CandleSeries:
+    """شموع عملة واحدة بفترة واحدة كمصفوفات NumPy، تمتد تلقائياً مع مرور الوقت."""
+
+    def __init__(self, interval_ms, seed, candles=HISTORY_CANDLES, pump=False, now_ms=None):
+        self.interval_ms = interval_ms
+        self.rng = np.random.default_rng(seed)
+        self.pump = pump
+        current = (now_ms or int(time.time() * 1000)) // interval_ms
+        self.open_time = np.arange(current - candles + 1, current + 1, dtype=np.int64) * interval_ms
+        start_price = float(np.exp(self.rng.uniform(np.log(0.01), np.log(500))))
+        self.close = start_price * np.exp(np.cumsum(self.rng.normal(0, 0.01, candles)))
+        self.open = np.concatenate(([start_price], self.close[:-1])) * (1 + self.rng.normal(0, 0.002, candles))
+        self.volume = self.rng.lognormal(8, 0.5, candles)
+        spread = np.abs(self.rng.normal(0, 0.005, candles))
+        self.high = np.maximum(self.open, self.close) * (1 + spread)
+        self.low = np.minimum(self.open, self.close) * (1 - spread)
+        if pump:
+            self._apply_pump()
+
+    def _apply_pump(self):
+        # شمعة أخيرة بحجم أكبر من 10× المتوسط وصعود > 3%: تُطلق إشارة Sniper
+        self.volume[-1] = self.volume[:-1].mean() * 15
+        self.close[-1] = self.open[-1] * 1.06
+        self.high[-1] = max(self.high[-1], self.close[-1])
+
+    def extend(self, now_ms):
+        current = now_ms // self.interval_ms * self.interval_ms
+        missing = int((current - self.open_time[-1]) // self.interval_ms)
+        if missing <= 0:
+            return
+        times = self.open_time[-1] + self.interval_ms * np.arange(1, missing + 1, dtype=np.int64)
+        close = self.close[-1] * np.exp(np.cumsum(self.rng.normal(0, 0.01, missing)))
+        open_ = np.concatenate(([self.close[-1]], close[:-1]))
+        spread = np.abs(self.rng.normal(0, 0.005, missing))
+        self.open_time = np.concatenate((self.open_time, times))
+        self.open = np.concatenate((self.open, open_))
+        self.close = np.concatenate((self.close, close))
+        self.high = np.concatenate((self.high, np.maximum(open_, close) * (1 + spread)))
+        self.low = np.concatenate((self.low, np.minimum(open_, close) * (1 - spread)))
+        self.volume = np.concatenate((self.volume, self.rng.lognormal(8, 0.5, missing)))
+        if self.pump:
+            self._apply_pump()
+
+    def select(self, limit, start_time=None):
+        """نفس سلوك المنصة: آخر limit شمعة، أو أول limit شمعة تبدأ من start_time."""
+        if start_time is None:
+            first = max(0, len(self.open_time) - limit)
+        else:
+            first = int(np.searchsorted(self.open_time, start_time))
+        return slice(first, first + limit)
+
+    def binance_rows(self, s):
+        close_time = self.open_time[s] + self.interval_ms - 1
+        return [[int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.4f}", int(ct), f"{v * c:.4f}",
+                 100, "0", "0", "0"]
+                for t, o, h, l, c, v, ct in zip(self.open_time[s], self.open[s], self.high[s], self.low[s],
+                                                self.close[s], self.volume[s], close_time)]
+
+    def bingx_rows(self, s):
+        close_time = self.open_time[s] + self.interval_ms - 1
+        return [[int(t), float(o), float(h), float(l), float(c), float(v), int(ct), float(v * c)]
+                for t, o, h, l, c, v, ct in zip(self.open_time[s], self.open[s], self.high[s], self.low[s],
+                                                self.close[s], self.volume[s], close_time)]
+
+
+class ExchangeSimulator:
+    """
+    يولّد بيانات ثابتة لكل عملة (البذرة من اسمها) أو يقرأ شموعاً مسجلة، ويضيف تأخيراً
+    وأخطاء 5xx عشوائية، ويطبق حد الوزن في الدقيقة مع ترويسة X-MBX-USED-WEIGHT-1M و 429/Retry-After.
+    """
+
+    def __init__(self, symbols=500, latency=0.0, jitter=0.0, error_rate=0.0, weight_limit=6000,
+                 bingx_limit=600, pump_rate=PUMP_RATE, seed=7, recorded=None, resample_from=None,
+                 ws_push_seconds=WS_PUSH_SECONDS, ws_drop_seconds=None):
+        self.bases = [f"SIM{i:04d}" for i in range(symbols)]
+        self._base_set = set(self.bases)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.weight_limit = weight_limit
+        self.bingx_limit = bingx_limit
+        self.pump_rate = pump_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.recorded = self._load_recorded(recorded) if recorded else {}
+        self.resample_from = resample_from   # الفواصل الأعلى تُجمَّع من هذا الفاصل بدل توليدها مستقلة
+        self.ws_push_seconds = ws_push_seconds
+        self.ws_drop_seconds = ws_drop_seconds   # عمر كل اتصال WebSocket قبل قطعه من الخادم
+        self.clock_offset_ms = 0
+        self.sockets = {}    # اتصال WebSocket -> {اسم البث: آخر open_time أُرسل}
+        self.series = {}
+        self.window = None
+        self.used = {'binance': 0, 'bingx': 0}
+        self.stats = {}
+
+    @staticmethod
+    def _load_recorded(directory):
+        """ملفات {SYMBOL}_{interval}.json بصفوف الشموع كما أرجعتها المنصة (تُقدم كما هي)."""
+        recorded = {}
+        for name in os.listdir(directory):
+            if name.endswith(".json") and "_" in name:
+                symbol, interval = name[:-5].rsplit("_", 1)
+                with open(os.path.join(directory, name)) as f:
+                    recorded[(symbol, interval)] = json.load(f)
+        return recorded
+
+    def now_ms(self):
+        return int(time.time() * 1000) + self.clock_offset_ms
+
+    def advance(self, ms):
+        """تقديم ساعة المحاكي (شموع جديدة دون انتظار)؛ ما يفوت البث أثناءها يظهر كفجوة."""
+        self.clock_offset_ms += ms
+
+    def _series(self, base, interval):
+        key = (base, interval)
+        now_ms = self.now_ms()
+        series = self.series.get(key)
+        if series is None:
+            seed = zlib.crc32(f"{self.seed}:{base}:{interval}".encode())
+            pump = (seed % 10_000) < self.pump_rate * 10_000
+            candles = HISTORY_CANDLES
+            if interval == self.resample_from:
+                candles = max(candles, RESAMPLE_HISTORY_DAYS * INTERVAL_MS['1d'] // INTERVAL_MS[interval])
+            series = self.series[key] = CandleSeries(INTERVAL_MS[interval], seed, candles, pump, now_ms)
+        else:
+            series.extend(now_ms)
+        return series
+
+    def _resampled_rows(self, base, interval, limit, start_time):
+        """
+        شموع Binance لفاصل أعلى مجمّعة من صفوف الفاصل الأساسي بعد تنسيقها، كما تبني المنصة كل
+        الفواصل من نفس الصفقات، حتى يمكن التحقق من الاشتقاق المحلي (resampler.py check).
+        """
+        series = self._series(base, self.resample_from)
+        rows = series.binance_rows(slice(None))
+        times = np.array([r[0] for r in rows], dtype=np.int64)
+        values = np.array([[float(r[i]) for i in (1, 2, 3, 4, 5, 7)] for r in rows]).T
+        ms = INTERVAL_MS[interval]
+        buckets = times - times % ms
+        aligned = np.flatnonzero(times == buckets)
+        if not len(aligned):
+            return []
+        times, values, buckets = times[aligned[0]:], values[:, aligned[0]:], buckets[aligned[0]:]
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        ends = np.append(starts[1:], len(buckets)) - 1
+        open_times = buckets[starts]
+        if start_time is None:
+            first = max(0, len(starts) - limit)
+        else:
+            first = int(np.searchsorted(open_times, start_time))
+        picked = slice(first, first + limit)
+        high = np.maximum.reduceat(values[1], starts)
+        low = np.minimum.reduceat(values[2], starts)
+        volume = np.add.reduceat(values[4], starts)
+        quote = np.add.reduceat(values[5], starts)
+        return [[int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", repr(float(v)), int(t) + ms - 1,
+                 repr(float(q)), 100, "0", "0", "0"]
+                for t, o, h, l, c, v, q in zip(open_times[picked], values[0][starts][picked], high[picked],
+                                               low[picked], values[3][ends][picked], volume[picked], quote[picked])]
+
+    def _last_price(self, base):
+        return float(self._series(base, '1h').close[-1])
+
+    # --- الطبقة المشتركة: إحصاءات، تأخير، أخطاء، حدود ---
+    async def _gate(self, exchange, path, weight):
+        self.stats[path] = self.stats.get(path, 0) + 1
+        window = int(time.time() // 60)
+        if window != self.window:
+            self.window, self.used = window, {'binance': 0, 'bingx': 0}
+        self.used[exchange] += weight
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        limit = self.weight_limit if exchange == 'binance' else self.bingx_limit
+        headers = {'X-MBX-USED-WEIGHT-1M': str(self.used['binance'])} if exchange == 'binance' else {}
+        if self.used[exchange] > limit:
+            self.stats['429'] = self.stats.get('429', 0) + 1
+            retry_after = str(60 - int(time.time()) % 60)
+            return web.json_response({"code": -1003, "msg": "Too many requests"}, status=429,
+                                     headers=dict(headers, **{'Retry-After': retry_after}))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['5xx'] = self.stats.get('5xx', 0) + 1
+            return web.json_response({"code": -1001, "msg": "Internal error"}, status=503, headers=headers)
+        return headers
+
+    def _klines(self, symbol, base, request, formatter):
+        interval = request.query.get('interval', '1h')
+        limit = min(int(request.query.get('limit', 500)), MAX_KLINES_LIMIT)
+        start_time = request.query.get('startTime')
+        start_time = int(start_time) if start_time is not None else None
+        if (symbol, interval) in self.recorded:
+            rows = self.recorded[(symbol, interval)]
+            if start_time is not None:
+                rows = [r for r in rows if int(r[0]) >= start_time]
+                return rows[:limit]
+            return rows[-limit:]
+        if self.resample_from and interval != self.resample_from and formatter is CandleSeries.binance_rows:
+            return self._resampled_rows(base, interval, limit, start_time)
+        series = self._series(base, interval)
+        return formatter(series, series.select(limit, start_time))
+
+    # --- Binance ---
+    async def binance(self, request):
+        path = request.path
+        gate = await self._gate('binance', path, REQUEST_WEIGHTS.get(path, 1))
+        if isinstance(gate, web.Response):
+            return gate
+        query = request.query
+        if path == '/api/v3/klines':
+            symbol = query['symbol']
+            base = symbol[:-4]
+            if base not in self._base_set:
+                return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400, headers=gate)
+            data = self._klines(symbol, base, request, CandleSeries.binance_rows)
+        elif path == '/api/v3/exchangeInfo':
+            data = {'symbols': [{'symbol': f"{b}USDT", 'status': 'TRADING', 'baseAsset': b, 'quoteAsset': 'USDT'}
+                                for b in self.bases]}
+        elif path == '/api/v3/ticker/24hr':
+            data = [{'symbol': f"{b}USDT", 'lastPrice': f"{self._last_price(b):.8f}",
+                     'quoteVolume': f"{1e6 / (i + 1):.2f}"} for i, b in enumerate(self.bases)]
+        else:   # /api/v3/ticker/price
+            wanted = json.loads(query['symbols']) if 'symbols' in query else [f"{b}USDT" for b in self.bases]
+            if any(s[:-4] not in self._base_set for s in wanted):
+                return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400, headers=gate)
+            data = [{'symbol': s, 'price': f"{self._last_price(s[:-4]):.8f}"} for s in wanted]
+        return web.json_response(data, headers=gate)
+
+    # --- BingX ---
+    async def bingx(self, request):
+        path = request.path
+        gate = await self._gate('bingx', path, 1)
+        if isinstance(gate, web.Response):
+            return gate
+        if path == '/openApi/spot/v1/market/kline':
+            symbol = request.query['symbol']
+            base = symbol.split('-')[0]
+            if base not in self._base_set:
+                return web.json_response({"code": 100204, "msg": "symbol not exist"})
+            data = self._klines(symbol, base, request, CandleSeries.bingx_rows)
+        elif path == '/openApi/spot/v1/market/ticker':
+            data = [{'symbol': f"{b}-USDT", 'lastPrice': self._last_price(b), 'quoteVolume': 1e6 / (i + 1)}
+                    for i, b in enumerate(self.bases)]
+        else:   # /openApi/spot/v1/common/symbols
+            data = {'symbols': [{'symbol': f"{b}-USDT", 'status': 1} for b in self.bases]}
+        return web.json_response({"code": 0, "msg": "", "data": data})
+
+    # --- Telegram Bot API (TELEGRAM_BASE_URL) ---
+    async def telegram(self, request):
+        """getMe ومراسلات البوت بلا شبكة خارجية؛ getUpdates تنتظر قليلاً وتُرجع قائمة فارغة."""
+        method = request.match_info['method']
+        key = f"telegram.{method}"
+        self.stats[key] = self.stats.get(key, 0) + 1
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Falcon', 'username': 'falcon_sim_bot'}
+        elif method == 'getUpdates':
+            await asyncio.sleep(1)
+            result = []
+        elif method == 'sendMessage':
+            params = dict(await request.post()) if request.content_type != 'application/json' else await request.json()
+            result = {'message_id': self.stats[key], 'date': int(time.time()), 'text': params.get('text', ''),
+                      'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'}}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    # --- بث الشموع (wss://stream.binance.com:9443/stream) ---
+    async def stream(self, request):
+        """SUBSCRIBE/UNSUBSCRIBE كرسائل JSON، ثم إطارات {"stream", "data"} لكل بث <symbol>@kline_<interval>."""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats['ws.connect'] = self.stats.get('ws.connect', 0) + 1
+        subscriptions = self.sockets[ws] = {}
+        pusher = asyncio.create_task(self._push(ws, subscriptions))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                method, params = payload.get('method'), payload.get('params') or []
+                if method == 'SUBSCRIBE':
+                    for name in params:
+                        subscriptions.setdefault(name, None)
+                elif method == 'UNSUBSCRIBE':
+                    for name in params:
+                        subscriptions.pop(name, None)
+                key = f"ws.{str(method).lower()}"
+                self.stats[key] = self.stats.get(key, 0) + len(params)
+                await ws.send_json({'result': None, 'id': payload.get('id')})
+        finally:
+            pusher.cancel()
+            self.sockets.pop(ws, None)
+        return ws
+
+    def _kline_frame(self, name, series, i, closed):
+        symbol, interval = name.split('@kline_')
+        row = series.binance_rows(slice(i, i + 1))[0]
+        k = {'t': row[0], 'T': row[6], 's': symbol.upper(), 'i': interval, 'o': row[1], 'h': row[2], 'l': row[3],
+             'c': row[4], 'v': row[5], 'n': row[8], 'x': closed, 'q': row[7], 'V': row[9], 'Q': row[10]}
+        return {'stream': name, 'data': {'e': 'kline', 'E': self.now_ms(), 's': k['s'], 'k': k}}
+
+    async def _push(self, ws, subscriptions):
+        opened = time.monotonic()
+        while not ws.closed:
+            await asyncio.sleep(self.ws_push_seconds)
+            if self.ws_drop_seconds is not None and time.monotonic() - opened >= self.ws_drop_seconds:
+                await ws.close(code=1001, message=b'forced disconnect')
+                return
+            for name, last in list(subscriptions.items()):
+                symbol, _, interval = name.partition('@kline_')
+                base = symbol.upper()[:-4]
+                if base not in self._base_set or interval not in INTERVAL_MS:
+                    continue
+                series = self._series(base, interval)
+                current = int(series.open_time[-1])
+                frames = []
+                if last is not None and last < current:
+                    # الإغلاق النهائي للشمعة السابقة (x=true) ثم الشمعة الجديدة، كما ترسل المنصة
+                    frames.append(self._kline_frame(name, series, int(np.searchsorted(series.open_time, last)), True))
+                frames.append(self._kline_frame(name, series, len(series.open_time) - 1, False))
+                subscriptions[name] = current
+                for frame in frames:
+                    await ws.send_json(frame)
+
+    async def drop_sockets(self):
+        """يقطع كل اتصالات البث الحالية (العميل يعيد الاتصال والاشتراك بنفسه)."""
+        for ws in list(self.sockets):
+            await ws.close(code=1001, message=b'forced disconnect')
+
+    async def drop(self, request):
+        dropped = len(self.sockets)
+        await self.drop_sockets()
+        return web.json_response({'dropped': dropped})
+
+    async def advance_clock(self, request):
+        self.advance(int(request.query.get('ms', 0)))
+        return web.json_response({'now': self.now_ms()})
+
+    # --- إحصاءات للاختبارات ---
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats, requests=sum(v for k, v in self.stats.items() if k.startswith('/'))))
+
+    async def reset_stats(self, request):
+        self.stats = {}
+        return web.json_response({})
+
+    def create_app(self):
+        app = web.Application()
+        for path in ('/api/v3/klines', '/api/v3/exchangeInfo', '/api/v3/ticker/24hr', '/api/v3/ticker/price'):
+            app.router.add_get(path, self.binance)
+        for path in ('/openApi/spot/v1/market/kline', '/openApi/spot/v1/market/ticker',
+                     '/openApi/spot/v1/common/symbols'):
+            app.router.add_get(path, self.bingx)
+        app.router.add_route('*', '/bot{token}/{method}', self.telegram)
+        app.router.add_get('/stream', self.stream)
+        app.router.add_post('/__drop', self.drop)
+        app.router.add_post('/__advance', self.advance_clock)
+        app.router.add_get('/__stats', self.get_stats)
+        app.router.add_post('/__reset', self.reset_stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="محاكي محلي لنقاط Binance و BingX")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help="تأخير ثابت لكل طلب (ثوان)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="تأخير عشوائي إضافي حتى هذه القيمة")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="نسبة الردود 503")
+    parser.add_argument('--weight-limit', type=int, default=6000, help="حد وزن Binance في الدقيقة")
+    parser.add_argument('--bingx-limit', type=int, default=600, help="حد طلبات BingX في الدقيقة")
+    parser.add_argument('--pump-rate', type=float, default=PUMP_RATE)
+    parser.add_argument('--recorded', help="مجلد شموع مسجلة {SYMBOL}_{interval}.json")
+    parser.add_argument('--resample-from', help="تجميع فواصل Binance الأعلى من هذا الفاصل (مثل 15m)")
+    parser.add_argument('--ws-push-seconds', type=float, default=WS_PUSH_SECONDS, help="فترة دفع تحديثات البث")
+    parser.add_argument('--ws-drop-seconds', type=float, help="قطع كل اتصال بث بعد هذه المدة (اختبار إعادة الاتصال)")
+    args = parser.parse_args()
+    simulator = ExchangeSimulator(args.symbols, args.latency, args.jitter, args.error_rate, args.weight_limit,
+                                  args.bingx_limit, args.pump_rate, recorded=args.recorded,
+                                  resample_from=args.resample_from, ws_push_seconds=args.ws_push_seconds,
+                                  ws_drop_seconds=args.ws_drop_seconds)
+    print(f"[Simulator] {args.symbols} عملة على المنفذ {args.port}", flush=True)
+    web.run_app(simulator.create_app(), host='127.0.0.1', port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    main()
@@ -0,0 +1,30 @@
+# -----------------------------------------------------------------------------
+# fast_start.py - نقطة تشغيل سريعة: يُربط منفذ الصحة قبل استيراد تيليجرام والمكتبات الثقيلة
+# -----------------------------------------------------------------------------
+#   python fast_start.py [hybrid,sniper,...]
+# المنصة (Render وغيرها) ترى المنفذ مفتوحاً خلال أجزاء من الثانية بحالة warming،
+# و /ready تُرجع 200 بعد تحميل معلومات المنصات وبدء الخدمات.
+
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+from health_server import HEALTH, WARMING, start_health_server
+
+start_health_server(int(os.environ.get("PORT", 10000)))
+HEALTH.set(WARMING, phase='imports')
+
+
+def main():
+    import runtime
+    HEALTH.set(WARMING, imports_seconds=round(time.perf_counter() - STARTED, 3))
+    strategies = [name.strip() for name in sys.argv[1].split(",") if name.strip()] if len(sys.argv) > 1 else None
+    runtime.main(strategies)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    main()
@@ -0,0 +1,131 @@
+# -----------------------------------------------------------------------------
+# fetch_engine.py - محرك جلب غير متزامن لبيانات Binance (شموع متوازية محدودة)
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import time
+import logging
+import asyncio
+import aiohttp
+from metrics import METRICS, REQUEST_WEIGHTS
+from weight_governor import get_governor, HIGH, NORMAL, LOW
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BINANCE_BASE_URL = os.environ.get("BINANCE_BASE_URL", "https://api.binance.com")
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TIMEOUT_SECONDS = 10
+DEFAULT_RETRIES = 2
+
+
+class FetchEngine:
+    """
+    يجلب الشموع لقائمة كاملة من العملات بالتوازي عبر جلسة aiohttp واحدة،
+    مع حد أقصى للطلبات المتزامنة ومهلة لكل طلب، دون أن يحجب حلقة asyncio.
+    كل طلب يحجز وزنه أولاً من WeightGovernor المشترك لكل عملاء Binance في العملية.
+    """
+
+    exchange = 'binance'
+
+    def __init__(self, base_url=BINANCE_BASE_URL, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT_SECONDS, retries=DEFAULT_RETRIES, governor=None):
+        self.base_url = base_url.rstrip('/')
+        self.governor = governor or get_governor(self.exchange)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+        self._semaphore = None
+
+    async def _get_session(self):
+        # تُنشأ الجلسة عند أول استخدام داخل الحلقة التي ستستعملها
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get(self, path, params=None, priority=NORMAL):
+        session = await self._get_session()
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                await self.governor.acquire(REQUEST_WEIGHTS.get(path, 1), priority)
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    async with session.get(url, params=params,
+                                           timeout=aiohttp.ClientTimeout(total=self.timeout)) as r:
+                        METRICS.add_weight(self.exchange, path, r.headers.get('X-MBX-USED-WEIGHT-1M'))
+                        await self.governor.observe(r.status, r.headers)
+                        r.raise_for_status()
+                        data = await r.json()
+                    METRICS.observe_latency(self.exchange, time.perf_counter() - start)
+                    return data
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                last_error = e
+                METRICS.count_error(self.exchange)
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+                METRICS.count_error(self.exchange)
+                # 429/418: المحاولة التالية تنتظر داخل acquire حتى ينتهي Retry-After
+                if e.status < 500 and e.status not in (429, 418):
+                    break
+            if attempt < self.retries:
+                await asyncio.sleep(0.5 * (attempt + 1))
+        raise last_error
+
+    async def klines(self, symbol, interval, limit, start_time=None):
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        return await self.get("/api/v3/klines", params)
+
+    async def klines_many(self, symbols, interval, limit, cache=None):
+        """
+        تُرجع قاموساً {الرمز: الشموع}. العملة التي فشل جلبها تُرجع None
+        حتى لا يُسقط خطأ واحد الجولة كاملة. مع cache (KlineCache) يُجلب الفرق فقط.
+        """
+        async def fetch_one(symbol):
+            try:
+                if cache is not None:
+                    return symbol, await cache.fetch((self.exchange, symbol, interval), limit, self.klines)
+                return symbol, await self.klines(symbol, interval, limit)
+            except Exception as e:
+                logger.error(f"[FetchEngine] فشل في جلب الشموع لـ {symbol}: {e}")
+                return symbol, None
+
+        results = await asyncio.gather(*(fetch_one(s) for s in symbols))
+        return dict(results)
+
+    async def exchange_info(self):
+        return await self.get("/api/v3/exchangeInfo", priority=LOW)
+
+    async def tickers_24h(self):
+        return await self.get("/api/v3/ticker/24hr", priority=LOW)
+
+    async def prices(self, symbols):
+        """
+        أسعار عدة عملات في طلب واحد (/api/v3/ticker/price?symbols=[...]).
+        إن رفضت المنصة رمزاً واحداً تُجلب أسعار السوق كاملة ثم تُفلتر.
+        أولوية عالية: فحص الصفقات المفتوحة لا ينتظر خلف جولات الاكتشاف.
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        try:
+            params = {"symbols": json.dumps(symbols, separators=(',', ':'))}
+            tickers = await self.get("/api/v3/ticker/price", params, priority=HIGH)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 400:
+                raise
+            tickers = await self.get("/api/v3/ticker/price", priority=HIGH)
+        wanted = set(symbols)
+        return {t['symbol']: float(t['price']) for t in tickers if t['symbol'] in wanted}
@@ -0,0 +1,110 @@
+# -----------------------------------------------------------------------------
+# health_server.py - خادم صحة بالمكتبة القياسية فقط يُربط بالمنفذ قبل تحميل أي مكتبة ثقيلة
+# -----------------------------------------------------------------------------
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STARTING, WARMING, READY = 'starting', 'warming', 'ready'
+
+
+class HealthState:
+    """حالة العملية كما يراها المنصة: starting ← warming (تحميل/تهيئة) ← ready."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.state = STARTING
+        self.detail = {}
+        self.timings = {}   # الحالة -> الثواني منذ بدء العملية عند أول دخول إليها
+
+    def set(self, state, **detail):
+        self.state = state
+        self.detail.update(detail)
+        self.timings.setdefault(state, round(time.time() - self.started_at, 3))
+
+    def snapshot(self):
+        return {'state': self.state, 'uptime_seconds': round(time.time() - self.started_at, 1),
+                'timings': dict(self.timings), **self.detail}
+
+
+HEALTH = HealthState()
+_routes = {}
+_server = None
+
+
+def add_route(path, handler):
+    """handler() تُرجع (الحالة، نوع المحتوى، النص) وتُستدعى من خيط الخادم."""
+    _routes[path] = handler
+
+
+def _health():
+    return 200, 'application/json', json.dumps(HEALTH.snapshot(), ensure_ascii=False)
+
+
+def _ready():
+    status = 200 if HEALTH.state == READY else 503
+    return status, 'application/json', json.dumps(HEALTH.snapshot(), ensure_ascii=False)
+
+
+def _metrics():
+    from metrics import METRICS
+    return 200, 'text/plain; version=0.0.4', METRICS.render_prometheus()
+
+
+def _metrics_json():
+    from metrics import METRICS
+    return 200, 'application/json', json.dumps(METRICS.summary(), ensure_ascii=False)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        handler = _routes.get(self.path.split('?', 1)[0])
+        if handler is None:
+            status, content_type, body = 404, 'text/plain', 'not found'
+        else:
+            try:
+                status, content_type, body = handler()
+            except Exception as e:
+                status, content_type, body = 500, 'text/plain', str(e)
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8" if 'charset' not in content_type else content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_health_server(port, host='0.0.0.0'):
+    """يربط المنفذ فوراً في خيط خلفي؛ الاستدعاء الثاني يُرجع الخادم نفسه."""
+    global _server
+    if _server is None:
+        for path, handler in (('/', _health), ('/health', _health), ('/ready', _ready),
+                              ('/metrics', _metrics), ('/metrics.json', _metrics_json)):
+            _routes.setdefault(path, handler)
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="health-server", daemon=True).start()
+        HEALTH.set(HEALTH.state, port=port)
+    return _server
+
+
+def register_aiohttp_health(app):
+    """/health و /ready لتطبيق aiohttp.web (وضع webhook في ccxt_bot لا يمر بهذا الخادم)."""
+    from aiohttp import web
+
+    def view(handler):
+        async def respond(request):
+            status, content_type, body = handler()
+            return web.Response(status=status, text=body, content_type=content_type)
+        return respond
+
+    app.router.add_get('/health', view(_health))
+    app.router.add_get('/ready', view(_ready))
@@ -0,0 +1,137 @@
+# -----------------------------------------------------------------------------
+# indicators.py - مؤشرات تزايدية O(1) لكل شمعة جديدة (RSI / EMA / MACD)
+# -----------------------------------------------------------------------------
+
+from collections import deque
+
+MACD_SIGNAL_SPAN = 9
+HISTORY_LIMIT = 1000   # أقصى طول نافذة تُطابق قيمها (حالات الشموع المغلقة المحفوظة)
+
+
+def _ewm_step(prev, value, alpha):
+    # نفس صيغة pandas ewm(adjust=False) بما فيها القسمة على مجموع الأوزان،
+    # حتى تتطابق القيم بت ببت تقريباً مع calculate_indicators
+    return ((1 - alpha) * prev + alpha * value) / ((1 - alpha) + alpha)
+
+
+def _geometric_ewm(ratio, decay, alpha, steps):
+    """قيمة EWM (تبدأ من 1) لمتتالية ratio**k بعد steps خطوة: decay**n + alpha·r·(r**n - decay**n)/(r - decay)."""
+    return decay ** steps + alpha * ratio * (ratio ** steps - decay ** steps) / (ratio - decay)
+
+
+class IndicatorState:
+    """
+    يحتفظ بالحالة التكرارية لمؤشرات عملة واحدة (آخر قيم EMA، متوسط الربح/الخسارة
+    لـ RSI بطريقة Wilder، خط إشارة MACD) ويحدّثها بعمليات ثابتة لكل شمعة مغلقة.
+    update تُرجع القيم محسوبة على كامل السلسلة منذ أول شمعة مُدخلة، أما sync فتُرجع نفس ما
+    يحسبه calculate_indicators في bot.py على نافذة REST وحدها: كل المؤشرات خطية في بدايتها،
+    فيُطرح أثر ما قبل النافذة بتصحيح مغلق الصيغة من الحالة المحفوظة عند أول شمعة فيها.
+    """
+
+    __slots__ = ('rsi_alpha', 'count', 'last_open_time', 'prev_close', 'avg_gain', 'avg_loss',
+                 'ema9', 'ema25', 'ema12', 'ema26', 'signal', 'history')
+
+    def __init__(self, rsi_period=14, history=HISTORY_LIMIT):
+        self.rsi_alpha = 1 / rsi_period
+        self.history = deque(maxlen=history)   # (open_time, close, الحالة) لكل شمعة مغلقة
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.last_open_time = None
+        self.prev_close = None
+        self.avg_gain = self.avg_loss = 0.0
+        self.ema9 = self.ema25 = self.ema12 = self.ema26 = self.signal = 0.0
+        self.history.clear()
+
+    def _next(self, close):
+        if self.count == 0:
+            # أول شمعة: فرق السعر NaN في pandas ويُستبدل بصفر، وكل EMA تبدأ من السعر نفسه
+            return (0.0, 0.0, close, close, close, close, 0.0)
+        delta = close - self.prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        avg_gain = _ewm_step(self.avg_gain, gain, self.rsi_alpha)
+        avg_loss = _ewm_step(self.avg_loss, loss, self.rsi_alpha)
+        ema9 = _ewm_step(self.ema9, close, 2 / 10)
+        ema25 = _ewm_step(self.ema25, close, 2 / 26)
+        ema12 = _ewm_step(self.ema12, close, 2 / 13)
+        ema26 = _ewm_step(self.ema26, close, 2 / 27)
+        signal = _ewm_step(self.signal, ema12 - ema26, 2 / (MACD_SIGNAL_SPAN + 1))
+        return (avg_gain, avg_loss, ema9, ema25, ema12, ema26, signal)
+
+    @staticmethod
+    def _values(avg_gain, avg_loss, ema9, ema25, ema12, ema26, signal):
+        rs = avg_gain / (avg_loss if avg_loss != 0 else 1e-10)
+        return {
+            'RSI': 100 - (100 / (1 + rs)),
+            'EMA9': ema9,
+            'EMA25': ema25,
+            'MACD': ema12 - ema26,
+            'Signal': signal,
+        }
+
+    def update(self, close, open_time=None):
+        """تُدخل شمعة مغلقة في الحالة وتُرجع قيم المؤشرات عندها."""
+        state = self._next(close)
+        (self.avg_gain, self.avg_loss, self.ema9, self.ema25,
+         self.ema12, self.ema26, self.signal) = state
+        self.prev_close = close
+        self.last_open_time = open_time
+        self.count += 1
+        self.history.append((open_time, close, state))
+        return self._values(*state)
+
+    def peek(self, close):
+        """قيم المؤشرات لو أُضيفت شمعة بهذا السعر، دون تعديل الحالة (للشمعة التي لم تُغلق بعد)."""
+        return self._values(*self._next(close))
+
+    def _windowed(self, state, origin, origin_close, steps):
+        """
+        قيم الحالة state محسوبة كأن السلسلة تبدأ عند origin (قبلها بـ steps شمعة):
+        في pandas تبدأ كل EMA من سعر أول شمعة، ومتوسطا RSI من صفر (فرق أول شمعة NaN).
+        """
+        avg_gain, avg_loss, ema9, ema25, ema12, ema26, signal = state
+        gain0, loss0, o9, o25, o12, o26, signal0 = origin
+        rsi_decay = (1 - self.rsi_alpha) ** steps
+        r9, r25, r12, r26 = 1 - 2 / 10, 1 - 2 / 26, 1 - 2 / 13, 1 - 2 / 27
+        alpha = 2 / (MACD_SIGNAL_SPAN + 1)
+        decay = 1 - alpha
+        c12, c26 = o12 - origin_close, o26 - origin_close
+        # الإشارة: EWM لـ MACD النافذة = EWM لـ MACD الكامل ناقص EWM لفرقي EMA12/EMA26 المتلاشيين
+        signal = (signal - decay ** steps * (signal0 - (o12 - o26))
+                  - c12 * _geometric_ewm(r12, decay, alpha, steps) + c26 * _geometric_ewm(r26, decay, alpha, steps))
+        return (avg_gain - rsi_decay * gain0, avg_loss - rsi_decay * loss0,
+                ema9 - r9 ** steps * (o9 - origin_close), ema25 - r25 ** steps * (o25 - origin_close),
+                ema12 - r12 ** steps * c12, ema26 - r26 ** steps * c26, signal)
+
+    def sync(self, open_times, closes):
+        """
+        يزامن الحالة مع نافذة شموع REST (آخر شمعة فيها ما زالت تتشكل):
+        تُدخل الشموع المغلقة الجديدة فقط، ويُعاد البناء من النافذة عند وجود فجوة.
+        تُرجع قيم المؤشرات عند آخر شمعة محسوبة على هذه النافذة وحدها (كما في calculate_indicators).
+        """
+        start = None
+        if self.last_open_time is not None:
+            for i in range(len(open_times) - 2, -1, -1):
+                if open_times[i] == self.last_open_time:
+                    start = i + 1
+                    break
+                if open_times[i] < self.last_open_time:
+                    break
+        if start is None:
+            self.reset()
+            start = 0
+        for i in range(start, len(closes) - 1):
+            self.update(closes[i], open_times[i])
+        steps = len(closes) - 1
+        if self.count == steps:
+            # الحالة بدأت عند أول شمعة في النافذة: قيمها هي قيم النافذة
+            return self.peek(closes[-1])
+        first = len(self.history) - steps
+        if first < 0 or self.history[first][0] != open_times[0]:
+            # النافذة أطول من المحفوظ أو فيها فجوة داخلية: إعادة البناء منها
+            self.reset()
+            return self.sync(open_times, closes)
+        _, origin_close, origin = self.history[first]
+        return self._values(*self._windowed(self._next(closes[-1]), origin, origin_close, steps))
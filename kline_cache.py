@@ -0,0 +1,145 @@
+# -----------------------------------------------------------------------------
+# kline_cache.py - ذاكرة شموع محلية (Ring Buffer) لكل عملة مع جلب الفرق فقط
+# -----------------------------------------------------------------------------
+
+import time
+import logging
+import threading
+from collections import deque
+from kline_parser import LAYOUTS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+DEFAULT_CAPACITY = 200
+DELTA_HEADROOM = 2   # شموع إضافية في طلب الفرق (الشمعة المتشكلة + هامش لساعة الخادم)
+INTERVAL_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+               '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '1d': 86_400_000}
+# موضع وقت الفتح ووقت الإغلاق داخل صف الشمعة لكل منصة
+ROW_LAYOUT = {exchange: layout['times'] for exchange, layout in LAYOUTS.items()}
+
+
+class KlineRing:
+    """
+    مخزن بحجم ثابت لشموع (منصة، عملة، فاصل) واحدة. يحفظ الشموع المغلقة فقط،
+    والشمعة التي ما زالت تتشكل تُحفظ منفصلة وتُستبدل في كل جلب.
+    """
+
+    __slots__ = ('closed', 'forming', 'open_idx', 'close_idx', 'interval_ms')
+
+    def __init__(self, capacity, interval_ms, open_idx=0, close_idx=6):
+        self.closed = deque(maxlen=capacity)
+        self.forming = None
+        self.open_idx = open_idx
+        self.close_idx = close_idx
+        self.interval_ms = interval_ms
+
+    def last_close_time(self):
+        return int(self.closed[-1][self.close_idx]) if self.closed else None
+
+    def merge(self, rows):
+        """
+        يدمج شموعاً جديدة. آخر صف في كل استجابة يُعامل كشمعة تتشكل فلا يُثبَّت،
+        لذلك يُعاد جلبه في الطلب التالي. تُرجع False إن ظهرت فجوة زمنية
+        (شموع مفقودة بين آخر شمعة محفوظة وأول شمعة جديدة) حتى يُلغى المدخل.
+        """
+        if not rows:
+            return True
+        last_open = int(self.closed[-1][self.open_idx]) if self.closed else None
+        self.forming = None
+        for row in rows[:-1]:
+            open_time = int(row[self.open_idx])
+            if last_open is not None:
+                if open_time <= last_open:
+                    continue
+                if open_time != last_open + self.interval_ms:
+                    return False
+            self.closed.append(row)
+            last_open = open_time
+        row = rows[-1]
+        if last_open is not None and int(row[self.open_idx]) > last_open + self.interval_ms:
+            return False
+        if last_open is None or int(row[self.open_idx]) > last_open:
+            self.forming = row
+        return True
+
+    def window(self, limit):
+        rows = list(self.closed)
+        if self.forming is not None:
+            rows.append(self.forming)
+        return rows[-limit:]
+
+
+class KlineCache:
+    """
+    ذاكرة مشتركة مفهرسة بـ (exchange, symbol, interval). بعد التحميل الأول تطلب
+    فقط الشموع الأحدث من آخر close_time محفوظ (limit بقدر الناقص لا النافذة كاملة)،
+    ثم تُرجع نافذة بنفس صيغة REST.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._rings = {}
+        self._lock = threading.Lock()
+        self.full_fetches = 0
+        self.delta_fetches = 0
+
+    def _ring(self, key, create=True):
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None and create:
+                exchange, symbol, interval = key
+                open_idx, close_idx = ROW_LAYOUT.get(exchange, (0, 6))
+                ring = KlineRing(self.capacity, INTERVAL_MS[interval], open_idx, close_idx)
+                self._rings[key] = ring
+            return ring
+
+    def invalidate(self, key):
+        with self._lock:
+            self._rings.pop(key, None)
+
+    def plan(self, key, limit):
+        """(start_time، حجم الطلب) للطلب التالي؛ start_time=None يعني تحميلاً كاملاً بـ limit شمعة."""
+        ring = self._ring(key, create=False)
+        if ring is None or len(ring.closed) + 1 < limit:
+            return None, limit
+        start_time = ring.last_close_time() + 1
+        missing = (int(time.time() * 1000) - start_time) // ring.interval_ms + 1
+        return start_time, max(1, min(limit, missing + DELTA_HEADROOM))
+
+    def store(self, key, rows, full):
+        if full:
+            self.invalidate(key)
+        ring = self._ring(key)
+        if not ring.merge(rows):
+            logger.warning(f"[KlineCache] فجوة في شموع {key}، سيُعاد التحميل الكامل")
+            self.invalidate(key)
+            return False
+        return True
+
+    def window(self, key, limit):
+        ring = self._ring(key, create=False)
+        return ring.window(limit) if ring is not None else []
+
+    async def fetch(self, key, limit, fetch):
+        """
+        fetch(symbol, interval, limit, start_time) دالة async تُرجع صفوف الشموع من المنصة.
+        """
+        exchange, symbol, interval = key
+        start_time, size = self.plan(key, limit)
+        rows = await fetch(symbol, interval, size, start_time)
+        if not self._after_fetch(key, rows, start_time, size):
+            rows = await fetch(symbol, interval, limit, None)
+            self._after_fetch(key, rows, None, limit)
+        return self.window(key, limit)
+
+    def _after_fetch(self, key, rows, start_time, limit):
+        rows = rows or []
+        if start_time is None:
+            self.full_fetches += 1
+            return self.store(key, rows, True)
+        self.delta_fetches += 1
+        # صفحة ممتلئة تعني أن الغياب أطول من المتوقع: الأسرع إعادة التحميل الكامل
+        if len(rows) >= limit:
+            return False
+        return self.store(key, rows, False)
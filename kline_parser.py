@@ -0,0 +1,156 @@
+# -----------------------------------------------------------------------------
+# kline_parser.py - تحويل استجابات الشموع مباشرة إلى مصفوفات NumPy رقمية
+# -----------------------------------------------------------------------------
+
+import time
+import numpy as np
+
+# صفوف مصفوفة الأوقات (int64) ومصفوفة القيم (float64). كل حقل صف متصل في الذاكرة،
+# فـ k.close مثلاً عرض (view) بدون نسخ يمكن تمريره لدوال المؤشرات مباشرة.
+OPEN_TIME, CLOSE_TIME = 0, 1
+OPEN, HIGH, LOW, CLOSE, VOLUME, QUOTE_VOLUME = range(6)
+FIELDS = ('open', 'high', 'low', 'close', 'volume', 'quote_volume')
+
+# موضع كل حقل داخل صف الشمعة كما تُرجعه كل منصة
+LAYOUTS = {
+    # /api/v3/klines: [openTime, o, h, l, c, v, closeTime, quoteVolume, trades, takerBase, takerQuote, ignore]
+    'binance': {'width': 12, 'times': (0, 6), 'values': (1, 2, 3, 4, 5, 7)},
+    # /openApi/spot/v1/market/kline: [openTime, o, h, l, c, v, closeTime, quoteVolume]
+    'bingx': {'width': 8, 'times': (0, 6), 'values': (1, 2, 3, 4, 5, 7)},
+}
+
+
+class KlineLayoutError(ValueError):
+    """صف شمعة لا يطابق ترتيب الأعمدة المتوقع للمنصة."""
+
+
+class Klines:
+    """شموع عملة واحدة كمصفوفتين: times (2 × N) و values (6 × N)."""
+
+    __slots__ = ('times', 'values')
+
+    def __init__(self, times, values):
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    open_time = property(lambda self: self.times[OPEN_TIME])
+    close_time = property(lambda self: self.times[CLOSE_TIME])
+    open = property(lambda self: self.values[OPEN])
+    high = property(lambda self: self.values[HIGH])
+    low = property(lambda self: self.values[LOW])
+    close = property(lambda self: self.values[CLOSE])
+    volume = property(lambda self: self.values[VOLUME])
+    quote_volume = property(lambda self: self.values[QUOTE_VOLUME])
+
+
+def _validate(rows, layout, exchange):
+    width = layout['width']
+    if any(len(row) != width for row in rows):
+        bad = next(row for row in rows if len(row) != width)
+        raise KlineLayoutError(f"{exchange}: صف بـ {len(bad)} عمود بدلاً من {width}: {bad!r}"[:200])
+
+
+def _fill(rows, layout, times, values):
+    # تحويل كل حقل في تمريرة واحدة إلى صف مخصص مسبقاً، بلا DataFrame ولا أعمدة object
+    for j, idx in enumerate(layout['times']):
+        times[j] = [row[idx] for row in rows]
+    for j, idx in enumerate(layout['values']):
+        values[j] = [row[idx] for row in rows]
+
+
+def parse_klines(rows, exchange='binance'):
+    """
+    يحوّل قائمة صفوف الشموع (نصوص أو أرقام) إلى Klines بعد التحقق من عدد الأعمدة
+    وأن أوقات الفتح تصاعدية. يرفع KlineLayoutError عند عدم التطابق.
+    """
+    layout = LAYOUTS[exchange]
+    _validate(rows, layout, exchange)
+    times = np.empty((2, len(rows)), dtype=np.int64)
+    values = np.empty((len(layout['values']), len(rows)), dtype=np.float64)
+    _fill(rows, layout, times, values)
+    if len(rows) > 1 and not (np.diff(times[OPEN_TIME]) > 0).all():
+        raise KlineLayoutError(f"{exchange}: أوقات الفتح ليست تصاعدية (ترتيب أعمدة خاطئ؟)")
+    return Klines(times, values)
+
+
+def closed_rows(rows, exchange='binance', now_ms=None):
+    """
+    صفوف REST دون الشمعة التي ما زالت تتشكل (آخر صف إن لم يمر close_time بعد).
+    الجولات تنطلق بعد الإغلاق بثوان، فآخر صف عندها شمعة عمرها ثوان لا تصلح لقواعد الحجم والشكل.
+    """
+    if not rows:
+        return rows
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return rows[:-1] if int(rows[-1][LAYOUTS[exchange]['times'][1]]) >= now_ms else rows
+
+
+def parse_many(rows_list, exchange='binance'):
+    """
+    يحوّل شموع عدة عملات متساوية الطول إلى مصفوفتين مخصصتين مرة واحدة:
+    times (عملات × 2 × شموع) و values (عملات × 6 × شموع).
+    """
+    layout = LAYOUTS[exchange]
+    length = len(rows_list[0]) if rows_list else 0
+    times = np.empty((len(rows_list), 2, length), dtype=np.int64)
+    values = np.empty((len(rows_list), len(layout['values']), length), dtype=np.float64)
+    for i, rows in enumerate(rows_list):
+        if len(rows) != length:
+            raise KlineLayoutError(f"{exchange}: عدد شموع مختلف ({len(rows)} بدلاً من {length})")
+        _validate(rows, layout, exchange)
+        _fill(rows, layout, times[i], values[i])
+    return times, values
+
+
+# --- قياس الوقت والذاكرة مقارنة بمسار pandas الحالي ---
+if __name__ == "__main__":
+    import random
+    import tracemalloc
+    import pandas as pd
+
+    random.seed(3)
+    symbols, candles = 500, 100
+    dataset = []
+    for _ in range(symbols):
+        price, rows = random.uniform(0.01, 500), []
+        for i in range(candles):
+            price *= 1 + random.uniform(-0.01, 0.01)
+            rows.append([i * 3_600_000, f"{price:.8f}", f"{price * 1.01:.8f}", f"{price * 0.99:.8f}",
+                         f"{price:.8f}", f"{random.uniform(10, 1000):.4f}", i * 3_600_000 + 3_599_999,
+                         f"{random.uniform(1e3, 1e5):.4f}", 100, "0", "0", "0"])
+        dataset.append(rows)
+
+    def pandas_path(rows):
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+                                         'quote_av', 'trades', 'tb_base_av', 'tb_quote_av', 'ignore'])
+        df[['close', 'open', 'volume']] = df[['close', 'open', 'volume']].apply(pd.to_numeric)
+        return df
+
+    def measure(label, func):
+        func()   # إحماء
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<28} {elapsed * 1000:>8.1f} ms   ذروة الذاكرة {peak / 1024:>8.0f} KiB")
+        return elapsed
+
+    print(f"{symbols} عملة × {candles} شمعة")
+    base = measure("pandas DataFrame لكل عملة", lambda: [pandas_path(rows) for rows in dataset])
+    single = measure("parse_klines لكل عملة", lambda: [parse_klines(rows) for rows in dataset])
+    batch = measure("parse_many دفعة واحدة", lambda: parse_many(dataset))
+    print(f"التسريع: x{base / single:.0f} (فردي)، x{base / batch:.0f} (دفعة)")
+
+    # نفس القيم التي يعطيها مسار pandas
+    reference, parsed = pandas_path(dataset[0]), parse_klines(dataset[0])
+    assert np.array_equal(reference['close'].to_numpy(), parsed.close)
+    assert np.array_equal(reference['volume'].to_numpy(), parsed.volume)
+    assert np.shares_memory(parsed.close, parsed.values)
+    try:
+        parse_klines([row[:6] for row in dataset[0]], 'bingx')
+    except KlineLayoutError as e:
+        print(f"رفض الترتيب الخاطئ: {e}"[:120])
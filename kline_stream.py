@@ -0,0 +1,202 @@
+# -----------------------------------------------------------------------------
+# kline_stream.py - محرك بث الشموع عبر WebSocket (Binance combined streams)
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import logging
+import asyncio
+from collections import deque
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BINANCE_WS_URL = os.environ.get("BINANCE_WS_URL", "wss://stream.binance.com:9443/stream")
+MAX_STREAMS_PER_CONNECTION = 200   # Binance يسمح بـ 1024 لكن نوزع الحمل على أكثر من اتصال
+SUBSCRIBE_CHUNK = 100              # عدد البثوث في رسالة SUBSCRIBE واحدة
+SUBSCRIBE_PAUSE_SECONDS = 0.25     # حد Binance: 5 رسائل واردة في الثانية
+INTERVAL_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+               '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '1d': 86_400_000}
+
+
+class StreamClient:
+    """
+    اتصال WebSocket واحد بنقطة /stream مع اشتراك عبر رسائل SUBSCRIBE.
+    عند انقطاع الاتصال يعيد الاتصال تلقائياً بتأخير متزايد ثم يعيد الاشتراك بكل البثوث.
+    """
+
+    def __init__(self, streams, on_message, url=BINANCE_WS_URL, reconnect_delay=1.0,
+                 max_reconnect_delay=60.0, on_reconnect=None):
+        self.streams = set(streams)
+        self.on_message = on_message
+        self.on_reconnect = on_reconnect
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._ws = None
+        self._request_id = 0
+        self._stopped = False
+
+    async def _send_subscription(self, method, streams):
+        streams = sorted(streams)
+        for i in range(0, len(streams), SUBSCRIBE_CHUNK):
+            self._request_id += 1
+            payload = {"method": method, "params": streams[i:i + SUBSCRIBE_CHUNK], "id": self._request_id}
+            await self._ws.send(json.dumps(payload))
+            await asyncio.sleep(SUBSCRIBE_PAUSE_SECONDS)
+
+    async def subscribe(self, streams):
+        new = set(streams) - self.streams
+        self.streams |= new
+        if new and self._ws is not None:
+            await self._send_subscription("SUBSCRIBE", new)
+
+    async def unsubscribe(self, streams):
+        old = set(streams) & self.streams
+        self.streams -= old
+        if old and self._ws is not None:
+            await self._send_subscription("UNSUBSCRIBE", old)
+
+    async def run(self):
+        delay = self.reconnect_delay
+        connected_before = False
+        while not self._stopped:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, max_size=2 ** 22) as ws:
+                    self._ws = ws
+                    await self._send_subscription("SUBSCRIBE", self.streams)
+                    if connected_before and self.on_reconnect is not None:
+                        await self.on_reconnect()
+                    connected_before = True
+                    delay = self.reconnect_delay
+                    async for raw in ws:
+                        msg = json.loads(raw)
+                        # ردود الاشتراك {"result": null, "id": n} لا تحمل بيانات
+                        if 'stream' in msg and 'data' in msg:
+                            await self.on_message(msg['stream'], msg['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[Stream] انقطع الاتصال ({e}). إعادة المحاولة بعد {delay:.0f} ث")
+            finally:
+                self._ws = None
+            if self._stopped:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def stop(self):
+        self._stopped = True
+        if self._ws is not None:
+            await self._ws.close()
+
+
+class KlineStreamEngine:
+    """
+    يشترك في بثوث <symbol>@kline_<interval> ويحتفظ لكل عملة بنافذة متدحرجة من الشموع
+    بنفس صيغة استجابة REST (/api/v3/klines) حتى تعمل دوال التحليل الحالية عليها مباشرة.
+    يُستدعى on_candle(symbol, klines, is_closed) عند إغلاق كل شمعة، ومع كل تحديث إن فُعّل intra_candle.
+    """
+
+    def __init__(self, symbols, interval, window, on_candle, url=BINANCE_WS_URL,
+                 intra_candle=False, backfill=None):
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.window = window
+        self.on_candle = on_candle
+        self.url = url
+        self.intra_candle = intra_candle
+        self.backfill = backfill      # دالة async تُرجع {الرمز: الشموع} لسد الفجوات بعد الانقطاع
+        self.candles = {s: deque(maxlen=window) for s in symbols}
+        self._clients = []
+        self._backfilling = set()
+
+    def _stream_name(self, symbol):
+        return f"{symbol.lower()}@kline_{self.interval}"
+
+    @property
+    def symbols(self):
+        return list(self.candles)
+
+    def seed(self, symbol, klines):
+        window = self.candles.setdefault(symbol, deque(maxlen=self.window))
+        window.clear()
+        window.extend(klines[-self.window:])
+
+    async def _handle(self, stream, data):
+        k = data['k']
+        symbol = k['s']
+        window = self.candles.get(symbol)
+        if window is None:
+            return
+        row = [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T'], k['q'], k['n'], k['V'], k['Q'], '0']
+        if window and window[-1][0] == row[0]:
+            window[-1] = row
+        elif window and row[0] != window[-1][0] + self.interval_ms:
+            # فجوة (انقطاع أو شموع مفقودة): النافذة لم تعد متصلة زمنياً
+            window.clear()
+            window.append(row)
+            self._schedule_backfill([symbol])
+            return
+        else:
+            window.append(row)
+        if symbol in self._backfilling:
+            return
+        is_closed = k['x']
+        if is_closed or self.intra_candle:
+            await self.on_candle(symbol, list(window), is_closed)
+
+    def _schedule_backfill(self, symbols):
+        if self.backfill is None:
+            return
+        symbols = [s for s in symbols if s not in self._backfilling]
+        if not symbols:
+            return
+        self._backfilling.update(symbols)
+        asyncio.get_running_loop().create_task(self._run_backfill(symbols))
+
+    async def _run_backfill(self, symbols):
+        try:
+            results = await self.backfill(symbols)
+            for symbol, klines in results.items():
+                if klines:
+                    self.seed(symbol, klines)
+        except Exception as e:
+            logger.error(f"[Stream] فشل سد فجوة الشموع: {e}")
+        finally:
+            self._backfilling.difference_update(symbols)
+
+    async def _on_reconnect(self):
+        self._schedule_backfill(list(self.candles))
+
+    async def add_symbols(self, symbols, klines_map=None):
+        klines_map = klines_map or {}
+        new = [s for s in symbols if s not in self.candles]
+        for symbol in new:
+            self.seed(symbol, klines_map.get(symbol, []))
+        for symbol in new:
+            client = min(self._clients, key=lambda c: len(c.streams), default=None)
+            if client is not None:
+                await client.subscribe([self._stream_name(symbol)])
+
+    async def remove_symbols(self, symbols):
+        for symbol in symbols:
+            if self.candles.pop(symbol, None) is None:
+                continue
+            for client in self._clients:
+                await client.unsubscribe([self._stream_name(symbol)])
+
+    async def run(self):
+        symbols = sorted(self.candles)
+        self._clients = [
+            StreamClient([self._stream_name(s) for s in symbols[i:i + MAX_STREAMS_PER_CONNECTION]],
+                         self._handle, url=self.url, on_reconnect=self._on_reconnect)
+            for i in range(0, len(symbols), MAX_STREAMS_PER_CONNECTION)
+        ] or [StreamClient([], self._handle, url=self.url, on_reconnect=self._on_reconnect)]
+        logger.info(f"[Stream] الاشتراك في {len(symbols)} عملة عبر {len(self._clients)} اتصال")
+        await asyncio.gather(*(c.run() for c in self._clients))
+
+    async def stop(self):
+        for client in self._clients:
+            await client.stop()
@@ -0,0 +1,247 @@
+# -----------------------------------------------------------------------------
+# market_snapshot.py - آخر ما حسبته جولات الفحص في الذاكرة + أوامر /status و /check و /positions
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import logging
+import asyncio
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+ON_DEMAND_TTL_SECONDS = float(os.environ.get("CHECK_TTL_SECONDS", 60))   # صلاحية نتيجة /check لعملة خارج الفحص
+QUOTE_SUFFIXES = ('USDT',)
+
+
+class SnapshotEntry:
+    __slots__ = ('decision', 'price', 'at', 'on_demand')
+
+    def __init__(self, decision, price, at, on_demand=False):
+        self.decision = decision
+        self.price = price
+        self.at = at
+        self.on_demand = on_demand
+
+
+class StrategySnapshot:
+    """
+    قرارات آخر جولة فحص لكل عملة مع قيم المؤشرات التي حسبها التحليل نفسه (عبر note)،
+    حتى تُجاب الأوامر من الذاكرة دون أي طلب للمنصة. العملة غير الموجودة تُجلب مرة واحدة
+    مهما تزامنت الطلبات (single-flight) وتبقى نتيجتها ttl ثانية فقط.
+    """
+
+    def __init__(self, bot, interval, analyze_many, positions=None, symbol_format="{}USDT",
+                 ttl=ON_DEMAND_TTL_SECONDS):
+        self.bot = bot
+        self.interval = interval
+        self.analyze_many = analyze_many
+        self.positions = positions
+        self.symbol_format = symbol_format
+        self.ttl = ttl
+        self.entries = {}
+        self.indicators = {}
+        self.prices = {}           # {الرمز: (السعر، الزمن)} من مراقب الصفقات إن وُجد
+        self.last_scan = None
+        self.fetch = None          # دالة async (symbols) -> {الرمز: الشموع}؛ تُضبط عبر attach
+        self.is_listed = None      # دالة (symbol) -> bool من كون العملات في الذاكرة
+        self._inflight = {}
+        self.on_demand_fetches = 0
+
+    def attach(self, fetch, is_listed=None):
+        self.fetch = fetch
+        self.is_listed = is_listed
+
+    # --- الكتابة من جولات الفحص ---
+    def note(self, symbol, **values):
+        """
+        تُستدعى من دالة التحليل (قد تكون في خيط عامل) بقيم المؤشرات التي حسبتها للتو.
+        الأسماء تُعرض كما هي في رد Markdown فلا تحتوي '_'.
+        """
+        self.indicators[symbol] = values
+
+    def record(self, signals, on_demand=False):
+        """signals: {الرمز: (القرار، السعر)} كما تُرجعها analyze_many. تُرجع signals كما هي."""
+        now = time.time()
+        for symbol, (decision, price) in signals.items():
+            self.entries[symbol] = SnapshotEntry(decision, price, now, on_demand)
+        if not on_demand:
+            self.last_scan = now
+        return signals
+
+    def update_prices(self, prices):
+        """أسعار لحظية من مراقب الصفقات (العملات المفتوحة لا تدخل جولة الاكتشاف)."""
+        now = time.time()
+        for symbol, price in prices.items():
+            self.prices[symbol] = (price, now)
+
+    def latest_price(self, symbol):
+        """(السعر، الزمن) الأحدث من المراقب أو من آخر تحليل، أو (None, None)."""
+        live = self.prices.get(symbol)
+        entry = self.entries.get(symbol)
+        if entry is not None and (live is None or entry.at > live[1]):
+            price = entry.price if entry.price is not None else self.indicators.get(symbol, {}).get('close')
+            if price is not None:
+                return price, entry.at
+        return live or (None, None)
+
+    # --- القراءة ---
+    def symbol_for(self, base):
+        return self.symbol_format.format(base)
+
+    def lookup(self, symbol):
+        entry = self.entries.get(symbol)
+        if entry is not None and entry.on_demand and time.time() - entry.at > self.ttl:
+            return None
+        return entry
+
+    async def check(self, symbol):
+        """من الذاكرة إن وُجدت، وإلا جلب واحد مشترك بين كل الطلبات المتزامنة لنفس العملة."""
+        entry = self.lookup(symbol)
+        if entry is not None or self.fetch is None:
+            return entry
+        if self.is_listed is not None and not self.is_listed(symbol):
+            return None
+        future = self._inflight.get(symbol)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[symbol] = future
+            try:
+                self.on_demand_fetches += 1
+                klines_map = await self.fetch([symbol])
+                signals = await asyncio.to_thread(self.analyze_many, klines_map)
+                # حتى الفشل يُخزَّن ttl ثانية فلا يتحول تكرار الأمر إلى طلبات متتالية
+                self.record(signals or {symbol: ('HOLD', None)}, on_demand=True)
+                future.set_result(self.entries.get(symbol))
+            except Exception as e:
+                logger.warning(f"[Snapshot] {self.bot}: تعذر جلب {symbol} عند الطلب: {e}")
+                self.record({symbol: (None, None)}, on_demand=True)
+                future.set_result(self.entries.get(symbol))
+            finally:
+                self._inflight.pop(symbol, None)
+                if not future.done():   # أُلغي الطلب الأول: المنتظرون يحصلون على "غير متاح" بدل التعليق
+                    future.set_result(None)
+        return await asyncio.shield(future)
+
+
+# --- سجل لقطات العملية (كل استراتيجية محمّلة تسجل لقطتها عند الاستيراد) ---
+SNAPSHOTS = {}
+
+
+def register_snapshot(bot, interval, analyze_many, **kwargs):
+    SNAPSHOTS[bot] = StrategySnapshot(bot, interval, analyze_many, **kwargs)
+    return SNAPSHOTS[bot]
+
+
+def listed_in(universe):
+    """is_listed من كون العملات المحمّل؛ قبل أول تحميل يُسمح بكل الرموز."""
+    return lambda symbol: not universe.symbols or symbol in universe.symbols
+
+
+def parse_base(text):
+    """btc و BTCUSDT و btc/usdt و BTC-USDT كلها -> BTC."""
+    base = text.strip().upper().replace('-', '').replace('/', '').replace('_', '')
+    for suffix in QUOTE_SUFFIXES:
+        if base.endswith(suffix) and len(base) > len(suffix):
+            return base[:-len(suffix)]
+    return base
+
+
+def _age(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f} ث"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} د"
+    return f"{seconds / 3600:.1f} س"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "نعم" if value else "لا"
+    return f"{value:.6g}" if isinstance(value, (int, float)) else str(value)
+
+
+# --- نصوص الردود (من الذاكرة فقط) ---
+def status_text(snapshots=None):
+    snapshots = SNAPSHOTS if snapshots is None else snapshots
+    cycles = METRICS.summary()['cycles']
+    now = time.time()
+    lines = ["📊 *الحالة*"]
+    for bot, snapshot in snapshots.items():
+        cycle = cycles.get(bot)
+        last = f"آخر جولة قبل {_age(now - cycle['last_started'])} ({cycle['last_seconds']:.1f} ث، " \
+               f"{cycle['count']} جولة)" if cycle and cycle['last_started'] else "لم تكتمل جولة بعد"
+        buys = sum(1 for e in snapshot.entries.values() if e.decision == 'BUY' and not e.on_demand)
+        positions = len(snapshot.positions) if snapshot.positions is not None else 0
+        lines.append(f"• *{bot}* ({snapshot.interval}): {last} | {len(snapshot.entries)} عملة | "
+                     f"شراء {buys} | صفقات مفتوحة {positions}")
+    return "\n".join(lines)
+
+
+def positions_text(snapshots=None):
+    snapshots = SNAPSHOTS if snapshots is None else snapshots
+    lines = ["💼 *الصفقات المفتوحة*"]
+    for bot, snapshot in snapshots.items():
+        for symbol in list(snapshot.positions or ()):
+            buy_price = (snapshot.positions.get(symbol) or {}).get('buy_price')
+            price, at = snapshot.latest_price(symbol)
+            change = f" ({(price / buy_price - 1) * 100:+.2f}%)" if price and buy_price else ""
+            age = f" قبل {_age(time.time() - at)}" if at is not None else ""
+            lines.append(f"• {bot} `{symbol}` شراء `{_number(buy_price)}` الآن `{_number(price)}`{change}{age}")
+    if len(lines) == 1:
+        lines.append("لا توجد صفقات مفتوحة.")
+    return "\n".join(lines)
+
+
+async def check_text(text, snapshots=None):
+    snapshots = SNAPSHOTS if snapshots is None else snapshots
+    base = parse_base(text)
+    if not base.isalnum():
+        return "استخدم: /check BTC"
+    lines = [f"🔎 *{base}*"]
+    # كل الاستراتيجيات بالتوازي؛ الجلب عند الطلب يحدث فقط لمن لا يملك العملة في ذاكرته
+    symbols = {bot: s.symbol_for(base) for bot, s in snapshots.items()}
+    entries = await asyncio.gather(*(s.check(symbols[bot]) for bot, s in snapshots.items()))
+    now = time.time()
+    for (bot, snapshot), entry in zip(snapshots.items(), entries):
+        symbol = symbols[bot]
+        if entry is None:
+            lines.append(f"• *{bot}*: `{symbol}` غير مدرجة")
+            continue
+        if entry.decision is None:
+            lines.append(f"• *{bot}*: تعذر جلب `{symbol}` الآن")
+            continue
+        values = snapshot.indicators.get(symbol, {})
+        price = snapshot.latest_price(symbol)[0]
+        held = " | 📌 صفقة مفتوحة" if snapshot.positions is not None and symbol in snapshot.positions else ""
+        source = "عند الطلب" if entry.on_demand else "من آخر جولة"
+        lines.append(f"• *{bot}* ({snapshot.interval}): *{entry.decision}* | السعر `{_number(price)}` | "
+                     f"{source} قبل {_age(now - entry.at)}{held}")
+        shown = {k: v for k, v in values.items() if k != 'close'}
+        if shown:
+            lines.append("  " + " | ".join(f"{k} `{_number(v)}`" for k, v in shown.items()))
+    return "\n".join(lines)
+
+
+# --- أوامر تيليجرام ---
+async def status_command(update, context):
+    await update.message.reply_text(status_text(), parse_mode='Markdown')
+
+
+async def positions_command(update, context):
+    await update.message.reply_text(positions_text(), parse_mode='Markdown')
+
+
+async def check_command(update, context):
+    if not context.args:
+        await update.message.reply_text("استخدم: /check BTC")
+        return
+    await update.message.reply_text(await check_text(context.args[0]), parse_mode='Markdown')
+
+
+def register_commands(application):
+    from telegram.ext import CommandHandler
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("check", check_command))
+    application.add_handler(CommandHandler("positions", positions_command))
@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------------
+# metrics.py - قياسات أداء الجولات (Prometheus + JSON) مشتركة بين كل البوتات
+# -----------------------------------------------------------------------------
+
+import time
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# أوزان طلبات Binance حسب النقطة (لتقدير الوزن المستهلك من جهتنا)
+REQUEST_WEIGHTS = {
+    '/api/v3/klines': 2,
+    '/api/v3/ticker/price': 4,
+    '/api/v3/ticker/24hr': 80,
+    '/api/v3/exchangeInfo': 20,
+}
+
+
+class Metrics:
+    """
+    سجل قياسات خفيف داخل العملية: مدة كل مرحلة في الجولة، مدرج تأخير العملات،
+    عدد أخطاء API، الوزن المستهلك، وعدد الجولات التي تجاوزت فترتها.
+    كل تحديث عملية جمع واحدة تحت قفل، فيمكن تركه مفعلاً في الإنتاج.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.phases = {}          # (bot, phase) -> [count, sum, last, max]
+        self.latency = {}         # source -> [buckets..., +Inf, sum, count]
+        self.api_errors = {}      # source -> count
+        self.request_weight = {}  # source -> مجموع الوزن المقدر
+        self.used_weight = {}     # source -> آخر X-MBX-USED-WEIGHT-1M
+        self.cycles = {}          # bot -> [count, overruns, last_duration, last_started]
+
+    # --- التسجيل ---
+    def observe_phase(self, bot, phase, seconds):
+        with self._lock:
+            entry = self.phases.setdefault((bot, phase), [0, 0.0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = seconds
+            entry[3] = max(entry[3], seconds)
+
+    @contextmanager
+    def phase(self, bot, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(bot, phase, time.perf_counter() - start)
+
+    def observe_latency(self, source, seconds):
+        with self._lock:
+            entry = self.latency.get(source)
+            if entry is None:
+                entry = self.latency[source] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+            entry[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            entry[-2] += seconds
+            entry[-1] += 1
+
+    def count_error(self, source, n=1):
+        with self._lock:
+            self.api_errors[source] = self.api_errors.get(source, 0) + n
+
+    def add_weight(self, source, path, used_weight=None):
+        with self._lock:
+            self.request_weight[source] = self.request_weight.get(source, 0) + REQUEST_WEIGHTS.get(path, 1)
+            if used_weight is not None:
+                self.used_weight[source] = int(used_weight)
+
+    @contextmanager
+    def cycle(self, bot, interval_seconds):
+        start = time.perf_counter()
+        with self._lock:
+            entry = self.cycles.setdefault(bot, [0, 0, 0.0, 0.0])
+            entry[3] = time.time()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                entry[0] += 1
+                entry[2] = duration
+                if duration > interval_seconds:
+                    entry[1] += 1
+
+    def track_cycle(self, bot, interval_seconds):
+        """مُزخرف لمهام الفحص غير المتزامنة يسجل مدة الجولة وتجاوزها للفترة."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.cycle(bot, interval_seconds):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count_overrun(self, bot):
+        with self._lock:
+            self.cycles.setdefault(bot, [0, 0, 0.0, 0.0])[1] += 1
+
+    # --- العرض ---
+    def summary(self):
+        with self._lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'cycles': {bot: {'count': c, 'overruns': o, 'last_seconds': round(d, 4), 'last_started': s}
+                           for bot, (c, o, d, s) in self.cycles.items()},
+                'phases': {f"{bot}.{phase}": {'count': c, 'avg_seconds': round(t / c, 4) if c else 0.0,
+                                               'last_seconds': round(last, 4), 'max_seconds': round(mx, 4)}
+                           for (bot, phase), (c, t, last, mx) in self.phases.items()},
+                'latency': {source: {'count': e[-1], 'avg_seconds': round(e[-2] / e[-1], 4) if e[-1] else 0.0}
+                            for source, e in self.latency.items()},
+                'api_errors': dict(self.api_errors),
+                'request_weight': dict(self.request_weight),
+                'used_weight_1m': dict(self.used_weight),
+            }
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = [
+                "# HELP falcon_cycles_total Completed scan cycles.",
+                "# TYPE falcon_cycles_total counter",
+            ]
+            lines += [f'falcon_cycles_total{{bot="{b}"}} {c[0]}' for b, c in self.cycles.items()]
+            lines += ["# HELP falcon_cycle_overruns_total Cycles that took longer than their interval or were skipped.",
+                      "# TYPE falcon_cycle_overruns_total counter"]
+            lines += [f'falcon_cycle_overruns_total{{bot="{b}"}} {c[1]}' for b, c in self.cycles.items()]
+            lines += ["# HELP falcon_cycle_last_seconds Duration of the last cycle.",
+                      "# TYPE falcon_cycle_last_seconds gauge"]
+            lines += [f'falcon_cycle_last_seconds{{bot="{b}"}} {c[2]:.6f}' for b, c in self.cycles.items()]
+
+            lines += ["# HELP falcon_phase_seconds Time spent per cycle phase.",
+                      "# TYPE falcon_phase_seconds summary"]
+            for (bot, phase), (count, total, _, _) in self.phases.items():
+                labels = f'bot="{bot}",phase="{phase}"'
+                lines.append(f'falcon_phase_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'falcon_phase_seconds_count{{{labels}}} {count}')
+
+            lines += ["# HELP falcon_symbol_latency_seconds Per-symbol exchange request latency.",
+                      "# TYPE falcon_symbol_latency_seconds histogram"]
+            for source, entry in self.latency.items():
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), entry[:-2]):
+                    cumulative += n
+                    lines.append(f'falcon_symbol_latency_seconds_bucket{{source="{source}",le="{bound}"}} {cumulative}')
+                lines.append(f'falcon_symbol_latency_seconds_sum{{source="{source}"}} {entry[-2]:.6f}')
+                lines.append(f'falcon_symbol_latency_seconds_count{{source="{source}"}} {entry[-1]}')
+
+            lines += ["# HELP falcon_api_errors_total Failed exchange/Telegram requests.",
+                      "# TYPE falcon_api_errors_total counter"]
+            lines += [f'falcon_api_errors_total{{source="{s}"}} {n}' for s, n in self.api_errors.items()]
+            lines += ["# HELP falcon_request_weight_total Estimated request weight consumed.",
+                      "# TYPE falcon_request_weight_total counter"]
+            lines += [f'falcon_request_weight_total{{source="{s}"}} {n}' for s, n in self.request_weight.items()]
+            lines += ["# HELP falcon_used_weight_1m Last X-MBX-USED-WEIGHT-1M reported by the exchange.",
+                      "# TYPE falcon_used_weight_1m gauge"]
+            lines += [f'falcon_used_weight_1m{{source="{s}"}} {n}' for s, n in self.used_weight.items()]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def register_aiohttp_routes(app):
+    """نفس /metrics و /metrics.json لتطبيق aiohttp.web (وضع webhook)."""
+    from aiohttp import web
+
+    async def metrics(request):
+        return web.Response(text=METRICS.render_prometheus(), content_type='text/plain')
+
+    async def metrics_json(request):
+        return web.json_response(METRICS.summary())
+
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/metrics.json', metrics_json)
@@ -0,0 +1,198 @@
+# -----------------------------------------------------------------------------
+# news_watcher.py - مراقب أخبار غير متزامن (طلبات شرطية + ذاكرة دائمة لما أُرسل)
+# -----------------------------------------------------------------------------
+
+import os
+import re
+import json
+import time
+import logging
+import asyncio
+from collections import OrderedDict
+import aiohttp
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+NEWS_POLL_SECONDS = float(os.environ.get("NEWS_POLL_SECONDS", 5 * 60))
+NEWS_TIMEOUT_SECONDS = 10
+NEWS_SEEN_PATH = os.environ.get("NEWS_SEEN_PATH", "news_seen.json")
+SEEN_CACHE_SIZE = 500
+# "Binance Will List Foo (FOO)" / "Binance Will Add Foo (FOO) and Bar (BAR) ..."
+LISTING_PATTERN = re.compile(r'\b(will list|will add|lists|adds)\b', re.IGNORECASE)
+TICKER_PATTERN = re.compile(r'\(([A-Z0-9]{2,12})\)')
+
+
+class NewsSource:
+    """
+    مصدر أخبار واحد: عنوانه، ودوال لاستخراج العناصر من JSON ومعرّف كل عنصر ونص رسالته.
+    يحتفظ بـ ETag و Last-Modified لآخر استجابة لإرسال طلبات شرطية.
+    """
+
+    def __init__(self, name, url, extract, item_id, format_message, params=None, headers=None, listing_titles=False):
+        self.name = name
+        self.url = url
+        self.params = params
+        self.headers = headers or {}
+        self.extract = extract
+        self.item_id = item_id
+        self.format_message = format_message
+        self.listing_titles = listing_titles
+        self.etag = None
+        self.last_modified = None
+
+
+def coinmarketcal_source(api_key):
+    return NewsSource(
+        'coinmarketcal', "https://api.coinmarketcal.com/v1/events",
+        extract=lambda data: data.get("body", []),
+        item_id=lambda event: event.get('id') or event.get('title'),
+        format_message=lambda event: (f"📰 *[News]* حدث مهم:\n\n• {event.get('title','')}\n"
+                                      f"• التاريخ: {event.get('date_event','')}"),
+        params={"sortBy": "created_desc", "max": 5},   # أحدث 5 أحداث
+        headers={"Accept": "application/json", "x-api-key": api_key})
+
+
+def binance_announcements_source():
+    return NewsSource(
+        'binance', "https://www.binance.com/bapi/composite/v1/public/cms/article/list/query",
+        extract=lambda data: (data.get("data") or {}).get("articles", []),
+        item_id=lambda article: article.get('code') or article.get('id') or article.get('title'),
+        format_message=lambda article: f"📢 *[Binance]* إعلان جديد:\n\n• {article.get('title','')}",
+        params={"type": 1, "pageSize": 5, "page": 1},
+        listing_titles=True)
+
+
+def extract_listing_tickers(title):
+    """رموز العملات المذكورة بين أقواس في عناوين إعلانات الإدراج فقط."""
+    if not title or not LISTING_PATTERN.search(title):
+        return []
+    return TICKER_PATTERN.findall(title)
+
+
+class SeenCache:
+    """مجموعة معرّفات محدودة الحجم (الأقدم يُحذف أولاً) تُحفظ في ملف JSON بكتابة ذرية."""
+
+    def __init__(self, path=NEWS_SEEN_PATH, size=SEEN_CACHE_SIZE):
+        self.path = path
+        self.size = size
+        self.ids = OrderedDict()
+        self.loaded_from_disk = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.ids = OrderedDict.fromkeys(json.load(f)[-size:])
+                self.loaded_from_disk = True
+            except (OSError, ValueError) as e:
+                logger.warning(f"[News] تعذر قراءة ذاكرة الأخبار {path}: {e}")
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def add(self, key):
+        self.ids[key] = None
+        self.ids.move_to_end(key)
+        while len(self.ids) > self.size:
+            self.ids.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(list(self.ids), f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[News] تعذر حفظ ذاكرة الأخبار: {e}")
+
+
+class NewsWatcher:
+    """
+    يستطلع مصادر الأخبار بإيقاعه الخاص بعيداً عن جولة فحص السوق، بمهلة لكل طلب،
+    ويرسل العناصر الجديدة فقط عبر on_item(source, item, message).
+    on_tickers(tickers) اختيارية وتُستدعى برموز العملات المستخرجة من إعلانات الإدراج.
+    """
+
+    def __init__(self, sources, on_item, on_tickers=None, interval=NEWS_POLL_SECONDS,
+                 timeout=NEWS_TIMEOUT_SECONDS, seen=None):
+        self.sources = sources
+        self.on_item = on_item
+        self.on_tickers = on_tickers
+        self.interval = interval
+        self.timeout = timeout
+        self.seen = seen if seen is not None else SeenCache()
+        # بدون ذاكرة محفوظة: أول استطلاع ناجح لكل مصدر يسجل عناصره الحالية دون إرسالها (لا تكرار
+        # بعد كل نشر). المصدر الذي فشل أول طلب له يبقى غير مُهيأ حتى ينجح، فلا تُرسل عناصره القديمة كأخبار
+        self._primed = {source.name for source in sources} if self.seen.loaded_from_disk else set()
+        self._session = None
+        self._stopped = False
+
+    async def _fetch(self, source):
+        """تُرجع قائمة العناصر، أو [] عند 304 (لم يتغير شيء منذ آخر طلب)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        headers = dict(source.headers)
+        if source.etag:
+            headers["If-None-Match"] = source.etag
+        if source.last_modified:
+            headers["If-Modified-Since"] = source.last_modified
+        async with self._session.get(source.url, params=source.params, headers=headers) as r:
+            if r.status == 304:
+                return []
+            r.raise_for_status()
+            source.etag = r.headers.get("ETag", source.etag)
+            source.last_modified = r.headers.get("Last-Modified", source.last_modified)
+            return source.extract(await r.json(content_type=None)) or []
+
+    async def poll_source(self, source):
+        try:
+            items = await self._fetch(source)
+        except Exception as e:
+            METRICS.count_error('news')
+            logger.error(f"[News] خطأ {source.name}: {e or type(e).__name__}")
+            return 0
+        primed = source.name in self._primed
+        self._primed.add(source.name)
+        fresh = []
+        for item in items:
+            key = f"{source.name}:{source.item_id(item)}"
+            if key not in self.seen:
+                self.seen.add(key)
+                fresh.append(item)
+        if not primed:
+            if fresh:
+                logger.info(f"[News] {source.name}: تسجيل {len(fresh)} خبر حالي دون إرسال (لا توجد ذاكرة سابقة)")
+            return len(fresh)
+        # المصادر تُرجع الأحدث أولاً، فنرسل بالترتيب الزمني
+        for item in reversed(fresh):
+            await self.on_item(source, item, source.format_message(item))
+            if source.listing_titles and self.on_tickers is not None:
+                tickers = extract_listing_tickers(item.get('title'))
+                if tickers:
+                    await self.on_tickers(tickers)
+        return len(fresh)
+
+    async def poll_once(self):
+        start = time.perf_counter()
+        counts = await asyncio.gather(*(self.poll_source(s) for s in self.sources))
+        METRICS.observe_phase('news', 'poll', time.perf_counter() - start)
+        if any(counts):
+            self.seen.save()
+
+    async def run(self):
+        logger.info(f"[News] بدء مراقبة {len(self.sources)} مصدر كل {self.interval:.0f} ث")
+        while not self._stopped:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[News] خطأ غير متوقع في الاستطلاع: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        self._stopped = True
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,197 @@
+# -----------------------------------------------------------------------------
+# param_sweep.py - تجربة شبكة معاملات الاستراتيجيات على عدة أنوية (ذاكرة مشتركة)
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import itertools
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import backtest
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+CHUNK_SIZE = 25            # عدد تركيبات العتبات في المهمة الواحدة
+INDICATOR_CACHE_SIZE = 2   # مجموعات المؤشرات المحفوظة في كل عامل (كل مجموعة بحجم اللوحة تقريباً)
+RANK_METRICS = ('total_return', 'hit_rate', 'avg_return', 'max_drawdown', 'trades')
+
+
+# --- مشاركة اللوحة بين العمليات ---
+def share_panel(panel, directory):
+    """
+    يكتب مصفوفات اللوحة إلى ملفات .npy مرة واحدة، فتفتحها العمليات بـ mmap للقراءة فقط
+    وتتشارك صفحات الذاكرة نفسها بدل نسخ البيانات مع كل مهمة.
+    """
+    for field in backtest.FIELDS:
+        np.save(os.path.join(directory, f"{field}.npy"), np.ascontiguousarray(panel[field].values, dtype=np.float64))
+    np.save(os.path.join(directory, "index.npy"), panel['close'].index.values.astype(np.int64))
+    with open(os.path.join(directory, "symbols.json"), "w") as f:
+        json.dump(list(panel['close'].columns), f)
+
+
+def open_shared_panel(directory):
+    index = pd.Index(np.load(os.path.join(directory, "index.npy")), name='open_time')
+    with open(os.path.join(directory, "symbols.json")) as f:
+        symbols = json.load(f)
+    return {field: pd.DataFrame(np.load(os.path.join(directory, f"{field}.npy"), mmap_mode='r'),
+                                index=index, columns=symbols, copy=False)
+            for field in backtest.FIELDS}
+
+
+# --- العامل ---
+_panel = None
+_indicator_cache = OrderedDict()
+
+
+def _init_worker(directory):
+    global _panel
+    _panel = open_shared_panel(directory)
+
+
+def _indicators(strategy, indicator_params):
+    key = (strategy, tuple(sorted(indicator_params.items())))
+    if key in _indicator_cache:
+        _indicator_cache.move_to_end(key)
+        return _indicator_cache[key]
+    func = backtest.STRATEGIES[strategy]['indicators']
+    values = _indicator_cache[key] = func(_panel, **indicator_params)
+    while len(_indicator_cache) > INDICATOR_CACHE_SIZE:
+        _indicator_cache.popitem(last=False)
+    return values
+
+
+def _run_chunk(strategy, indicator_params, combos, fee):
+    indicators = _indicators(strategy, indicator_params)
+    results = []
+    for params in combos:
+        trades = backtest.run_backtest(_panel, strategy, fee=fee, indicators=indicators, **params)
+        results.append(dict(indicator_params, **params, **backtest.summarize(trades)))
+    return results
+
+
+# --- توزيع العمل ---
+def expand_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def plan_tasks(strategy, grid, chunk_size=CHUNK_SIZE):
+    """
+    يقسم الشبكة حسب معاملات المؤشرات أولاً، حتى يحسب كل عامل المؤشرات مرة واحدة
+    لكل مجموعة ثم يجرّب عليها كل العتبات من الذاكرة.
+    """
+    unknown = sorted(set(grid) - backtest.strategy_params(strategy))
+    if unknown:
+        raise ValueError(f"معاملات غير معروفة لـ {strategy}: {', '.join(unknown)} "
+                         f"(المتاح: {', '.join(sorted(backtest.strategy_params(strategy)))})")
+    indicator_func = backtest.STRATEGIES[strategy]['indicators']
+    indicator_keys = [k for k in grid if backtest.split_params(indicator_func, {k: None})]
+    indicator_grid = {k: grid[k] for k in indicator_keys}
+    threshold_grid = {k: v for k, v in grid.items() if k not in indicator_keys}
+    combos = expand_grid(threshold_grid)
+    tasks = []
+    for indicator_params in expand_grid(indicator_grid):
+        for i in range(0, len(combos), chunk_size):
+            tasks.append((indicator_params, combos[i:i + chunk_size]))
+    return tasks
+
+
+def run_sweep(panel, strategy, grid, workers=None, fee=backtest.DEFAULT_FEE, chunk_size=CHUNK_SIZE):
+    """يجرّب كل تركيبات grid على مجموعة عمليات ويُرجع جدول النتائج غير مرتب."""
+    workers = workers or os.cpu_count()
+    tasks = plan_tasks(strategy, grid, chunk_size)
+    directory = tempfile.mkdtemp(prefix="falcon_sweep_")
+    try:
+        share_panel(panel, directory)
+        results = []
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(directory,)) as pool:
+            futures = [pool.submit(_run_chunk, strategy, ip, combos, fee) for ip, combos in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                if done % max(1, len(futures) // 10) == 0:
+                    logger.info(f"[Sweep] {done}/{len(futures)} مهمة ({len(results)} تركيبة)")
+        return pd.DataFrame(results)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def rank(results, metric='total_return', max_drawdown=None, min_trades=0):
+    """يرتب النتائج تنازلياً (وتصاعدياً لـ max_drawdown) بعد استبعاد ما لا يحقق الحدود."""
+    table = results[results['trades'] >= min_trades]
+    if max_drawdown is not None:
+        table = table[table['max_drawdown'] <= max_drawdown]
+    return table.sort_values(metric, ascending=(metric == 'max_drawdown')).reset_index(drop=True)
+
+
+def parse_grid(items):
+    """
+    key=v1,v2,v3 أو key=start:stop:step (شامل للنهاية)، مثل
+    rsi_oversold=20:35:5 volume_factor=1.2,1.5,2
+    """
+    grid = {}
+    for item in items:
+        key, spec = item.split('=', 1)
+        if ':' in spec:
+            start, stop, step = (float(x) for x in spec.split(':'))
+            values = np.arange(start, stop + step / 2, step).round(10).tolist()
+            if all(float(v).is_integer() for v in (start, stop, step)):
+                values = [int(v) for v in values]
+        else:
+            values = [backtest.parse_value(v) for v in spec.split(',')]
+        grid[key] = values
+    return grid
+
+
+# --- واجهة سطر الأوامر ---
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="تجربة شبكة معاملات على بيانات تاريخية")
+    parser.add_argument('path', nargs='?', help="ملف CSV/Parquet أو مجلد بملف لكل عملة")
+    parser.add_argument('--strategy', choices=list(backtest.STRATEGIES), required=True)
+    grid_source = parser.add_mutually_exclusive_group(required=True)
+    grid_source.add_argument('--grid', nargs='+', metavar='KEY=VALUES')
+    grid_source.add_argument('--grid-file', help="ملف JSON بالشكل {المعامل: [القيم]}")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--fee', type=float, default=backtest.DEFAULT_FEE)
+    parser.add_argument('--rank-by', choices=RANK_METRICS, default='total_return')
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--max-drawdown', type=float, default=None)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--out', help="حفظ كل النتائج المرتبة في ملف CSV")
+    parser.add_argument('--synthetic', type=int, metavar='SYMBOLS', help="بيانات عشوائية لقياس الأداء")
+    args = parser.parse_args()
+    if not args.path and not args.synthetic:
+        parser.error("حدد مسار البيانات أو --synthetic")
+
+    if args.grid_file:
+        with open(args.grid_file) as f:
+            grid = json.load(f)
+    else:
+        grid = parse_grid(args.grid)
+    try:
+        plan_tasks(args.strategy, grid)
+    except ValueError as e:
+        parser.error(str(e))
+    panel = backtest.synthetic_history(args.synthetic) if args.synthetic else backtest.load_history(args.path)
+    total = int(np.prod([len(v) for v in grid.values()]))
+    workers = args.workers or os.cpu_count()
+    print(f"{total} تركيبة × {panel['close'].shape[1]} عملة على {workers} عملية")
+
+    start = time.perf_counter()
+    results = run_sweep(panel, args.strategy, grid, workers=workers, fee=args.fee)
+    elapsed = time.perf_counter() - start
+    ranked = rank(results, args.rank_by, args.max_drawdown, args.min_trades)
+    print(f"انتهى في {elapsed:.1f} ث ({total / elapsed:.1f} تركيبة/ث)\n")
+    with pd.option_context('display.width', 200, 'display.max_columns', 30, 'display.float_format', '{:.4f}'.format):
+        print(ranked.head(args.top).to_string())
+    if args.out:
+        ranked.to_csv(args.out, index=False)
+        print(f"\nتم حفظ {len(ranked)} نتيجة في {args.out}")
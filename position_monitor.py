@@ -0,0 +1,53 @@
+# -----------------------------------------------------------------------------
+# position_monitor.py - مراقب لحظي لأهداف الربح ووقف الخسارة للصفقات المفتوحة
+# -----------------------------------------------------------------------------
+
+import logging
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_SECONDS = 1.0
+
+
+class PositionMonitor:
+    """
+    يفحص أسعار كل العملات المفتوحة بطلب واحد كل ثانية تقريباً، مستقلاً عن جولة الاكتشاف.
+    positions قاموس {الرمز: {'buy_price', 'profit_target', 'stop_loss'}} مشترك مع البوت،
+    و fetch_prices دالة async تُرجع {الرمز: السعر}، و on_exit(symbol, targets, price, reason)
+    تُستدعى عند عبور الهدف ('target') أو الوقف ('stop_loss').
+    """
+
+    def __init__(self, positions, fetch_prices, on_exit, interval=DEFAULT_CHECK_SECONDS):
+        self.positions = positions
+        self.fetch_prices = fetch_prices
+        self.on_exit = on_exit
+        self.interval = interval
+        self._stopped = False
+
+    async def check_once(self):
+        if not self.positions:
+            return
+        prices = await self.fetch_prices(list(self.positions))
+        for symbol, targets in list(self.positions.items()):
+            price = prices.get(symbol)
+            if price is None:
+                continue
+            if price >= targets['profit_target']:
+                await self.on_exit(symbol, targets, price, 'target')
+            elif price <= targets['stop_loss']:
+                await self.on_exit(symbol, targets, price, 'stop_loss')
+
+    async def run(self):
+        logger.info(f"[PositionMonitor] بدء المراقبة كل {self.interval} ث")
+        while not self._stopped:
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PositionMonitor] خطأ في جلب الأسعار: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        self._stopped = True
@@ -0,0 +1,285 @@
+# -----------------------------------------------------------------------------
+# position_store.py - تخزين دائم للصفقات المفتوحة وسجل الإشارات (SQLite WAL + كتابة مجمّعة)
+# -----------------------------------------------------------------------------
+
+import os
+import json
+import time
+import sqlite3
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+POSITION_DB_PATH = os.environ.get("POSITION_DB_PATH", "positions.db")
+FLUSH_SECONDS = 0.2     # أقصى تأخير قبل كتابة التغييرات (ما يُفقد عند انهيار مفاجئ)
+MAX_BATCH = 1000        # عدد التغييرات التي تُكتب فوراً دون انتظار المهلة
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    bot TEXT NOT NULL, symbol TEXT NOT NULL, data TEXT NOT NULL,
+    opened_at REAL NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (bot, symbol)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY, bot TEXT NOT NULL, symbol TEXT NOT NULL,
+    side TEXT NOT NULL, price REAL, reason TEXT, at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS signals_bot_at ON signals (bot, at);
+"""
+
+
+class PositionStore:
+    """
+    ملف SQLite واحد بوضع WAL. الكتابة لا تلمس القرص من حلقة الأحداث: التغييرات تُجمع في
+    الذاكرة (آخر قيمة لكل صفقة فقط) ويكتبها خيط واحد في معاملة واحدة كل FLUSH_SECONDS.
+    القراءة (load) متزامنة وتُستخدم مرة واحدة عند التشغيل. الاتصال مشترك بين خيط الكتابة
+    ومستدعي flush/load من خيوط أخرى، فكل استخدام له تحت _lock حتى لا تتداخل المعاملات.
+    """
+
+    def __init__(self, path=POSITION_DB_PATH, flush_seconds=FLUSH_SECONDS, max_batch=MAX_BATCH):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")   # في WAL: لا فقدان عند انهيار العملية
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()   # (bot, symbol) -> (data_json, opened_at, updated_at) أو None للحذف
+        self._signals = []
+        self._cond = threading.Condition()
+        self._writer = None
+        self._closed = False
+
+    # --- القراءة ---
+    def load(self, bot):
+        """{الرمز: (البيانات، وقت الفتح)} بترتيب فتح الصفقات."""
+        with self._lock:
+            rows = self.conn.execute("SELECT symbol, data, opened_at FROM positions WHERE bot = ? "
+                                     "ORDER BY opened_at", (bot,)).fetchall()
+        return OrderedDict((symbol, (json.loads(data), opened_at)) for symbol, data, opened_at in rows)
+
+    def signals(self, bot, limit=50):
+        with self._lock:
+            rows = self.conn.execute("SELECT symbol, side, price, reason, at FROM signals WHERE bot = ? "
+                                     "ORDER BY id DESC LIMIT ?", (bot, limit)).fetchall()
+        return [dict(zip(('symbol', 'side', 'price', 'reason', 'at'), row)) for row in rows]
+
+    # --- الكتابة المجمّعة ---
+    def put(self, bot, symbol, data, opened_at):
+        self._enqueue((bot, symbol), (json.dumps(data), opened_at, time.time()))
+
+    def delete(self, bot, symbol):
+        self._enqueue((bot, symbol), None)
+
+    def record_signal(self, bot, symbol, side, price=None, reason=None):
+        with self._cond:
+            self._signals.append((bot, symbol, side, price, reason, time.time()))
+            self._wake()
+
+    def _enqueue(self, key, value):
+        with self._cond:
+            self._pending[key] = value
+            self._pending.move_to_end(key)
+            self._wake()
+
+    def _wake(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name="position-store", daemon=True)
+            self._writer.start()
+        if len(self._pending) + len(self._signals) >= self.max_batch:
+            self._cond.notify()
+
+    def _take(self):
+        pending, signals = self._pending, self._signals
+        self._pending, self._signals = OrderedDict(), []
+        return pending, signals
+
+    def _write(self, pending, signals):
+        # يُستدعى تحت _lock: سحب الدفعة وكتابتها معاً حتى لا تسبق دفعة أحدث دفعة أقدم إلى الملف
+        upserts = [(bot, symbol, *value) for (bot, symbol), value in pending.items() if value is not None]
+        deletes = [key for key, value in pending.items() if value is None]
+        with self.conn:
+            # opened_at يبقى كما هو عند تحديث صفقة موجودة
+            self.conn.executemany(
+                "INSERT INTO positions (bot, symbol, data, opened_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (bot, symbol) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                upserts)
+            self.conn.executemany("DELETE FROM positions WHERE bot = ? AND symbol = ?", deletes)
+            self.conn.executemany(
+                "INSERT INTO signals (bot, symbol, side, price, reason, at) VALUES (?, ?, ?, ?, ?, ?)", signals)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) + len(self._signals) < self.max_batch:
+                    self._cond.wait(self.flush_seconds)
+                closed = self._closed
+            failed = False
+            with self._lock:
+                with self._cond:
+                    pending, signals = self._take()
+                if pending or signals:
+                    try:
+                        self._write(pending, signals)
+                    except sqlite3.Error as e:
+                        logger.error(f"[Positions] فشل حفظ {len(pending) + len(signals)} تغيير: {e}")
+                        with self._cond:
+                            # إعادة التغييرات دون الكتابة فوق ما هو أحدث منها
+                            for key, value in pending.items():
+                                self._pending.setdefault(key, value)
+                            self._signals[:0] = signals
+                        failed = True
+            if failed:
+                time.sleep(self.flush_seconds)
+            if closed:
+                return
+
+    def flush(self):
+        """يكتب كل التغييرات المعلقة الآن (من الخيط المستدعي)."""
+        with self._lock:
+            with self._cond:
+                pending, signals = self._take()
+            if pending or signals:
+                self._write(pending, signals)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+
+
+class PositionBook(MutableMapping):
+    """
+    قاموس {الرمز: بيانات الصفقة} في الذاكرة يُكتب في PositionStore عند كل تعيين أو حذف،
+    فتبقى القراءة (in، التكرار، PositionMonitor) بلا أي وصول للقرص.
+    عند التعديل يجب تعيين القيمة كاملة من جديد (book[s] = {...})، لا تعديل القاموس الداخلي.
+    الملف لا يُفتح عند الإنشاء بل في open() (من main/register) أو عند أول وصول للقاموس،
+    فاستيراد وحدة بوت لا يُنشئ positions.db.
+    """
+
+    def __init__(self, bot, path=POSITION_DB_PATH, store=None):
+        self.bot = bot
+        self.path = path
+        self._store = store
+        self._data = None
+        self._opened_at = {}
+
+    def open(self):
+        """يقرأ الصفقات المحفوظة مرة واحدة؛ الاستدعاءات التالية لا تفعل شيئاً."""
+        if self._data is None:
+            if self._store is None:
+                self._store = get_store(self.path)
+            start = time.perf_counter()
+            rows = self._store.load(self.bot)
+            self._data = OrderedDict((symbol, data) for symbol, (data, _) in rows.items())
+            self._opened_at = {symbol: opened_at for symbol, (_, opened_at) in rows.items()}
+            if self._data:
+                logger.info(f"[Positions] {self.bot}: استعادة {len(self._data)} صفقة مفتوحة "
+                            f"في {(time.perf_counter() - start) * 1000:.1f} ms")
+        return self
+
+    @property
+    def store(self):
+        return self.open()._store
+
+    def _rows(self):
+        return self._data if self._data is not None else self.open()._data
+
+    def __getitem__(self, symbol):
+        return self._rows()[symbol]
+
+    def __setitem__(self, symbol, data):
+        self._rows()[symbol] = data
+        opened_at = self._opened_at.setdefault(symbol, time.time())
+        self._store.put(self.bot, symbol, data, opened_at)
+
+    def __delitem__(self, symbol):
+        del self._rows()[symbol]
+        self._opened_at.pop(symbol, None)
+        self._store.delete(self.bot, symbol)
+
+    def __iter__(self):
+        return iter(list(self._rows()))
+
+    def __len__(self):
+        return len(self._rows())
+
+    def __contains__(self, symbol):
+        return symbol in self._rows()
+
+    def __repr__(self):
+        return f"PositionBook({self.bot!r}, {list(self._data) if self._data is not None else 'closed'})"
+
+    def record_signal(self, symbol, side, price=None, reason=None):
+        self.store.record_signal(self.bot, symbol, side, price, reason)
+
+    def reload(self, keep=None):
+        """
+        يعيد القراءة من الملف بعد كتابة المعلّق (عمليات أخرى تكتب فيه مع التقسيم).
+        keep(symbol) يُبقي في الذاكرة صفقات هذه العملية فقط؛ الباقي لا يُحذف من الملف.
+        """
+        store = self.store
+        store.flush()
+        rows = [(symbol, row) for symbol, row in store.load(self.bot).items() if keep is None or keep(symbol)]
+        self._data = OrderedDict((symbol, data) for symbol, (data, _) in rows)
+        self._opened_at = {symbol: opened_at for symbol, (_, opened_at) in rows}
+
+
+# --- مخزن واحد لكل ملف داخل العملية ---
+_stores = {}
+_books = []
+
+
+def get_store(path=POSITION_DB_PATH):
+    if path not in _stores:
+        _stores[path] = PositionStore(path)
+        atexit.register(_stores[path].close)
+    return _stores[path]
+
+
+def open_book(bot, path=POSITION_DB_PATH):
+    """كل بوت له مساحته (bot) داخل الملف المشترك. الملف يُفتح عند book.open() لا هنا."""
+    book = PositionBook(bot, path)
+    _books.append(book)
+    return book
+
+
+def open_books():
+    return list(_books)
+
+
+# --- قياس كلفة الكتابة وسرعة الاستعادة ---
+if __name__ == "__main__":
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    path = os.path.join(tempfile.mkdtemp(), "positions.db")
+    store = PositionStore(path)
+    book = PositionBook('bench', store=store).open()
+    symbols = [f"COIN{i}USDT" for i in range(500)]
+
+    start = time.perf_counter()
+    for cycle in range(10):
+        for i, symbol in enumerate(symbols):
+            price = 1.0 + i + cycle * 0.01
+            book[symbol] = {'buy_price': price, 'profit_target': price * 1.15, 'stop_loss': price * 0.95}
+            book.record_signal(symbol, 'BUY', price)
+    enqueue = time.perf_counter() - start
+    print(f"{10 * len(symbols)} تحديث + {10 * len(symbols)} إشارة: {enqueue * 1e6 / (20 * len(symbols)):.1f} µs لكل عملية على الحلقة")
+    for symbol in symbols[:100]:
+        del book[symbol]
+    store.close()
+
+    start = time.perf_counter()
+    restored = PositionBook('bench', store=PositionStore(path)).open()
+    print(f"استعادة {len(restored)} صفقة في {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert list(restored) == symbols[100:]
+    assert restored[symbols[-1]]['buy_price'] == book[symbols[-1]]['buy_price']
+    assert len(restored.store.signals('bench', limit=10_000)) == 10 * len(symbols)
@@ -0,0 +1,139 @@
+# -----------------------------------------------------------------------------
+# pump_screener.py - فحص الانفجارات السعرية لكل العملات دفعة واحدة (NumPy)
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from kline_parser import parse_many, OPEN, CLOSE, VOLUME
+
+MIN_CANDLES = 50
+
+
+def _to_array(rows_list):
+    return parse_many(rows_list)[1]
+
+
+def pack_klines(klines_map):
+    """
+    يحزم شموع كل العملات في مصفوفات (عملات × حقول × شموع). العملات تُجمّع حسب عدد
+    الشموع (في الغالب مجموعة واحدة) بدلاً من الحشو بـ NaN، حتى يبقى ترتيب الجمع
+    في المتوسط مطابقاً لـ pandas فتتطابق النتائج تماماً مع evaluate_explosion.
+    تُرجع قائمة من (الرموز، المصفوفة).
+    """
+    groups = {}
+    for symbol, rows in klines_map.items():
+        if rows and len(rows) >= MIN_CANDLES:
+            groups.setdefault(len(rows), []).append(symbol)
+
+    packed = []
+    for length, symbols in groups.items():
+        try:
+            packed.append((symbols, _to_array([klines_map[s] for s in symbols])))
+        except (ValueError, TypeError, IndexError):
+            # صف تالف في عملة ما: نحوّل كل عملة وحدها ونتجاهل التالفة كما تفعل الدالة الفردية
+            good, arrays = [], []
+            for symbol in symbols:
+                try:
+                    arrays.append(_to_array([klines_map[symbol]]))
+                    good.append(symbol)
+                except (ValueError, TypeError, IndexError):
+                    continue
+            if good:
+                packed.append((good, np.concatenate(arrays)))
+    return packed
+
+
+def screen_explosions(symbols, candles, volume_multiplier, price_change_threshold, stats=None):
+    """
+    نفس قاعدة evaluate_explosion لكل العملات في تمريرة واحدة:
+    حجم آخر شمعة > متوسط حجم الشموع السابقة × المضاعف، وتغير السعر >= العتبة.
+    تُرجع [(الرمز، سعر الإغلاق)] للعملات التي تحقق الشرطين. إن مُرر stats (قاموس)
+    يُملأ لكل عملة بـ (نسبة الحجم، تغير السعر %، الإغلاق) من نفس المصفوفات.
+    """
+    volumes = candles[:, VOLUME]
+    historical = volumes[:, :-1]
+    # مثل pandas: تجاهل NaN في المتوسط
+    valid = ~np.isnan(historical)
+    average_volume = np.where(valid, historical, 0.0).sum(axis=1) / valid.sum(axis=1)
+    last_open = candles[:, OPEN, -1]
+    last_close = candles[:, CLOSE, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_change = ((last_close / last_open) - 1) * 100
+        triggered = ((average_volume != 0)
+                     & (volumes[:, -1] > average_volume * volume_multiplier)
+                     & (price_change >= price_change_threshold))
+        if stats is not None:
+            ratios = volumes[:, -1] / average_volume
+            for i, symbol in enumerate(symbols):
+                stats[symbol] = (float(ratios[i]), float(price_change[i]), float(last_close[i]))
+    return [(symbols[i], last_close[i]) for i in np.flatnonzero(triggered)]
+
+
+def screen_klines(klines_map, volume_multiplier, price_change_threshold, stats=None):
+    triggered = []
+    for symbols, candles in pack_klines(klines_map):
+        triggered.extend(screen_explosions(symbols, candles, volume_multiplier, price_change_threshold, stats))
+    return triggered
+
+
+# --- قياس الأداء مقارنة بالفحص الفردي ---
+if __name__ == "__main__":
+    import random
+    import time
+    import pandas as pd
+    from kline_parser import parse_klines
+
+    # نفس عتبات sniper_bot دون استيراده (استيراده يحمّل تيليجرام وبقية البوت)
+    VOLUME_MULTIPLIER, PRICE_CHANGE = 10, 3.0
+    COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_av', 'trades',
+               'tb_base_av', 'tb_quote_av', 'ignore']
+
+    def pandas_rule(klines):
+        """القاعدة كما كانت في analyze_for_explosion قبل التحسين: DataFrame لكل عملة."""
+        df = pd.DataFrame(klines, columns=COLUMNS)
+        df['close'] = pd.to_numeric(df['close']); df['open'] = pd.to_numeric(df['open'])
+        df['volume'] = pd.to_numeric(df['volume'])
+        average_volume = df.iloc[:-1]['volume'].mean()
+        last = df.iloc[-1]
+        if average_volume == 0: return None
+        if (last['volume'] > average_volume * VOLUME_MULTIPLIER
+                and ((last['close'] / last['open']) - 1) * 100 >= PRICE_CHANGE):
+            return float(last['close'])
+        return None
+
+    def parsed_rule(klines):
+        """نفس القاعدة على Klines من parse_klines لكل عملة (المسار الحالي لـ evaluate_explosion)."""
+        k = parse_klines(klines)
+        average_volume = k.volume[:-1].mean()
+        if average_volume == 0: return None
+        if k.volume[-1] > average_volume * VOLUME_MULTIPLIER and ((k.close[-1] / k.open[-1]) - 1) * 100 >= PRICE_CHANGE:
+            return float(k.close[-1])
+        return None
+
+    random.seed(1)
+    klines_map = {}
+    for n in range(600):
+        rows, price = [], random.uniform(0.01, 500)
+        for i in range(51):
+            open_price = price
+            price *= 1 + random.uniform(-0.01, 0.01)
+            volume = random.uniform(10, 1000)
+            if i == 50 and n % 25 == 0:
+                price, volume = open_price * 1.05, volume * 50
+            rows.append([i * 300_000, f"{open_price:.8f}", "0", "0", f"{price:.8f}", f"{volume:.4f}",
+                         i * 300_000 + 299_999, "0", 1, "0", "0", "0"])
+        klines_map[f"C{n}USDT"] = rows
+
+    timings, results = {}, {}
+    for name, rule in (('pandas', pandas_rule), ('parse', parsed_rule)):
+        start = time.perf_counter()
+        results[name] = sorted((s, p) for s, rows in klines_map.items() if (p := rule(rows)) is not None)
+        timings[name] = time.perf_counter() - start
+    start = time.perf_counter()
+    results['batch'] = sorted((s, float(p)) for s, p in screen_klines(klines_map, VOLUME_MULTIPLIER, PRICE_CHANGE))
+    timings['batch'] = time.perf_counter() - start
+
+    assert results['pandas'] == results['parse'] == results['batch'], results
+    print(f"{len(klines_map)} عملة | إشارات: {len(results['batch'])}")
+    print(f"pandas لكل عملة (قبل التحسين): {timings['pandas'] * 1000:.1f} ms")
+    print(f"parse_klines لكل عملة:         {timings['parse'] * 1000:.1f} ms  (x{timings['pandas'] / timings['parse']:.0f})")
+    print(f"الفحص المجمّع (NumPy):          {timings['batch'] * 1000:.1f} ms  (x{timings['pandas'] / timings['batch']:.0f})")
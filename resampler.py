@@ -0,0 +1,366 @@
+# -----------------------------------------------------------------------------
+# resampler.py - اشتقاق فواصل أعلى (15m/1h/4h/1d) محلياً من سلسلة شموع أساسية واحدة
+# -----------------------------------------------------------------------------
+#   python resampler.py check [--base-url URL] [--symbols BTCUSDT,ETHUSDT]
+#   python resampler.py bench [--symbols 100]
+# check يقارن الشموع المشتقة بالشموع الأصلية من المنصة (أو من المحاكي بـ --resample-from 15m).
+
+import os
+import time
+import logging
+import threading
+import numpy as np
+from kline_cache import DELTA_HEADROOM, INTERVAL_MS
+from kline_parser import Klines, parse_klines
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BASE_INTERVAL = os.environ.get("RESAMPLE_BASE_INTERVAL", "15m")
+TIMEFRAMES = ('15m', '1h', '4h', '1d')
+FRAME_CAPACITY = int(os.environ.get("RESAMPLE_FRAME_CAPACITY", 300))   # شموع مغلقة محفوظة لكل فاصل
+
+# أعمدة الصف المشتق: نفس ترتيب Klines (الأوقات ثم القيم)
+T_OPEN, T_CLOSE, V_OPEN, V_HIGH, V_LOW, V_CLOSE, V_VOLUME, V_QUOTE = range(8)
+
+
+def _row(raw):
+    """صف Binance (نصوص أو أرقام) -> [open_time, close_time, o, h, l, c, v, quote_volume]."""
+    return [int(raw[0]), int(raw[6]), float(raw[1]), float(raw[2]), float(raw[3]), float(raw[4]),
+            float(raw[5]), float(raw[7])]
+
+
+def _fold(bucket, row):
+    bucket[V_HIGH] = max(bucket[V_HIGH], row[V_HIGH])
+    bucket[V_LOW] = min(bucket[V_LOW], row[V_LOW])
+    bucket[V_CLOSE] = row[V_CLOSE]
+    bucket[V_VOLUME] += row[V_VOLUME]
+    bucket[V_QUOTE] += row[V_QUOTE]
+
+
+class Frame:
+    """
+    شموع مغلقة لفاصل واحد في مصفوفة (8 × 2·capacity): الإضافة تكتب عموداً واحداً،
+    وعند امتلاء المخزن تُنقل آخر capacity شمعة إلى بدايته مرة كل capacity إضافة.
+    """
+
+    __slots__ = ('data', 'start', 'size', 'capacity')
+
+    def __init__(self, capacity):
+        self.data = np.empty((8, capacity * 2), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        self.capacity = capacity
+
+    def append(self, row):
+        end = self.start + self.size
+        if end == self.data.shape[1]:
+            self.data[:, :self.size] = self.data[:, self.start:end]
+            self.start, end = 0, self.size
+        self.data[:, end] = row
+        if self.size == self.capacity:
+            self.start += 1
+        else:
+            self.size += 1
+
+    def rows(self):
+        return self.data[:, self.start:self.start + self.size]
+
+
+class Resampler:
+    """
+    سلسلة أساسية واحدة لعملة واحدة تُطوى شمعة شمعة في كل فاصل أعلى. الحاوية محاذاة لـ UTC
+    (open_time - open_time % interval) كما تفعل المنصة، والحاوية الأولى الناقصة تُهمل.
+    الحاوية تُغلق مع آخر شمعة أساسية فيها، والشمعة الأساسية المتشكلة تُدمج عند القراءة فقط.
+    """
+
+    __slots__ = ('base_ms', 'intervals', 'frames', 'partial', 'aligned', 'last_open', 'forming', '_lock')
+
+    def __init__(self, base_interval=BASE_INTERVAL, intervals=TIMEFRAMES, capacity=FRAME_CAPACITY):
+        self.base_ms = INTERVAL_MS[base_interval]
+        for interval in intervals:
+            if INTERVAL_MS[interval] % self.base_ms:
+                raise ValueError(f"{interval} ليس مضاعفاً لـ {base_interval}")
+        self.intervals = tuple(intervals)
+        self.frames = {interval: Frame(capacity) for interval in self.intervals}
+        self.partial = dict.fromkeys(self.intervals)   # حاوية تتجمع من شموع أساسية مغلقة
+        self.aligned = dict.fromkeys(self.intervals, False)
+        self.last_open = None
+        self.forming = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        capacity = next(iter(self.frames.values())).capacity
+        self.frames = {interval: Frame(capacity) for interval in self.intervals}
+        self.partial = dict.fromkeys(self.intervals)
+        self.aligned = dict.fromkeys(self.intervals, False)
+        self.last_open = None
+        self.forming = None
+
+    def _add(self, row):
+        t = row[T_OPEN]
+        for interval in self.intervals:
+            ms = INTERVAL_MS[interval]
+            start = t - t % ms
+            bucket = self.partial[interval]
+            if bucket is not None and bucket[T_OPEN] != start:
+                # فجوة عبرت حدود الحاوية: تُغلق بما وصلها
+                self.frames[interval].append(bucket)
+                bucket = None
+            if bucket is None:
+                if not self.aligned[interval] and t != start:
+                    continue
+                self.aligned[interval] = True
+                bucket = [start, start + ms - 1] + row[V_OPEN:]
+            else:
+                _fold(bucket, row)
+            if t + self.base_ms == start + ms:
+                self.frames[interval].append(bucket)
+                bucket = None
+            self.partial[interval] = bucket
+        self.last_open = t
+
+    def merge(self, rows, full=False):
+        """
+        يطوي صفوف REST الجديدة (آخر صف يُعامل كشمعة تتشكل كما في KlineRing).
+        full يعيد البناء من الصفر ويقبل الفجوات الداخلية؛ في التحديث الجزئي تُرجع False
+        عند فجوة حتى يُعاد التحميل الكامل.
+        """
+        with self._lock:
+            if full:
+                self.reset()
+            if not rows:
+                return True
+            self.forming = None
+            for raw in rows[:-1]:
+                row = _row(raw)
+                if self.last_open is not None:
+                    if row[T_OPEN] <= self.last_open:
+                        continue
+                    if not full and row[T_OPEN] != self.last_open + self.base_ms:
+                        return False
+                self._add(row)
+            row = _row(rows[-1])
+            if self.last_open is not None and not full and row[T_OPEN] > self.last_open + self.base_ms:
+                return False
+            if self.last_open is None or row[T_OPEN] > self.last_open:
+                self.forming = row
+            return True
+
+    def _forming_rows(self, interval):
+        """الحاوية الجارية (مغلقة جزئياً + الشمعة الأساسية المتشكلة) كصف أو صفين."""
+        ms = INTERVAL_MS[interval]
+        bucket = self.partial[interval]
+        bucket = list(bucket) if bucket is not None else None
+        forming = self.forming
+        if forming is None:
+            return [bucket] if bucket is not None else []
+        start = forming[T_OPEN] - forming[T_OPEN] % ms
+        if bucket is not None and bucket[T_OPEN] == start:
+            _fold(bucket, forming)
+            return [bucket]
+        head = [bucket] if bucket is not None else []
+        if not self.aligned[interval] and forming[T_OPEN] != start:
+            return head
+        return head + [[start, start + ms - 1] + forming[V_OPEN:]]
+
+    def klines(self, interval, limit=None, closed_only=False):
+        """آخر limit شمعة لفاصل كـ Klines (نسخة مستقلة عن المخزن)."""
+        with self._lock:
+            rows = self.frames[interval].rows()
+            tail = [] if closed_only else self._forming_rows(interval)
+            data = np.concatenate((rows, np.array(tail, dtype=np.float64).T), axis=1) if tail else rows.copy()
+        if limit is not None:
+            data = data[:, -limit:]
+        return Klines(data[:2].astype(np.int64), np.ascontiguousarray(data[2:]))
+
+    def timeframes(self, limit=None, closed_only=False):
+        """{الفاصل: Klines} كلها منتهية عند نفس الشمعة الأساسية (أو عند آخر شمعة مغلقة لكل فاصل)."""
+        return {interval: self.klines(interval, limit, closed_only) for interval in self.intervals}
+
+    def memory_bytes(self):
+        return sum(frame.data.nbytes for frame in self.frames.values())
+
+
+class TimeframeCache:
+    """
+    بديل KlineCache لاستراتيجية متعددة الفواصل: طلب واحد للفاصل الأساسي لكل عملة (كامل أول مرة
+    ثم الشموع الجديدة فقط)، ويُرجع fetch قاموس {الفاصل: Klines} بدل صفوف REST.
+    لا تُحفظ صفوف REST الخام، فقط الشموع المشتقة في مصفوفات رقمية.
+    closed_only=True يُسقط الحاوية الجارية من كل فاصل (فحص بعد الإغلاق يحكم على الشمعة المغلقة).
+    """
+
+    def __init__(self, intervals=TIMEFRAMES, capacity=FRAME_CAPACITY, closed_only=False):
+        self.intervals = tuple(intervals)
+        self.capacity = capacity
+        self.closed_only = closed_only
+        self._resamplers = {}
+        self._lock = threading.Lock()
+        self.full_fetches = 0
+        self.delta_fetches = 0
+
+    def _resampler(self, key, create=True):
+        with self._lock:
+            resampler = self._resamplers.get(key)
+            if resampler is None and create:
+                resampler = self._resamplers[key] = Resampler(key[2], self.intervals, self.capacity)
+            return resampler
+
+    def invalidate(self, key):
+        with self._lock:
+            self._resamplers.pop(key, None)
+
+    def plan(self, key, limit):
+        """(start_time، حجم الطلب) للطلب التالي؛ start_time=None يعني تحميلاً كاملاً بـ limit شمعة."""
+        resampler = self._resampler(key, create=False)
+        if resampler is None or resampler.last_open is None:
+            return None, limit
+        start_time = int(resampler.last_open) + resampler.base_ms
+        missing = (int(time.time() * 1000) - start_time) // resampler.base_ms + 1
+        return start_time, max(1, min(limit, missing + DELTA_HEADROOM))
+
+    def _after_fetch(self, key, rows, start_time, limit):
+        if start_time is None:
+            self.full_fetches += 1
+            self._resampler(key).merge(rows or [], full=True)
+            return True
+        self.delta_fetches += 1
+        # صفحة ممتلئة تعني أن الغياب أطول من المتوقع: الأسرع إعادة التحميل الكامل
+        if len(rows or ()) >= limit or not self._resampler(key).merge(rows or []):
+            logger.warning(f"[Resampler] فجوة في شموع {key}، سيُعاد التحميل الكامل")
+            self.invalidate(key)
+            return False
+        return True
+
+    def _frames(self, key):
+        resampler = self._resampler(key, create=False)
+        return resampler.timeframes(closed_only=self.closed_only) if resampler is not None else {}
+
+    async def fetch(self, key, limit, fetch):
+        """fetch(symbol, interval, limit, start_time) دالة async تُرجع صفوف الشموع من المنصة."""
+        exchange, symbol, interval = key
+        start_time, size = self.plan(key, limit)
+        rows = await fetch(symbol, interval, size, start_time)
+        if not self._after_fetch(key, rows, start_time, size):
+            rows = await fetch(symbol, interval, limit, None)
+            self._after_fetch(key, rows, None, limit)
+        return self._frames(key)
+
+    def memory_bytes(self):
+        return sum(r.memory_bytes() for r in self._resamplers.values())
+
+
+# --- المقارنة مع شموع المنصة الأصلية وقياس الأداء ---
+def compare(derived, native, rtol=1e-9):
+    """
+    يقارن الشموع المغلقة المشتركة بين Klines مشتقة وصفوف REST أصلية لنفس الفاصل.
+    تُرجع (عدد الشموع المقارنة، قائمة الفروقات).
+    """
+    native = parse_klines(native[:-1])   # آخر صف أصلي ما زال يتشكل
+    common, d_idx, n_idx = np.intersect1d(derived.open_time, native.open_time, return_indices=True)
+    mismatches = []
+    if not (derived.close_time[d_idx] == native.close_time[n_idx]).all():
+        mismatches.append("close_time")
+    for field in ('open', 'high', 'low', 'close', 'volume', 'quote_volume'):
+        a, b = getattr(derived, field)[d_idx], getattr(native, field)[n_idx]
+        bad = ~np.isclose(a, b, rtol=rtol, atol=0)
+        if bad.any():
+            i = int(np.argmax(bad))
+            mismatches.append(f"{field} @ {int(common[i])}: {a[i]!r} != {b[i]!r}")
+    return len(common), mismatches
+
+
+async def _check(base_url, symbols, base_limit, native_limit):
+    from fetch_engine import FetchEngine
+    engine = FetchEngine(base_url)
+    cache = TimeframeCache()
+    failures = 0
+    try:
+        for symbol in symbols:
+            frames = await cache.fetch(('binance', symbol, BASE_INTERVAL), base_limit, engine.klines)
+            for interval in TIMEFRAMES:
+                native = await engine.klines(symbol, interval, native_limit)
+                resampler = cache._resampler(('binance', symbol, BASE_INTERVAL))
+                count, mismatches = compare(resampler.klines(interval, closed_only=True), native)
+                status = "مطابق" if count and not mismatches else "مختلف"
+                failures += bool(mismatches) or not count
+                print(f"{symbol:<12} {interval:>4} {count:>5} شمعة مغلقة  {status}  {'; '.join(mismatches)[:160]}")
+            assert set(frames) == set(TIMEFRAMES)
+    finally:
+        await engine.close()
+    return failures
+
+
+def _bench(symbols, base_limit, updates):
+    """تحميل كامل لـ symbols عملة ثم updates شمعة جديدة لكل عملة، مقابل تجميع pandas لكل فاصل."""
+    import pandas as pd
+    rng = np.random.default_rng(5)
+    now = int(time.time() * 1000) // INTERVAL_MS['1d'] * INTERVAL_MS['1d']
+    base_ms = INTERVAL_MS[BASE_INTERVAL]
+    total = base_limit + updates
+    datasets = []
+    for _ in range(symbols):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.01, total)))
+        opens = np.concatenate(([10.0], close[:-1]))
+        volume = rng.lognormal(8, 0.5, total)
+        times = now - (total - np.arange(total)) * base_ms
+        datasets.append([[int(t), f"{o:.8f}", f"{max(o, c) * 1.002:.8f}", f"{min(o, c) * 0.998:.8f}",
+                          f"{c:.8f}", f"{v:.4f}", int(t) + base_ms - 1, f"{v * c:.4f}", 100, "0", "0", "0"]
+                         for t, o, c, v in zip(times, opens, close, volume)])
+
+    cache = TimeframeCache()
+    start = time.perf_counter()
+    for i, rows in enumerate(datasets):
+        cache._resampler(('binance', i, BASE_INTERVAL)).merge(rows[:base_limit + 1], full=True)
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    for step in range(updates - 1):
+        for i, rows in enumerate(datasets):
+            cache._resampler(('binance', i, BASE_INTERVAL)).merge(rows[base_limit + step:base_limit + step + 2])
+    delta = (time.perf_counter() - start) / max(1, updates - 1)
+    start = time.perf_counter()
+    for i in range(symbols):
+        cache._resampler(('binance', i, BASE_INTERVAL)).timeframes()
+    read = time.perf_counter() - start
+
+    def pandas_path(rows):
+        k = parse_klines(rows)
+        df = pd.DataFrame({'open': k.open, 'high': k.high, 'low': k.low, 'close': k.close, 'volume': k.volume},
+                          index=pd.to_datetime(k.open_time, unit='ms'))
+        agg = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+        return {interval: df.resample(interval.replace('m', 'min').replace('d', 'D')).agg(agg) for interval in TIMEFRAMES}
+
+    start = time.perf_counter()
+    for rows in datasets:
+        pandas_path(rows[:base_limit + updates])
+    pandas_seconds = time.perf_counter() - start
+    print(f"{symbols} عملة × {base_limit} شمعة {BASE_INTERVAL} -> {', '.join(TIMEFRAMES)}")
+    print(f"تحميل كامل:                {full * 1000:>8.1f} ms")
+    print(f"تحديث بشمعة جديدة (كل العملات): {delta * 1000:>8.2f} ms")
+    print(f"قراءة كل الفواصل (كل العملات):  {read * 1000:>8.2f} ms")
+    print(f"pandas resample من الصفر:   {pandas_seconds * 1000:>8.1f} ms لكل جولة")
+    print(f"الذاكرة: {cache.memory_bytes() / symbols / 1024:.0f} KiB لكل عملة "
+          f"(صفوف REST الخام لـ {base_limit} شمعة ≈ {base_limit * 0.8:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    import sys
+    import asyncio
+    import argparse
+    from fetch_engine import BINANCE_BASE_URL
+    parser = argparse.ArgumentParser(description="اشتقاق الفواصل الأعلى محلياً: تحقق وقياس")
+    sub = parser.add_subparsers(dest='command', required=True)
+    check = sub.add_parser('check', help="مقارنة الشموع المشتقة بشموع المنصة الأصلية")
+    check.add_argument('--base-url', default=BINANCE_BASE_URL)
+    check.add_argument('--symbols', default="BTCUSDT,ETHUSDT,SOLUSDT")
+    check.add_argument('--base-limit', type=int, default=1000)
+    check.add_argument('--native-limit', type=int, default=100)
+    bench = sub.add_parser('bench', help="زمن الطي والتحديث والذاكرة")
+    bench.add_argument('--symbols', type=int, default=100)
+    bench.add_argument('--base-limit', type=int, default=1000)
+    bench.add_argument('--updates', type=int, default=96)
+    args = parser.parse_args()
+    if args.command == 'check':
+        symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+        sys.exit(1 if asyncio.run(_check(args.base_url, symbols, args.base_limit, args.native_limit)) else 0)
+    _bench(args.symbols, args.base_limit, args.updates)
@@ -0,0 +1,304 @@
+# -----------------------------------------------------------------------------
+# runtime.py - تشغيل عدة استراتيجيات ومنصات في عملية واحدة (حلقة واحدة، خادم واحد، بيانات مشتركة)
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+import importlib
+from telegram.ext import Application, CommandHandler
+from fetch_engine import FetchEngine
+from bingx_client import BingXClient
+from kline_cache import KlineCache
+from telegram_dispatcher import TelegramDispatcher
+from health_server import HEALTH, WARMING, READY, start_health_server, add_route
+from market_snapshot import register_commands
+from symbol_universe import SymbolUniverse, binance_sources, bingx_sources
+from scheduler import schedule_aligned
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+# كل استراتيجية وحدة تعرّف register(runtime)
+STRATEGY_MODULES = {'hybrid': 'bot', 'sniper': 'sniper_bot', 'bingx': 'bot_bingx', 'mtfa': 'ccxt_bot'}
+RUNTIME_STRATEGIES = os.environ.get("RUNTIME_STRATEGIES", ",".join(STRATEGY_MODULES))
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 10))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("FETCH_TIMEOUT_SECONDS", 10))
+SHARE_TTL_SECONDS = 30   # شموع جُلبت قبل أقل من هذا تُعاد لاستراتيجية أخرى دون طلب جديد
+TELEGRAM_BASE_URL = os.environ.get("TELEGRAM_BASE_URL")   # بديل api.telegram.org (للقياس المحلي)
+SHARD_ROLE = os.environ.get("SHARD_ROLE", "")   # coordinator أو worker لتوزيع الكون على عدة عمليات (sharding.py)
+
+
+def rss_bytes():
+    """الذاكرة المقيمة الحالية للعملية (أو الذروة حيث لا يوجد /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+# --- محوّلات المنصات ---
+def binance_adapter():
+    return FetchEngine(concurrency=FETCH_CONCURRENCY, timeout=FETCH_TIMEOUT_SECONDS)
+
+
+def bingx_adapter():
+    return BingXClient(os.environ.get("BINGX_API_KEY"), os.environ.get("BINGX_SECRET_KEY"),
+                       concurrency=FETCH_CONCURRENCY, timeout=FETCH_TIMEOUT_SECONDS)
+
+
+# كل محوّل يقدم نفس الواجهة async: klines_many(symbols, interval, limit, cache) و prices(symbols) و close()
+ADAPTERS = {'binance': (binance_adapter, binance_sources), 'bingx': (bingx_adapter, bingx_sources)}
+
+
+class SharedMarketData:
+    """
+    يغلّف محوّل منصة واحدة لكل الاستراتيجيات: ذاكرة شموع واحدة، وطلب واحد فقط لكل
+    (عملة، فترة) قيد التنفيذ في آن واحد (single-flight)، ونتيجة حديثة تُشارك لـ SHARE_TTL_SECONDS.
+    باقي الدوال (prices، exchange_info، ...) تُمرر للمحوّل كما هي.
+    """
+
+    def __init__(self, adapter, ttl=SHARE_TTL_SECONDS):
+        self.adapter = adapter
+        self.ttl = ttl
+        self.cache = KlineCache()
+        self._depth = {}      # interval -> أكبر limit طلبته أي استراتيجية
+        self._inflight = {}   # (symbol, interval) -> (depth, future)
+        self._recent = {}     # (symbol, interval) -> (وقت الجلب، الصفوف، depth)
+        self.fetched = 0
+        self.shared = 0
+
+    def __getattr__(self, name):
+        return getattr(self.adapter, name)
+
+    async def klines_many(self, symbols, interval, limit, cache=None):
+        """
+        KlineCache الخاص بالاستراتيجية يُتجاهل: كلها تستخدم ذاكرة الشموع المشتركة لهذه المنصة.
+        ذاكرة لا تُرجع صفوف REST (مثل TimeframeCache في resampler.py) تُمرر للمحوّل كما هي.
+        """
+        if cache is not None and not isinstance(cache, KlineCache):
+            return await self.adapter.klines_many(symbols, interval, limit, cache=cache)
+        # نافذة واحدة بأكبر عمق لكل فترة، وإلا تبادلت الاستراتيجيات إعادة التحميل الكامل
+        depth = self._depth[interval] = max(limit, self._depth.get(interval, 0))
+        now = time.monotonic()
+        result, waiting, missing = {}, {}, []
+        for symbol in dict.fromkeys(symbols):
+            key = (symbol, interval)
+            recent = self._recent.get(key)
+            inflight = self._inflight.get(key)
+            if recent is not None and now - recent[0] < self.ttl and recent[2] >= limit:
+                result[symbol] = recent[1][-limit:]
+            elif inflight is not None and inflight[0] >= limit:
+                waiting[symbol] = inflight[1]
+            else:
+                missing.append(symbol)
+        self.shared += len(result) + len(waiting)
+        self.fetched += len(missing)
+        if missing:
+            future = asyncio.ensure_future(self.adapter.klines_many(missing, interval, depth, cache=self.cache))
+            for symbol in missing:
+                self._inflight[(symbol, interval)] = (depth, future)
+            future.add_done_callback(lambda f: self._settle(f, missing, interval, depth))
+            waiting.update(dict.fromkeys(missing, future))
+        for symbol, future in waiting.items():
+            # shield: إلغاء جولة استراتيجية لا يُلغي الطلب الذي تنتظره استراتيجية أخرى
+            rows = (await asyncio.shield(future)).get(symbol)
+            result[symbol] = rows[-limit:] if rows else rows
+        return result
+
+    def _settle(self, future, symbols, interval, depth):
+        now = time.monotonic()
+        fetched = {} if future.cancelled() or future.exception() else future.result()
+        for symbol in symbols:
+            key = (symbol, interval)
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+            if fetched.get(symbol):
+                self._recent[key] = (now, fetched[symbol], depth)
+        for key in [k for k, (at, _, _) in self._recent.items() if now - at >= self.ttl]:
+            del self._recent[key]
+
+
+# --- العملية الموحدة ---
+class Runtime:
+    """
+    تطبيق تيليجرام واحد، ومرسل رسائل واحد، وخادم صحة واحد لكل الاستراتيجيات.
+    كل وحدة استراتيجية تسجل نفسها عبر register(runtime) مستخدمة:
+    market(exchange) و universe(exchange) و schedule(...) و add_service(start).
+    """
+
+    def __init__(self, token, chat_id):
+        self.chat_id = chat_id
+        builder = Application.builder().token(token).post_init(self._post_init).post_shutdown(self._post_shutdown)
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(f"{TELEGRAM_BASE_URL.rstrip('/')}/bot")
+        self.application = builder.build()
+        self.application.add_handler(CommandHandler("start", self._start_command))
+        register_commands(self.application)
+        self.dispatcher = TelegramDispatcher(self.application.bot)
+        self.strategies = []
+        self._markets = {}
+        self._universes = {}
+        self._services = []
+        self._stop_callbacks = []
+        self._warm_task = None
+        self.shards = None       # ShardWorker عند التقسيم (sharding.attach)
+        self.headless = False    # عامل شظايا: بلا getUpdates، إشاراته تمر عبر المنسق
+
+    def market(self, exchange):
+        if exchange not in self._markets:
+            self._markets[exchange] = SharedMarketData(ADAPTERS[exchange][0]())
+        return self._markets[exchange]
+
+    def universe(self, exchange, **kwargs):
+        """كون عملات واحد لكل منصة؛ إعدادات أول من يطلبه هي المعتمدة."""
+        if exchange not in self._universes:
+            sources = ADAPTERS[exchange][1](self.market(exchange))
+            self._universes[exchange] = SymbolUniverse(*sources, name=exchange, **kwargs)
+        return self._universes[exchange]
+
+    def schedule(self, callback, interval_seconds, data, bot):
+        return schedule_aligned(self.application.job_queue, callback, interval_seconds, data, bot)
+
+    def add_service(self, start):
+        """start: دالة async تُستدعى عند التشغيل وتُرجع دالة إيقاف async (اختيارية)."""
+        self._services.append(start)
+
+    def load(self, names):
+        for name in names:
+            module = importlib.import_module(STRATEGY_MODULES[name])
+            module.register(self)
+            self.strategies.append(name)
+            logger.info(f"[Runtime] تم تحميل الاستراتيجية {name} ({module.__name__})")
+
+    async def _post_init(self, application):
+        self.dispatcher.start()
+        # التهيئة في الخلفية حتى يبدأ استقبال أوامر تيليجرام والمهام المجدولة فوراً
+        self._warm_task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self):
+        start = time.perf_counter()
+        HEALTH.set(WARMING, phase='metadata')
+        results = await asyncio.gather(*(u.refresh_info() for u in self._universes.values()), return_exceptions=True)
+        errors = [f"{name}: {r}" for name, r in zip(self._universes, results) if isinstance(r, Exception)]
+        for error in errors:
+            logger.warning(f"[Runtime] تعذر تحميل معلومات المنصة مسبقاً: {error}")
+        HEALTH.set(WARMING, phase='services')
+        for start_service in self._services:
+            stop = await start_service()
+            if stop is not None:
+                self._stop_callbacks.append(stop)
+        HEALTH.set(READY, phase='running', warmup_errors=errors)
+        logger.info(f"--- [Runtime] جاهز بعد تهيئة {time.perf_counter() - start:.2f} ث ---")
+
+    async def _post_shutdown(self, application):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+        for stop in reversed(self._stop_callbacks):
+            await stop()
+        await self.dispatcher.stop()
+        for market in self._markets.values():
+            await market.close()
+
+    async def _start_command(self, update, context):
+        user = update.effective_user
+        await update.message.reply_html(f"أهلاً بك يا {user.mention_html()}!\n\n"
+                                        f"الاستراتيجيات العاملة: <b>{', '.join(self.strategies)}</b>\n"
+                                        f"<i>صنع بواسطه المطور عبدالرحمن محمد</i>")
+
+    def status(self):
+        return {
+            'strategies': self.strategies,
+            'rss_mb': round(rss_bytes() / 2**20, 1),
+            'markets': {name: {'fetched': m.fetched, 'shared': m.shared} for name, m in self._markets.items()},
+            **({'shards': self.shards.status()} if self.shards is not None else {}),
+        }
+
+    def run(self):
+        if self.headless:
+            asyncio.run(self._run_headless())
+        else:
+            self.application.run_polling()
+
+    async def _run_headless(self):
+        """المهام المجدولة والخدمات فقط؛ run_polling لا يُستخدم فتُستدعى post_init/post_shutdown يدوياً."""
+        import signal
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        async with self.application:
+            await self._post_init(self.application)
+            await self.application.start()
+            try:
+                await stop_event.wait()
+            finally:
+                await self.application.stop()
+                await self._post_shutdown(self.application)
+
+
+def main(strategies=None):
+    # fast_start.py يربط خادم الصحة قبل استيراد هذه الوحدة؛ هنا يُعاد نفس الخادم
+    start_health_server(int(os.environ.get("PORT", 10000)))
+    TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
+    TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID]):
+        logger.critical("!!! [Runtime] فشل: متغيرات البيئة غير كاملة. !!!")
+        return
+    HEALTH.set(WARMING, phase='strategies')
+    runtime = Runtime(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
+    if SHARD_ROLE:
+        import sharding
+        sharding.attach(runtime, SHARD_ROLE)
+    runtime.load(strategies or [name.strip() for name in RUNTIME_STRATEGIES.split(",") if name.strip()])
+    add_route('/status', lambda: (200, 'application/json', json.dumps(runtime.status(), ensure_ascii=False)))
+    HEALTH.set(WARMING, phase='telegram', strategies=runtime.strategies)
+    logger.info(f"--- [Runtime] الاستراتيجيات: {runtime.strategies} | الذاكرة {rss_bytes() / 2**20:.0f} MB ---")
+    runtime.run()
+
+
+# --- مقارنة الذاكرة: عملية لكل بوت مقابل عملية واحدة ---
+def measure():
+    import subprocess
+    env = dict(os.environ, TELEGRAM_TOKEN=os.environ.get("TELEGRAM_TOKEN", "0:measure"))
+    names = list(STRATEGY_MODULES)
+
+    def child(target):
+        out = subprocess.run([sys.executable, __file__, "--child", target], env=env,
+                             capture_output=True, text=True, check=True)
+        return int(out.stdout.strip().splitlines()[-1])
+
+    separate = {name: child(name) for name in names}
+    unified = child(",".join(names))
+    for name, rss in separate.items():
+        print(f"{name:<10} عملية مستقلة   {rss / 2**20:>7.1f} MB")
+    total = sum(separate.values())
+    print(f"{'المجموع':<10} {len(names)} عمليات      {total / 2**20:>7.1f} MB")
+    print(f"{'runtime':<10} عملية واحدة    {unified / 2**20:>7.1f} MB  (توفير {(1 - unified / total) * 100:.0f}%)")
+
+
+def _child(target):
+    # ما تدفعه كل عملية عند التشغيل: الوحدات + تطبيق تيليجرام + تسجيل المهام (بدون شبكة)
+    token = os.environ["TELEGRAM_TOKEN"]
+    runtime = Runtime(token, "0")
+    runtime.load(target.split(","))
+    print(rss_bytes())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if sys.argv[1:2] == ["--measure"]:
+        measure()
+    elif sys.argv[1:2] == ["--child"]:
+        _child(sys.argv[2])
+    else:
+        main()
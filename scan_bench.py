@@ -0,0 +1,196 @@
+# -----------------------------------------------------------------------------
+# scan_bench.py - قياس جولات الفحص كاملة على المحاكي المحلي (الزمن، الطلبات، ذروة الذاكرة)
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import argparse
+import subprocess
+from types import SimpleNamespace
+from urllib.request import urlopen, Request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STRATEGIES = ('hybrid', 'sniper', 'bingx', 'mtfa')
+DEFAULT_SIZES = (100, 500, 2000)
+UNLIMITED = 10 ** 9
+
+
+class CountingDispatcher:
+    """يأخذ مكان TelegramDispatcher: يعدّ الإشارات دون إرسال."""
+
+    def __init__(self):
+        self.messages = 0
+
+    def enqueue(self, chat_id, text, parse_mode=None, **kwargs):
+        self.messages += 1
+
+
+def _http(url, method="GET"):
+    with urlopen(Request(url, method=method, data=b"" if method == "POST" else None), timeout=10) as r:
+        return json.loads(r.read() or b"{}")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _peak_rss_bytes():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# --- عملية فرعية لكل (استراتيجية، حجم) حتى تكون ذروة الذاكرة خاصة بها ---
+async def _run_child(strategy, size, url):
+    from weight_governor import WeightGovernor
+    from fetch_engine import FetchEngine
+    from bingx_client import BingXClient
+    from kline_cache import KlineCache
+    from symbol_universe import SymbolUniverse, binance_sources, bingx_sources
+
+    governor = WeightGovernor('bench', limit=UNLIMITED, weight_header=None)
+    dispatcher = CountingDispatcher()
+    data = {'dispatcher': dispatcher, 'chat_id': 0}
+    if strategy == 'bingx':
+        import bot_bingx as module
+        client = BingXClient(base_url=url, governor=governor)
+        data.update(client=client, universe=SymbolUniverse(*bingx_sources(client), name='bingx'))
+        scan = module.scan_market
+    else:
+        module = {'hybrid': 'bot', 'sniper': 'sniper_bot', 'mtfa': 'ccxt_bot'}[strategy]
+        module = __import__(module)
+        client = FetchEngine(base_url=url, governor=governor)
+        universe = SymbolUniverse(*binance_sources(client), ranking_ttl=60 * 60)
+        data.update(fetch_engine=client, universe=universe)
+        if strategy == 'sniper':
+            await module.initialize_coin_info(universe)
+            scan = module.scan_for_pumps
+        else:
+            scan = module.scan_market
+    module.kline_cache = KlineCache()
+    if hasattr(module, 'TOP_PAIRS_LIMIT'):
+        module.TOP_PAIRS_LIMIT = size
+    context = SimpleNamespace(job=SimpleNamespace(data=data))
+
+    baseline_rss = _rss_bytes()
+    runs = {}
+    for phase in ('cold', 'warm'):
+        _http(f"{url}/__reset", "POST")
+        dispatcher.messages = 0
+        start = time.perf_counter()
+        await scan(context)
+        elapsed = time.perf_counter() - start
+        stats = _http(f"{url}/__stats")
+        runs[phase] = {'cycle_seconds': round(elapsed, 4), 'requests': stats.get('requests', 0),
+                       'errors': stats.get('5xx', 0) + stats.get('429', 0), 'signals': dispatcher.messages}
+    await client.close()
+    peak = max(0, _peak_rss_bytes() - baseline_rss)
+    for run in runs.values():
+        run['peak_mb'] = round(peak / 2**20, 1)
+    return runs
+
+
+def run_child(strategy, size, url, db_path):
+    env = dict(os.environ, POSITION_DB_PATH=db_path, PYTHONPATH=HERE)
+    out = subprocess.run([sys.executable, __file__, "--child", strategy, str(size), url],
+                         env=env, capture_output=True, text=True, cwd=tempfile.gettempdir())
+    if out.returncode != 0:
+        raise RuntimeError(f"{strategy}@{size} فشل:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def start_simulator(size, latency, error_rate):
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "exchange_simulator.py"), "--port", str(port),
+                                "--symbols", str(size), "--latency", str(latency), "--error-rate", str(error_rate),
+                                "--weight-limit", str(UNLIMITED), "--bingx-limit", str(UNLIMITED)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=HERE)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            _http(f"{url}/__stats")
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("المحاكي لم يبدأ")
+
+
+def compare(results, baseline, tolerance):
+    """يُرجع قائمة التراجعات مقارنة بنتائج سابقة محفوظة بـ --json."""
+    regressions = []
+    for key, runs in results.items():
+        for phase, run in runs.items():
+            old = baseline.get(key, {}).get(phase)
+            if not old:
+                continue
+            for metric in ('cycle_seconds', 'requests', 'peak_mb'):
+                # هامش مطلق صغير حتى لا تُحسب ضوضاء القياسات الصغيرة تراجعاً
+                slack = {'cycle_seconds': 0.05, 'requests': 0, 'peak_mb': 2.0}[metric]
+                if run[metric] > old[metric] * (1 + tolerance) + slack:
+                    regressions.append(f"{key} {phase} {metric}: {old[metric]} ← {run[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس جولات الفحص على المحاكي المحلي")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--strategies', default=",".join(STRATEGIES))
+    parser.add_argument('--latency', type=float, default=0.0, help="تأخير المحاكي لكل طلب (ثوان)")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--json', help="حفظ النتائج لاستخدامها كخط أساس لاحقاً")
+    parser.add_argument('--baseline', help="ملف نتائج سابق: الخروج برمز 1 عند أي تراجع")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    strategies = [s for s in args.strategies.split(",") if s]
+    db_dir = tempfile.mkdtemp(prefix="falcon_bench_")
+    results = {}
+    print(f"{'الاستراتيجية':<10} {'العملات':>7} {'المرحلة':>6} {'الزمن ث':>9} {'الطلبات':>8} "
+          f"{'أخطاء':>6} {'إشارات':>7} {'ذروة MB':>8}")
+    for size in sizes:
+        process, url = start_simulator(size, args.latency, args.error_rate)
+        try:
+            for strategy in strategies:
+                runs = run_child(strategy, size, url, os.path.join(db_dir, f"{strategy}_{size}.db"))
+                results[f"{strategy}@{size}"] = runs
+                for phase, run in runs.items():
+                    print(f"{strategy:<10} {size:>7} {phase:>6} {run['cycle_seconds']:>9.3f} {run['requests']:>8} "
+                          f"{run['errors']:>6} {run['signals']:>7} {run['peak_mb']:>8.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"تراجع: {line}")
+        if regressions:
+            raise SystemExit(1)
+        print("لا تراجع مقارنة بخط الأساس")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        import logging
+        logging.basicConfig(level=logging.ERROR)
+        strategy, size, url = sys.argv[2], int(sys.argv[3]), sys.argv[4]
+        print(json.dumps(asyncio.run(_run_child(strategy, size, url))))
+    else:
+        main()
@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------------
+# scheduler.py - جدولة جولات الفحص بعد إغلاق الشمعة مع حماية من تداخل الجولات
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import zlib
+import logging
+import functools
+from datetime import datetime, timezone
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+CLOSE_OFFSET_SECONDS = float(os.environ.get("SCAN_CLOSE_OFFSET_SECONDS", 5))   # مهلة حتى تُثبّت المنصة الشمعة
+SCAN_BATCHES = int(os.environ.get("SCAN_BATCHES", 1))
+BATCH_SPREAD = 0.5    # الدفعات تتوزع على أول نصف الفترة حتى تبقى الإشارات حديثة
+SKIP, MERGE = 'skip', 'merge'
+OVERRUN_POLICY = os.environ.get("SCAN_OVERRUN", SKIP)
+SCAN_ON_START = os.environ.get("SCAN_ON_START", "0") == "1"   # جولة فورية عند التشغيل قبل أول إغلاق
+_symbol_filter = None   # مع التقسيم (sharding.py): العملات التي تملكها هذه العملية فقط
+_filter_listeners = []  # دوال async تُستدعى عند تغير ما تملكه العملية (إعادة الاشتراك في البث)
+
+
+def next_close(interval_seconds, offset=0.0, now=None):
+    """أول لحظة (epoch) بعد now تساوي حد فترة الشمعة + offset. الشموع تبدأ من epoch بتوقيت UTC."""
+    now = time.time() if now is None else now
+    return ((now - offset) // interval_seconds + 1) * interval_seconds + offset
+
+
+def batch_of(symbol, batches):
+    # تجزئة ثابتة: العملة نفسها في الدفعة نفسها في كل جولة حتى تبقى ذاكرة الشموع مفيدة
+    return zlib.crc32(symbol.encode()) % batches
+
+
+def set_symbol_filter(func):
+    """func(symbols) -> العملات التي تفحصها هذه العملية؛ None يعيد فحص الكون كاملاً."""
+    global _symbol_filter
+    _symbol_filter = func
+
+
+def filter_symbols(symbols):
+    """العملات التي تفحصها هذه العملية من symbols (كلها دون تقسيم)."""
+    return _symbol_filter(symbols) if _symbol_filter is not None else list(symbols)
+
+
+def owns_symbol(symbol):
+    """فحص قبل التصرف في عملة وصل حدثها من البث: الشظايا قد تنتقل بعد الاشتراك."""
+    return _symbol_filter is None or bool(_symbol_filter([symbol]))
+
+
+def on_symbol_filter_change(callback):
+    """يسجل callback() وتُرجع دالة إلغاء التسجيل (عند إيقاف الخدمة)."""
+    _filter_listeners.append(callback)
+    return lambda: _filter_listeners.remove(callback)
+
+
+async def symbol_filter_changed():
+    for callback in list(_filter_listeners):
+        await callback()
+
+
+def select_batch(symbols, context):
+    """يُرجع عملات دفعة هذه المهمة فقط (أو الكل إن لم تُقسَّم الجولة)، ضمن شظايا العملية إن وُجدت."""
+    symbols = filter_symbols(symbols)
+    index, count = context.job.data.get('batch', (0, 1))
+    if count <= 1:
+        return symbols
+    return [s for s in symbols if batch_of(s, count) == index]
+
+
+class CycleGuard:
+    """
+    يغلّف مهمة الفحص: إن حان موعد الجولة والسابقة لم تنته بعد تُتخطى (skip)
+    أو تُدمج في جولة واحدة تبدأ فور انتهاء الحالية (merge)، ويُسجَّل التأخر في المقاييس.
+    """
+
+    def __init__(self, bot, interval_seconds, delay=0.0, overrun=OVERRUN_POLICY):
+        self.bot = bot
+        self.interval_seconds = interval_seconds
+        self.delay = delay
+        self.overrun = overrun
+        self.running_since = None
+        self.pending = None
+        self.skipped = 0
+
+    def slot_lag(self, now=None):
+        """التأخر عن الموعد المجدول لآخر فترة (إغلاق الشمعة + المهلة)."""
+        now = time.time() if now is None else now
+        return now - (next_close(self.interval_seconds, self.delay, now) - self.interval_seconds)
+
+    def wrap(self, callback):
+        @functools.wraps(callback)
+        async def job(context):
+            if self.running_since is not None:
+                running = time.monotonic() - self.running_since
+                self.skipped += 1
+                METRICS.count_overrun(self.bot)
+                if self.overrun == MERGE:
+                    self.pending = context
+                    action = "ستُدمج في جولة تبدأ فور انتهائها"
+                else:
+                    action = "تم تخطي هذه الجولة"
+                logger.warning(f"[Scheduler] {self.bot}: الجولة السابقة مستمرة منذ {running:.0f} ث، {action}")
+                return
+            try:
+                while context is not None:
+                    self.running_since = time.monotonic()
+                    METRICS.observe_phase(self.bot, 'schedule_lag', self.slot_lag())
+                    await callback(context)
+                    context, self.pending = self.pending, None
+            finally:
+                self.running_since = None
+        return job
+
+
+def schedule_aligned(job_queue, callback, interval_seconds, data, bot, offset=CLOSE_OFFSET_SECONDS,
+                     batches=SCAN_BATCHES, overrun=OVERRUN_POLICY, on_start=SCAN_ON_START):
+    """
+    بديل run_repeating(first=10): تنطلق الجولة بعد إغلاق كل شمعة بـ offset ثانية.
+    مع batches > 1 يُقسَّم الكون إلى دفعات ثابتة تنطلق متتابعة خلال أول نصف الفترة
+    لتخفيف ذروة الطلبات، وتقرأ كل دفعة رقمها من job.data['batch'] عبر select_batch.
+    on_start يضيف جولة لكل دفعة فور التشغيل عبر نفس CycleGuard فلا تتداخل مع الجولة المجدولة.
+    """
+    jobs = []
+    for index in range(batches):
+        delay = offset + index * interval_seconds * BATCH_SPREAD / batches
+        guard = CycleGuard(bot, interval_seconds, delay, overrun)
+        first = datetime.fromtimestamp(next_close(interval_seconds, delay), tz=timezone.utc)
+        job_data = dict(data, batch=(index, batches)) if batches > 1 else data
+        # max_instances=2 حتى يصل الاستدعاء المتداخل إلى CycleGuard بدل أن يتخطاه APScheduler بصمت
+        jobs.append(job_queue.run_repeating(
+            guard.wrap(callback), interval=interval_seconds, first=first, data=job_data,
+            name=f"{bot}:{index}", job_kwargs={'max_instances': 2, 'coalesce': True,
+                                                'misfire_grace_time': int(interval_seconds // 2)}))
+        if on_start:
+            job_queue.run_once(guard.wrap(callback), 0, data=job_data, name=f"{bot}:{index}:start")
+        logger.info(f"[Scheduler] {bot}: الدفعة {index + 1}/{batches} تبدأ {first:%H:%M:%S} UTC ثم كل {interval_seconds:.0f} ث")
+    return jobs
@@ -0,0 +1,572 @@
+# -----------------------------------------------------------------------------
+# sharding.py - توزيع كون العملات على عدة عمليات: شظايا بتجزئة متسقة، عقود إيجار في SQLite، وصندوق إشارات واحد
+# -----------------------------------------------------------------------------
+#   SHARD_ROLE=coordinator python runtime.py     # يفحص شظاياه + يستقبل أوامر تيليجرام ويرسل الإشارات
+#   SHARD_ROLE=worker python runtime.py          # يفحص شظاياه ويكتب إشاراته في outbox فقط (بلا getUpdates)
+#   python sharding.py status | bench
+# كل العمليات تشترك في ملف SHARD_DB_PATH. العملة -> شظية ثابتة (crc32)، والشظية -> عامل حي عبر
+# حلقة تجزئة متسقة، فانضمام عامل أو موته ينقل حصته فقط. الملكية عقد إيجار يجدده النبض،
+# وعند موت العامل ينتهي عقده خلال SHARD_LEASE_SECONDS وتأخذ البقية شظاياه.
+
+import os
+import json
+import time
+import socket
+import bisect
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import threading
+from scheduler import batch_of, set_symbol_filter, symbol_filter_changed
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+SHARD_ROLE = os.environ.get("SHARD_ROLE", "")   # فارغ: عملية واحدة كما في السابق
+SHARD_DB_PATH = os.environ.get("SHARD_DB_PATH", "shards.db")
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 256))
+SHARD_LEASE_SECONDS = float(os.environ.get("SHARD_LEASE_SECONDS", 30))
+VIRTUAL_NODES = 128          # نقاط كل عامل على الحلقة (توازن الحصص)
+DEDUP_WINDOW_SECONDS = float(os.environ.get("SIGNAL_DEDUP_SECONDS", 15 * 60))
+OUTBOX_FLUSH_SECONDS = 0.2
+RELAY_POLL_SECONDS = 0.5
+OUTBOX_RETENTION_SECONDS = 24 * 60 * 60
+DEAD_WORKER_SECONDS = 24 * 60 * 60
+COORDINATOR, WORKER = 'coordinator', 'worker'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY, host TEXT, pid INTEGER, started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS leases (
+    shard INTEGER PRIMARY KEY, worker TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY, digest TEXT NOT NULL, worker TEXT, chat_id TEXT NOT NULL,
+    text TEXT NOT NULL, options TEXT NOT NULL, created_at REAL NOT NULL, sent_at REAL);
+CREATE INDEX IF NOT EXISTS outbox_digest ON outbox (digest, created_at);
+CREATE INDEX IF NOT EXISTS outbox_unsent ON outbox (id) WHERE sent_at IS NULL;
+"""
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def shard_of(symbol, shards=SHARD_COUNT):
+    """نفس تجزئة دفعات الجدولة: العملة في نفس الشظية دائماً فتبقى ذاكرة شموعها في عملية واحدة."""
+    return batch_of(symbol, shards)
+
+
+class HashRing:
+    """حلقة تجزئة متسقة: كل عامل VIRTUAL_NODES نقطة، والشظية لأول نقطة بعد تجزئتها."""
+
+    __slots__ = ('keys', 'nodes')
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self.keys = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def owner(self, key):
+        if not self.keys:
+            return None
+        return self.nodes[bisect.bisect(self.keys, _hash(key)) % len(self.keys)]
+
+    def assign(self, shards):
+        return {shard: self.owner(f"shard-{shard}") for shard in range(shards)}
+
+
+class ShardStore:
+    """
+    ملف SQLite (WAL) مشترك بين عمليات نفس المضيف: العمال ونبضهم، عقود الشظايا، و outbox.
+    كل عملية كتابة معاملة BEGIN IMMEDIATE قصيرة، فلا يرى عاملان نفس الشظية حرة في آن واحد.
+    """
+
+    def __init__(self, path=SHARD_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # --- العمال والعقود ---
+    def heartbeat(self, worker, now):
+        host, _, pid = worker.rpartition(':')
+
+        def run():
+            self.conn.execute(
+                "INSERT INTO workers (worker, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker, host, int(pid) if pid.isdigit() else None, now, now))
+            # عمال ماتوا منذ زمن (كل إعادة تشغيل تأتي بمعرف جديد)
+            self.conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - DEAD_WORKER_SECONDS,))
+        self._transaction(run)
+
+    def live_workers(self, since):
+        return [w for (w,) in self._query("SELECT worker FROM workers WHERE heartbeat_at >= ? ORDER BY worker",
+                                          (since,))]
+
+    def claim(self, worker, shards, now, lease_seconds):
+        """يجدد عقود worker ويأخذ المنتهية منها ضمن shards؛ تُرجع كل ما يملكه الآن."""
+        def run():
+            self.conn.executemany(
+                "INSERT INTO leases (shard, worker, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (shard) DO UPDATE SET worker = excluded.worker, expires_at = excluded.expires_at "
+                "WHERE leases.worker = excluded.worker OR leases.expires_at < ?",
+                [(shard, worker, now + lease_seconds, now) for shard in shards])
+            return {s for (s,) in self.conn.execute(
+                "SELECT shard FROM leases WHERE worker = ? AND expires_at >= ?", (worker, now))}
+        return self._transaction(run)
+
+    def release(self, worker, shards):
+        """إنهاء فوري حتى يأخذها المالك الجديد في نبضه التالي بدل انتظار انتهاء العقد."""
+        self._transaction(lambda: self.conn.executemany(
+            "UPDATE leases SET expires_at = 0 WHERE shard = ? AND worker = ?", [(s, worker) for s in shards]))
+
+    def leave(self, worker):
+        def run():
+            self.conn.execute("UPDATE leases SET expires_at = 0 WHERE worker = ?", (worker,))
+            self.conn.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+        self._transaction(run)
+
+    def leases(self, now):
+        """{الشظية: العامل} للعقود السارية فقط."""
+        return dict(self._query("SELECT shard, worker FROM leases WHERE expires_at >= ?", (now,)))
+
+    # --- outbox ---
+    def add_messages(self, worker, messages, window):
+        """
+        messages: [(chat_id, text, options_json, created_at)]. الرسالة نفسها لنفس المحادثة خلال
+        window ثانية من عامل آخر (انتقال شظية أثناء الجولة) تُسقط؛ تكرار العامل نفسه لإشارته يُكتب
+        كما في العملية الواحدة. تُرجع عدد المكتوب فعلاً.
+        """
+        def run():
+            written = 0
+            for chat_id, text, options, created_at in messages:
+                digest = hashlib.blake2b(f"{chat_id}\0{text}".encode(), digest_size=16).hexdigest()
+                if self.conn.execute("SELECT 1 FROM outbox WHERE digest = ? AND created_at > ? AND worker != ? "
+                                     "LIMIT 1", (digest, created_at - window, worker)).fetchone():
+                    continue
+                self.conn.execute("INSERT INTO outbox (digest, worker, chat_id, text, options, created_at) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)", (digest, worker, chat_id, text, options, created_at))
+                written += 1
+            return written
+        return self._transaction(run)
+
+    def unsent(self, limit=500):
+        return self._query("SELECT id, chat_id, text, options FROM outbox WHERE sent_at IS NULL "
+                           "ORDER BY id LIMIT ?", (limit,))
+
+    def mark_sent(self, ids, now):
+        self._transaction(lambda: self.conn.executemany(
+            "UPDATE outbox SET sent_at = ? WHERE id = ?", [(now, i) for i in ids]))
+
+    def prune(self, before):
+        self._transaction(lambda: self.conn.execute(
+            "DELETE FROM outbox WHERE sent_at IS NOT NULL AND created_at < ?", (before,)))
+
+    def status(self, now, lease_seconds=SHARD_LEASE_SECONDS):
+        leases = self.leases(now)
+        owned = {}
+        for worker in leases.values():
+            owned[worker] = owned.get(worker, 0) + 1
+        workers = self._query("SELECT worker, heartbeat_at FROM workers ORDER BY worker")
+        backlog = self._query("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL")[0][0]
+        return {'workers': {w: {'shards': owned.get(w, 0), 'heartbeat_age': round(now - at, 1),
+                                'alive': now - at <= lease_seconds} for w, at in workers},
+                'leased': len(leases), 'outbox_backlog': backlog}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class ShardWorker:
+    """
+    عضوية عملية واحدة: نبض كل ثلث مدة العقد، حساب حصتها من حلقة العمال الأحياء،
+    ترك ما لم يعد لها ثم أخذ ما أصبح لها. owns/filter تُقرأ من الذاكرة دون أي وصول للقرص،
+    ولا تُرجع شيئاً بعد انتهاء آخر عقد جُدِّد: عقدة توقف نبضها لا تفحص شظايا ربما أخذها غيرها.
+    before_release() تُستدعى قبل التخلي عن شظايا (لكتابة ما يخصها)، و on_change(owned) (async)
+    بعد كل تغيير، ويُعاد استدعاؤها في النبض التالي إن فشلت.
+    """
+
+    def __init__(self, store, worker_id=None, shards=SHARD_COUNT, lease_seconds=SHARD_LEASE_SECONDS,
+                 before_release=None, on_change=None):
+        self.store = store
+        self.worker_id = worker_id or os.environ.get("SHARD_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.before_release = before_release
+        self.on_change = on_change
+        self.owned = frozenset()
+        self.desired = frozenset()
+        self.expires_at = 0.0   # نهاية آخر عقد جُدِّد (بساعة هذه العملية)
+        self.live = []
+        self.rebalances = 0
+        self._applied = None    # آخر owned مُرِّرت إلى on_change بنجاح
+        self._task = None
+
+    def _current(self):
+        return self.owned if time.time() < self.expires_at else frozenset()
+
+    def owns(self, symbol):
+        return shard_of(symbol, self.shards) in self._current()
+
+    def filter(self, symbols):
+        owned = self._current()
+        return [s for s in symbols if shard_of(s, self.shards) in owned]
+
+    def rebalance(self, now=None):
+        """خطوة واحدة متزامنة (تُشغَّل في خيط)؛ تُرجع True إن تغيرت الشظايا المملوكة."""
+        now = time.time() if now is None else now
+        self.store.heartbeat(self.worker_id, now)
+        self.live = self.store.live_workers(now - self.lease_seconds)
+        assignment = HashRing(self.live).assign(self.shards)
+        self.desired = frozenset(s for s, w in assignment.items() if w == self.worker_id)
+        released = self.owned - self.desired
+        if released:
+            if self.before_release is not None:
+                self.before_release()
+            self.store.release(self.worker_id, released)
+        owned = frozenset(self.store.claim(self.worker_id, self.desired, now, self.lease_seconds))
+        self.expires_at = now + self.lease_seconds
+        changed = owned != self.owned
+        if changed:
+            self.rebalances += 1
+            gained, lost = len(owned - self.owned), len(self.owned - owned)
+            logger.info(f"[Shards] {self.worker_id}: {len(owned)}/{self.shards} شظية "
+                        f"(+{gained} -{lost}) بين {len(self.live)} عامل")
+        self.owned = owned
+        return changed
+
+    async def _apply(self):
+        owned = self.owned
+        if self.on_change is not None and owned != self._applied:
+            try:
+                await self.on_change(owned)
+            except Exception as e:
+                logger.error(f"[Shards] {self.worker_id}: فشل تطبيق تغيير الشظايا (يُعاد في النبض التالي): {e}")
+                return
+        self._applied = owned
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.rebalance)
+            except sqlite3.Error as e:
+                # لا يُتخلى عن الشظايا هنا: إن طال الخطأ ينتهي العقد فتتوقف owns/filter وتأخذها البقية
+                logger.error(f"[Shards] {self.worker_id}: فشل النبض: {e}")
+                continue
+            except Exception as e:
+                logger.error(f"[Shards] {self.worker_id}: خطأ غير متوقع في النبض: {e}")
+                continue
+            await self._apply()
+
+    async def start(self):
+        """خدمة Runtime: نبض دوري، ومغادرة نظيفة (تحرير فوري للشظايا) عند الإيقاف."""
+        await asyncio.to_thread(self.rebalance)
+        await self._apply()
+        self._task = asyncio.create_task(self.run())
+
+        async def stop():
+            self._task.cancel()
+            if self.before_release is not None:
+                await asyncio.to_thread(self.before_release)
+            await asyncio.to_thread(self.store.leave, self.worker_id)
+            self.owned = frozenset()
+            self.expires_at = 0.0
+        return stop
+
+    def status(self):
+        return {'worker': self.worker_id, 'shards': len(self.owned), 'desired': len(self.desired),
+                'live_workers': len(self.live), 'rebalances': self.rebalances}
+
+
+class SignalOutbox:
+    """
+    يأخذ مكان TelegramDispatcher في العمال (نفس enqueue): الرسائل تُجمع وتُكتب في outbox
+    كل OUTBOX_FLUSH_SECONDS من خيط، ويُسقط ما أرسله عامل آخر للتو عند الكتابة.
+    """
+
+    def __init__(self, store, worker_id, window=DEDUP_WINDOW_SECONDS, flush_seconds=OUTBOX_FLUSH_SECONDS):
+        self.store = store
+        self.worker_id = worker_id
+        self.window = window
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._task = None
+        self.enqueued = 0
+        self.written = 0
+
+    def enqueue(self, chat_id, text, parse_mode=None, **kwargs):
+        self.enqueued += 1
+        self._pending.append((str(chat_id), text, json.dumps(dict(kwargs, parse_mode=parse_mode)), time.time()))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"[Outbox] فشل حفظ الإشارات: {e}")
+
+    async def flush(self):
+        batch, self._pending = self._pending, []
+        if batch:
+            try:
+                self.written += await asyncio.to_thread(self.store.add_messages, self.worker_id, batch, self.window)
+            except BaseException:
+                self._pending[:0] = batch
+                raise
+
+    async def stop(self, drain_timeout=5.0):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.wait_for(self.flush(), drain_timeout)
+
+
+class OutboxRelay:
+    """في المنسق فقط: ينقل outbox بالترتيب إلى TelegramDispatcher (حدود المعدل والدمج كما هي)."""
+
+    def __init__(self, store, dispatcher, poll=RELAY_POLL_SECONDS, retention=OUTBOX_RETENTION_SECONDS):
+        self.store = store
+        self.dispatcher = dispatcher
+        self.poll = poll
+        self.retention = retention
+        self.relayed = 0
+        self._task = None
+
+    async def relay_once(self):
+        rows = await asyncio.to_thread(self.store.unsent)
+        for _, chat_id, text, options in rows:
+            options = json.loads(options)
+            self.dispatcher.enqueue(chat_id, text, options.pop('parse_mode', None), **options)
+        if rows:
+            await asyncio.to_thread(self.store.mark_sent, [row[0] for row in rows], time.time())
+            self.relayed += len(rows)
+        return len(rows)
+
+    async def run(self):
+        pruned_at = 0.0
+        while True:
+            try:
+                await self.relay_once()
+                if time.monotonic() - pruned_at > 60 * 60:
+                    await asyncio.to_thread(self.store.prune, time.time() - self.retention)
+                    pruned_at = time.monotonic()
+            except sqlite3.Error as e:
+                logger.error(f"[Outbox] فشل قراءة الإشارات: {e}")
+            await asyncio.sleep(self.poll)
+
+    async def start(self):
+        self.dispatcher.start()
+        self._task = asyncio.create_task(self.run())
+
+        async def stop():
+            self._task.cancel()
+            await self.relay_once()
+            await self.dispatcher.stop()
+        return stop
+
+
+def attach(runtime, role=SHARD_ROLE, path=SHARD_DB_PATH):
+    """
+    يجعل Runtime عقدة في التقسيم، ويُستدعى قبل runtime.load حتى تأخذ الاستراتيجيات المرسل الجديد.
+    كل عقدة تفحص شظاياها فقط (select_batch، واشتراكات البث عبر filter_symbols) وتكتب إشاراتها في outbox؛ المنسق وحده
+    يستقبل تحديثات تيليجرام وينقل outbox، والعامل يعمل بلا getUpdates (runtime.headless).
+    """
+    from position_store import get_store, open_books
+    if role not in (COORDINATOR, WORKER):
+        raise ValueError(f"SHARD_ROLE غير معروف: {role!r}")
+    store = ShardStore(path)
+
+    def flush_positions():
+        # ما كُتب عن شظية يجب أن يكون في الملف قبل أن يقرأه مالكها الجديد
+        get_store().flush()
+
+    def reload_positions():
+        for book in open_books():
+            book.reload(keep=worker.owns)
+
+    async def on_change(owned):
+        # قراءة الملف (بعد كتابة المعلّق) في خيط، ثم نقل اشتراكات البث إلى الشظايا الجديدة
+        await asyncio.to_thread(reload_positions)
+        await symbol_filter_changed()
+
+    worker = ShardWorker(store, before_release=flush_positions, on_change=on_change)
+    # الانضمام قبل أول جولة (SCAN_ON_START تنطلق قبل اكتمال التهيئة)، مع انتظار حتى مدة عقد
+    # واحد ليتخلى الآخرون عن حصة هذه العملية في نبضهم التالي
+    worker.rebalance()
+    deadline = time.monotonic() + worker.lease_seconds
+    while worker.owned != worker.desired and time.monotonic() < deadline:
+        time.sleep(worker.lease_seconds / 12)
+        worker.rebalance()
+    set_symbol_filter(worker.filter)
+    runtime.dispatcher = SignalOutbox(store, worker.worker_id)
+    runtime.shards = worker
+    runtime.add_service(worker.start)
+    if role == COORDINATOR:
+        from telegram_dispatcher import TelegramDispatcher
+        runtime.add_service(OutboxRelay(store, TelegramDispatcher(runtime.application.bot)).start)
+    else:
+        runtime.headless = True
+    logger.info(f"[Shards] {worker.worker_id} ({role}): {len(worker.owned)}/{worker.shards} شظية عند الانضمام")
+    return worker
+
+
+# --- قياس التوسع وإعادة التوزيع على المحاكي المحلي ---
+async def _settle(worker, expected):
+    """ينتظر حتى يرى كل العمال المتوقعين ويملك حصته كاملة وتكون كل الشظايا مؤجرة."""
+    while True:
+        await asyncio.to_thread(worker.rebalance)
+        if (len(worker.live) == expected and worker.owned == worker.desired
+                and len(worker.store.leases(time.time())) == worker.shards):
+            return
+        await asyncio.sleep(worker.lease_seconds / 6)
+
+
+async def _bench_worker(db, url, size, expected, lease, serve):
+    from types import SimpleNamespace
+    from scan_bench import UNLIMITED
+    from fetch_engine import FetchEngine
+    from weight_governor import WeightGovernor
+    from symbol_universe import SymbolUniverse, binance_sources
+    store = ShardStore(db)
+    worker = ShardWorker(store, lease_seconds=lease)
+    if serve:
+        while True:
+            await asyncio.to_thread(worker.rebalance)
+            await asyncio.sleep(lease / 3)
+    import sniper_bot
+    set_symbol_filter(worker.filter)
+    await _settle(worker, expected)
+    # عقد كل عملية مستقل كما لو كانت على مضيف بعنوان IP خاص
+    engine = FetchEngine(base_url=url, governor=WeightGovernor('bench', limit=UNLIMITED, weight_header=None))
+    await sniper_bot.initialize_coin_info(SymbolUniverse(*binance_sources(engine)))
+    outbox = SignalOutbox(store, worker.worker_id)
+    context = SimpleNamespace(job=SimpleNamespace(data={'fetch_engine': engine, 'dispatcher': outbox, 'chat_id': 0}))
+    start = time.perf_counter()
+    await sniper_bot.scan_for_pumps(context)
+    elapsed = time.perf_counter() - start
+    outbox.enqueue(0, "bench: نفس الرسالة من كل العمال")
+    await outbox.stop()
+    await engine.close()
+    symbols = worker.filter([f"SIM{i:04d}USDT" for i in range(size)])
+    print(json.dumps({'worker': worker.worker_id, 'symbols': symbols, 'seconds': elapsed,
+                      'signals': outbox.enqueued, 'written': outbox.written}))
+
+
+def _bench(counts, size, latency, lease):
+    import sys
+    import signal
+    import tempfile
+    import subprocess
+    from scan_bench import HERE, start_simulator
+    process, url = start_simulator(size, latency, 0.0)
+
+    def spawn(db, expected, serve=False):
+        env = dict(os.environ, PYTHONPATH=HERE, POSITION_DB_PATH=os.path.join(os.path.dirname(db), "positions.db"))
+        args = [sys.executable, os.path.abspath(__file__), "bench-worker", db, url, str(size), str(expected),
+                str(lease)] + (["--serve"] if serve else [])
+        return subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                cwd=tempfile.gettempdir())
+
+    try:
+        print(f"{size} عملة، تأخير {latency * 1000:.0f} ms لكل طلب، {SHARD_COUNT} شظية")
+        print(f"{'العمال':>6} {'زمن الجولة ث':>12} {'عملة/ث':>8} {'التسريع':>8} {'أكبر حصة':>9} {'الإشارات':>9} {'outbox':>7}")
+        baseline = None
+        for count in counts:
+            db = os.path.join(tempfile.mkdtemp(prefix="falcon_shards_"), "shards.db")
+            children = [spawn(db, count) for _ in range(count)]
+            results = []
+            for child in children:
+                out, err = child.communicate(timeout=300)
+                if child.returncode != 0:
+                    raise RuntimeError(f"عامل فشل:\n{err[-2000:]}")
+                results.append(json.loads(out.strip().splitlines()[-1]))
+            covered = [s for r in results for s in r['symbols']]
+            assert len(covered) == len(set(covered)) == size, "عملات مكررة أو مفقودة بين العمال"
+            wall = max(r['seconds'] for r in results)
+            baseline = baseline or wall
+            store = ShardStore(db)
+            rows = store._query("SELECT COUNT(*), COUNT(DISTINCT digest) FROM outbox")[0]
+            assert rows[0] == rows[1]
+            print(f"{count:>6} {wall:>12.2f} {size / wall:>8.0f} {baseline / wall:>7.2f}x "
+                  f"{max(len(r['symbols']) for r in results) / (size / count):>8.2f}x "
+                  f"{sum(r['signals'] for r in results):>9} {rows[0]:>7}")
+
+        # موت عامل: كم يلزم حتى تعود كل الشظايا مؤجرة لعمال أحياء
+        count = max(max(counts), 2)
+        db = os.path.join(tempfile.mkdtemp(prefix="falcon_shards_"), "shards.db")
+        children = [spawn(db, count, serve=True) for _ in range(count)]
+        store = ShardStore(db)
+        try:
+            while len(set(store.leases(time.time()).values())) < count or len(store.leases(time.time())) < SHARD_COUNT:
+                time.sleep(0.05)
+            victim = children[0]
+            victim.send_signal(signal.SIGKILL)
+            victim.wait()
+            dead = next(w for w in store.live_workers(0) if w.endswith(f":{victim.pid}"))
+            killed = time.time()
+            while True:
+                leases = store.leases(time.time())
+                if len(leases) == SHARD_COUNT and dead not in leases.values():
+                    break
+                time.sleep(0.05)
+            print(f"\nموت عامل من {count} (عقد {lease:.0f} ث): كل الشظايا عادت لعمال أحياء بعد "
+                  f"{time.time() - killed:.1f} ث، {len(set(leases.values()))} عامل يملكها")
+        finally:
+            for child in children:
+                child.kill()
+                child.wait()
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    if sys.argv[1:2] == ["bench-worker"]:
+        db, url, size, expected, lease = sys.argv[2:7]
+        asyncio.run(_bench_worker(db, url, int(size), int(expected), float(lease), "--serve" in sys.argv))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="حالة التقسيم وقياس التوسع")
+    sub = parser.add_subparsers(dest='command', required=True)
+    status = sub.add_parser('status', help="العمال وحصصهم وما ينتظر الإرسال")
+    status.add_argument('--db', default=SHARD_DB_PATH)
+    bench = sub.add_parser('bench', help="زمن جولة sniper كاملة مع 1..N عامل، وزمن إعادة التوزيع عند موت عامل")
+    bench.add_argument('--workers', default="1,2,4")
+    bench.add_argument('--symbols', type=int, default=1000)
+    bench.add_argument('--latency', type=float, default=0.05)
+    bench.add_argument('--lease', type=float, default=3.0)
+    args = parser.parse_args()
+    if args.command == 'status':
+        print(json.dumps(ShardStore(args.db).status(time.time()), ensure_ascii=False, indent=2))
+    else:
+        _bench([int(n) for n in args.workers.split(",")], args.symbols, args.latency, args.lease)
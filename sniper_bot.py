@@ -5,32 +5,46 @@
 import os
 import logging
 import asyncio
-from threading import Thread
-from flask import Flask
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-from binance.client import Client
-import pandas as pd
-import numpy as np
+from fetch_engine import FetchEngine
+from kline_stream import KlineStreamEngine
+from trade_burst import BurstDetector, TradeBurstEngine
+from kline_cache import KlineCache
+from kline_parser import closed_rows, parse_klines
+from pump_screener import screen_klines
+from position_monitor import PositionMonitor
+from telegram_dispatcher import TelegramDispatcher
+from metrics import METRICS
+from health_server import HEALTH, READY, start_health_server
+from symbol_universe import SymbolUniverse, binance_sources
+from scheduler import schedule_aligned, select_batch, filter_symbols, owns_symbol, on_symbol_filter_change
+from position_store import open_book
+from market_snapshot import register_snapshot, register_commands, listed_in
 
 # --- إعدادات التسجيل وخادم الويب ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
-app = Flask(__name__)
-@app.route('/')
-def health_check():
-    return "Falcon Sniper Bot v1.5 is Running!", 200
 def run_server():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host='0.0.0.0', port=port)
+    # مكتبة قياسية فقط: المنفذ يُربط فوراً ويُبلغ /ready بالجاهزية بعد تهيئة الخدمات
+    start_health_server(int(os.environ.get("PORT", 10000)))
 
 # --- إعدادات الاستراتيجية ---
-TIME_INTERVAL = Client.KLINE_INTERVAL_5MINUTE
+BOT_NAME = "sniper"
+TIME_INTERVAL = "5m"
 VOLUME_THRESHOLD_MULTIPLIER = 10
 PRICE_CHANGE_THRESHOLD = 3.0
 SCAN_INTERVAL_SECONDS = 5 * 60
-bought_coins = {}
+POSITION_CHECK_SECONDS = float(os.environ.get("POSITION_CHECK_SECONDS", 1))
+KLINES_LIMIT = 51
+# stream: بث WebSocket لحظي | rest: الفحص الدوري القديم عبر REST
+SNIPER_MODE = os.environ.get("SNIPER_MODE", "stream")
+STREAM_INTRA_CANDLE = os.environ.get("STREAM_INTRA_CANDLE", "1") == "1"
+# رصد إضافي من بث الصفقات (aggTrade) خلال ثوان بدل انتظار حجم شمعة 5 دقائق كاملة
+TRADE_BURSTS = os.environ.get("SNIPER_TRADE_BURSTS", "0") == "1"
+bought_coins = open_book(BOT_NAME)   # الصفقات والأهداف محفوظة في SQLite: تُستعاد في main/register وتُستأنف مراقبتها
 coin_info_map = {} # قاموس لتخزين أسماء العملات
+kline_cache = KlineCache()
 
 # --- أمر /start ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -41,145 +55,284 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_html(message)
 
 # --- دوال التحليل ---
-def initialize_coin_info(client):
+async def initialize_coin_info(universe):
     """
-    تجلب معلومات كل العملات مرة واحدة عند بدء التشغيل
-    وتخزنها في قاموس للترجمة السريعة.
+    تملأ قاموس الأسماء من كون العملات المشترك (معلومات المنصة مخزنة بصلاحية TTL)
+    وتخزنها في قاموس للترجمة السريعة. الإدراجات الجديدة تُضاف عبر on_listing.
     """
-    global coin_info_map
     try:
         logger.info("[Sniper] جارٍ تهيئة قاموس أسماء العملات...")
-        exchange_info = client.get_exchange_info()
-        for s in exchange_info['symbols']:
-            if s['symbol'].endswith('USDT'):
-                coin_info_map[s['symbol']] = s['baseAsset']
+        trading = set(await universe.usdt_pairs())
+        base_assets = await universe.base_assets()
+        coin_info_map.clear()
+        coin_info_map.update({s: base for s, base in base_assets.items() if s in trading})
         logger.info(f"تم تهيئة القاموس بنجاح. تم العثور على {len(coin_info_map)} عملة.")
     except Exception as e:
+        METRICS.count_error('binance')
         logger.error(f"[Sniper] فشل كبير في تهيئة أسماء العملات: {e}")
 
-def get_all_usdt_pairs(client):
+def get_all_usdt_pairs():
     if not coin_info_map:
         return []
     return list(coin_info_map.keys())
 
-def analyze_for_explosion(client, symbol):
+def evaluate_explosion(klines):
+    # آخر صف هو الشمعة المُقيَّمة: في البث هي الشمعة التي وصل تحديثها (ومنها المتشكلة مع STREAM_INTRA_CANDLE)
     try:
-        klines = client.get_klines(symbol=symbol, interval=TIME_INTERVAL, limit=51)
         if len(klines) < 50: return 'HOLD', None
-        df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_av', 'trades', 'tb_base_av', 'tb_quote_av', 'ignore'])
-        df['close'] = pd.to_numeric(df['close']); df['open'] = pd.to_numeric(df['open']); df['volume'] = pd.to_numeric(df['volume'])
-        df_historical = df.iloc[:-1]; last_candle = df.iloc[-1]
-        average_volume = df_historical['volume'].mean()
+        k = parse_klines(klines)
+        average_volume = k.volume[:-1].mean()
         if average_volume == 0: return 'HOLD', None
-        volume_is_anomalous = last_candle['volume'] > (average_volume * VOLUME_THRESHOLD_MULTIPLIER)
-        price_change = ((last_candle['close'] / last_candle['open']) - 1) * 100
+        volume_is_anomalous = k.volume[-1] > (average_volume * VOLUME_THRESHOLD_MULTIPLIER)
+        price_change = ((k.close[-1] / k.open[-1]) - 1) * 100
         price_action_is_strong = price_change >= PRICE_CHANGE_THRESHOLD
         if volume_is_anomalous and price_action_is_strong:
-            return 'BUY', last_candle['close']
+            return 'BUY', float(k.close[-1])
     except Exception: pass
     return 'HOLD', None
 
+def analyze_many(klines_map):
+    # نفس الفحص المجمّع، مع تسجيل نسبة الحجم وتغير السعر لكل عملة في اللقطة.
+    # جولة REST تنطلق بعد الإغلاق بثوان: الحكم على الشمعة التي أُغلقت لا على المتشكلة شبه الفارغة
+    klines_map = {symbol: closed_rows(rows) for symbol, rows in klines_map.items()}
+    stats = {}
+    triggered = dict(screen_klines(klines_map, VOLUME_THRESHOLD_MULTIPLIER, PRICE_CHANGE_THRESHOLD, stats))
+    for symbol, (volume_ratio, price_change, close) in stats.items():
+        snapshot.note(symbol, close=close, VolX=volume_ratio, **{'Change%': price_change})
+    return {symbol: ('BUY', float(triggered[symbol])) if symbol in triggered else ('HOLD', None) for symbol in stats}
+
+# آخر القرارات والمؤشرات في الذاكرة لأوامر /status و /check و /positions
+snapshot = register_snapshot(BOT_NAME, TIME_INTERVAL, analyze_many, positions=bought_coins)
+
+def attach_snapshot(fetch_engine, universe):
+    snapshot.attach(lambda symbols: fetch_engine.klines_many(symbols, TIME_INTERVAL, KLINES_LIMIT, cache=kline_cache),
+                    listed_in(universe))
+
+async def open_position(dispatcher, chat_id, symbol, buy_price):
+    profit_target = buy_price * 1.15
+    stop_loss = buy_price * 0.95
+
+    bought_coins[symbol] = {
+        'buy_price': buy_price,
+        'profit_target': profit_target,
+        'stop_loss': stop_loss
+    }
+    bought_coins.record_signal(symbol, 'BUY', buy_price)
+
+    clear_name = coin_info_map.get(symbol, symbol)
+    trade_link = f"https://www.binance.com/en/trade/{clear_name}_USDT"
+
+    message = (f"🚀 *[Sniper] تم رصد انفجار سعري محتمل*\n\n"
+               f"• *الاسم:* *{clear_name}*\n"
+               f"• *الرمز:* `{symbol}`\n"
+               f"• *السعر الحالي:* `{buy_price}`\n"
+               f"• *الهدف:* `{profit_target:.4f}` `(+15%)`\n"
+               f"• *وقف الخسارة:* `{stop_loss:.4f}` `(-5%)`\n\n"
+               f"🔗 [رابط التداول المباشر]({trade_link})")
+    dispatcher.enqueue(chat_id, message, parse_mode='Markdown', disable_web_page_preview=True)
+
 # --- مهمة الفحص الدوري ---
+async def close_position(dispatcher, chat_id, symbol, targets, current_price, reason):
+    clear_name = coin_info_map.get(symbol, symbol)
+    if reason == 'target':
+        message = (f"🎯 *[Sniper] تم تحقيق الهدف ({clear_name})*\n\n"
+                   f"• *سعر الشراء:* `{targets['buy_price']}`\n"
+                   f"• *سعر البيع:* `{current_price}`\n"
+                   f"• *الربح:* `~15%`")
+    else:
+        message = (f"🛑 *[Sniper] تم تفعيل وقف الخسارة ({clear_name})*\n\n"
+                   f"• *سعر الشراء:* `{targets['buy_price']}`\n"
+                   f"• *سعر البيع:* `{current_price}`\n"
+                   f"• *الخسارة:* `~-5%`")
+    bought_coins.pop(symbol, None)
+    bought_coins.record_signal(symbol, 'SELL', current_price, reason)
+    dispatcher.enqueue(chat_id, message, parse_mode='Markdown')
+
+@METRICS.track_cycle(BOT_NAME, SCAN_INTERVAL_SECONDS)
 async def scan_for_pumps(context):
-    global bought_coins
     logger.info("--- [Sniper] بدء جولة البحث عن انفجارات سعرية (v1.5) ---")
-    client = context.job.data['binance_client']
     chat_id = context.job.data['chat_id']
 
-    for symbol, targets in list(bought_coins.items()):
-        try:
-            current_price = float(client.get_symbol_ticker(symbol=symbol)['price'])
-            clear_name = coin_info_map.get(symbol, symbol)
-            if current_price >= targets['profit_target']:
-                message = (f"🎯 *[Sniper] تم تحقيق الهدف ({clear_name})*\n\n"
-                           f"• *سعر الشراء:* `{targets['buy_price']}`\n"
-                           f"• *سعر البيع:* `{current_price}`\n"
-                           f"• *الربح:* `~15%`")
-                await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-                del bought_coins[symbol]
-            elif current_price <= targets['stop_loss']:
-                message = (f"🛑 *[Sniper] تم تفعيل وقف الخسارة ({clear_name})*\n\n"
-                           f"• *سعر الشراء:* `{targets['buy_price']}`\n"
-                           f"• *سعر البيع:* `{current_price}`\n"
-                           f"• *الخسارة:* `~-5%`")
-                await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-                del bought_coins[symbol]
-        except Exception as e:
-            logger.error(f"[Sniper] خطأ في التحقق من سعر {symbol}: {e}")
-        await asyncio.sleep(0.5)
-
-    symbols_to_scan = get_all_usdt_pairs(client)
-    for symbol in symbols_to_scan:
-        if symbol in bought_coins: continue
-        
-        status, price = analyze_for_explosion(client, symbol)
-        if status == 'BUY':
-            buy_price = price
-            profit_target = buy_price * 1.15
-            stop_loss = buy_price * 0.95
-            
-            bought_coins[symbol] = {
-                'buy_price': buy_price,
-                'profit_target': profit_target,
-                'stop_loss': stop_loss
-            }
-            
-            clear_name = coin_info_map.get(symbol, symbol)
-            trade_link = f"https://www.binance.com/en/trade/{clear_name}_USDT"
-
-            message = (f"🚀 *[Sniper] تم رصد انفجار سعري محتمل*\n\n"
-                       f"• *الاسم:* *{clear_name}*\n"
-                       f"• *الرمز:* `{symbol}`\n"
-                       f"• *السعر الحالي:* `{buy_price}`\n"
-                       f"• *الهدف:* `{profit_target:.4f}` `(+15%)`\n"
-                       f"• *وقف الخسارة:* `{stop_loss:.4f}` `(-5%)`\n\n"
-                       f"🔗 [رابط التداول المباشر]({trade_link})")
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id, 
-                    text=message, 
-                    parse_mode='Markdown',
-                    disable_web_page_preview=True
-                )
-            except Exception as e:
-                logger.error(f"فشل إرسال رسالة القنص: {e}")
-
-        await asyncio.sleep(0.2)
+    # بعد أول جولة لا يُطلب من REST إلا الشموع الأحدث من المخزنة في kline_cache
+    engine = context.job.data['fetch_engine']
+    symbols_to_scan = select_batch([s for s in get_all_usdt_pairs() if s not in bought_coins], context)
+    with METRICS.phase(BOT_NAME, 'kline_fetch'):
+        klines_map = await engine.klines_many(symbols_to_scan, TIME_INTERVAL, KLINES_LIMIT, cache=kline_cache)
+    # تمريرة NumPy واحدة لكل الكون بدلاً من DataFrame لكل عملة
+    with METRICS.phase(BOT_NAME, 'indicator_compute'):
+        signals = snapshot.record(analyze_many(klines_map))
+    for symbol, (status, price) in signals.items():
+        if status != 'BUY' or symbol in bought_coins: continue
+        await open_position(context.job.data['dispatcher'], chat_id, symbol, price)
 
     logger.info(f"--- [Sniper] انتهاء جولة الفحص. العملات المراقبة: {list(bought_coins.keys())} ---")
 
+# --- وضع البث اللحظي (WebSocket) ---
+def build_stream_engine(dispatcher, chat_id, fetch_engine):
+    async def backfill(symbols):
+        return await fetch_engine.klines_many(symbols, TIME_INTERVAL, KLINES_LIMIT)
+
+    async def on_candle(symbol, klines, is_closed):
+        if symbol in bought_coins or not owns_symbol(symbol): return
+        with METRICS.phase(BOT_NAME, 'stream_evaluate'):
+            status, price = evaluate_explosion(klines)
+        snapshot.note(symbol, close=float(klines[-1][4]))
+        snapshot.record({symbol: (status, price)})
+        if status == 'BUY':
+            await open_position(dispatcher, chat_id, symbol, price)
+
+    return KlineStreamEngine(filter_symbols(get_all_usdt_pairs()), TIME_INTERVAL, KLINES_LIMIT, on_candle,
+                             intra_candle=STREAM_INTRA_CANDLE, backfill=backfill)
+
+def build_burst_engine(dispatcher, chat_id):
+    async def on_burst(burst):
+        if burst.symbol in bought_coins or not owns_symbol(burst.symbol): return
+        logger.info(f"[Sniper] انفجار من بث الصفقات: {burst}")
+        await open_position(dispatcher, chat_id, burst.symbol, burst.price)
+
+    detector = BurstDetector(VOLUME_THRESHOLD_MULTIPLIER, PRICE_CHANGE_THRESHOLD)
+    for symbol in filter_symbols(get_all_usdt_pairs()):
+        detector.add(symbol)
+    return TradeBurstEngine(detector, on_burst)
+
+# --- أحداث كون العملات ---
+def build_universe_listeners(universe, dispatcher, chat_id, fetch_engine, get_stream_engines):
+    async def on_listing(symbols):
+        new_pairs = [s for s in symbols if s.endswith('USDT')]
+        if not new_pairs: return
+        for symbol in new_pairs:
+            coin_info_map[symbol] = universe.symbols[symbol]['base']
+        stream_engines = get_stream_engines()
+        owned = filter_symbols(new_pairs)
+        if stream_engines and owned:
+            # الاشتراك فوراً حتى تُفحص العملة من أولى شموعها
+            seeds = await fetch_engine.klines_many(owned, TIME_INTERVAL, KLINES_LIMIT)
+            for stream_engine in stream_engines:
+                await stream_engine.add_symbols(owned, seeds)
+        names = "\n".join(f"• *{coin_info_map[s]}* (`{s}`)" for s in new_pairs)
+        dispatcher.enqueue(chat_id, f"🆕 *[Sniper] إدراج جديد على Binance*\n\n{names}", parse_mode='Markdown')
+
+    async def on_delisting(symbols):
+        for symbol in symbols:
+            coin_info_map.pop(symbol, None)
+        for stream_engine in get_stream_engines():
+            await stream_engine.remove_symbols(symbols)
+        held = [s for s in symbols if s in bought_coins]
+        if held:
+            names = "\n".join(f"• `{s}`" for s in held)
+            dispatcher.enqueue(chat_id, f"⚠️ *[Sniper] تم إيقاف تداول عملات مفتوحة*\n\n{names}", parse_mode='Markdown')
+
+    universe.on_listing(on_listing)
+    universe.on_delisting(on_delisting)
+
+# --- الخدمات الخلفية (مشتركة بين main و runtime.py) ---
+async def start_services(fetch_engine, universe, dispatcher, chat_id):
+    """يشغّل مراقبة الإدراجات والصفقات والبث اللحظي، ويُرجع دالة الإيقاف."""
+    await initialize_coin_info(universe)
+    stream_engine = build_stream_engine(dispatcher, chat_id, fetch_engine) if SNIPER_MODE == "stream" else None
+    burst_engine = build_burst_engine(dispatcher, chat_id) if TRADE_BURSTS else None
+    stream_engines = [e for e in (stream_engine, burst_engine) if e is not None]
+    build_universe_listeners(universe, dispatcher, chat_id, fetch_engine, lambda: stream_engines)
+    # إعادة تحميل معلومات المنصة كل دقيقة لرصد الإدراجات الجديدة دون إعادة تشغيل
+    tasks = [asyncio.create_task(universe.watch())]
+
+    # مراقبة الأهداف بطلب أسعار مجمّع كل ثانية، مستقلة عن جولة الاكتشاف
+    async def on_exit(symbol, targets, price, reason):
+        await close_position(dispatcher, chat_id, symbol, targets, price, reason)
+    async def fetch_prices(symbols):
+        prices = await fetch_engine.prices(symbols)
+        snapshot.update_prices(prices)   # /positions يعرض أسعار المراقبة اللحظية
+        return prices
+    monitor = PositionMonitor(bought_coins, fetch_prices, on_exit, interval=POSITION_CHECK_SECONDS)
+    tasks.append(asyncio.create_task(monitor.run()))
+
+    async def run_streams():
+        # تعبئة النوافذ وتاريخ الأحجام أولاً من REST (طلب واحد لكل عملة يخدم المحركين) ثم الاعتماد على البث
+        symbols = sorted(set().union(*(e.symbols for e in stream_engines)))
+        seeds = await fetch_engine.klines_many(symbols, TIME_INTERVAL, KLINES_LIMIT)
+        for symbol, klines in seeds.items():
+            if not klines: continue
+            if stream_engine is not None: stream_engine.seed(symbol, klines)
+            if burst_engine is not None: burst_engine.detector.seed(symbol, klines)
+        await asyncio.gather(*(e.run() for e in stream_engines))
+
+    async def resubscribe():
+        # مع التقسيم: بعد كل إعادة توزيع يتبع البث الشظايا التي تملكها العملية الآن
+        wanted = set(filter_symbols(get_all_usdt_pairs()))
+        for e in stream_engines:
+            gone = [s for s in e.symbols if s not in wanted]
+            if gone: await e.remove_symbols(gone)
+        missing = sorted(set().union(*(wanted.difference(e.symbols) for e in stream_engines)))
+        if missing:
+            seeds = await fetch_engine.klines_many(missing, TIME_INTERVAL, KLINES_LIMIT)
+            for e in stream_engines: await e.add_symbols(missing, seeds)
+        logger.info(f"[Sniper] البث يغطي {len(wanted)} عملة بعد تغير الشظايا")
+
+    if stream_engines:
+        tasks.append(asyncio.create_task(run_streams()))
+    unsubscribe = on_symbol_filter_change(resubscribe) if stream_engines else None
+
+    async def stop():
+        universe.stop()
+        monitor.stop()
+        if unsubscribe is not None: unsubscribe()
+        for e in stream_engines: await e.stop()
+        for task in tasks: task.cancel()
+    return stop
+
 # --- دالة التشغيل الرئيسية ---
 def main():
     TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
     TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
-    BINANCE_API_KEY = os.environ.get("BINANCE_API_KEY")
-    BINANCE_SECRET_KEY = os.environ.get("BINANCE_SECRET_KEY")
-    
-    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, BINANCE_API_KEY, BINANCE_SECRET_KEY]):
+
+    if not all([TELEGRAM_TOKEN, TELEGRAM_CHAT_ID]):
         logger.critical("!!! [Sniper] فشل: متغيرات البيئة غير كاملة. !!!")
         return
+    bought_coins.open()
 
-    try:
-        binance_client = Client(BINANCE_API_KEY, BINANCE_SECRET_KEY)
-        initialize_coin_info(binance_client)
-    except Exception as e:
-        logger.critical(f"فشل الاتصال ببينانس أو تهيئة الأسماء: {e}")
-        return
+    fetch_engine = FetchEngine()
+    universe = SymbolUniverse(*binance_sources(fetch_engine))
+    stop_callbacks = []
+
+    async def post_init(application):
+        dispatcher.start()
+        stop_callbacks.append(await start_services(fetch_engine, universe, dispatcher, TELEGRAM_CHAT_ID))
+        HEALTH.set(READY)
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    async def post_shutdown(application):
+        for stop in stop_callbacks:
+            await stop()
+        await dispatcher.stop()
+        await fetch_engine.close()
+
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     application.add_handler(CommandHandler("start", start))
-    job_data = {'binance_client': binance_client, 'chat_id': TELEGRAM_CHAT_ID}
+    register_commands(application)
+    attach_snapshot(fetch_engine, universe)
+    dispatcher = TelegramDispatcher(application.bot)
+    job_data = {'fetch_engine': fetch_engine, 'dispatcher': dispatcher, 'chat_id': TELEGRAM_CHAT_ID}
     job_queue = application.job_queue
-    job_queue.run_repeating(scan_for_pumps, interval=SCAN_INTERVAL_SECONDS, first=10, data=job_data)
+    if SNIPER_MODE != "stream":
+        # في وضع البث يتم الاكتشاف لحظياً، وفي وضع REST يبقى الفحص الدوري
+        schedule_aligned(job_queue, scan_for_pumps, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
     
     logger.info("--- [Sniper] البوت جاهز وقيد التشغيل. ---")
     application.run_polling()
 
+# --- التشغيل ضمن runtime.py (عملية واحدة لعدة استراتيجيات) ---
+def register(runtime):
+    bought_coins.open()
+    fetch_engine = runtime.market('binance')
+    universe = runtime.universe('binance')
+    attach_snapshot(fetch_engine, universe)
+    runtime.add_service(lambda: start_services(fetch_engine, universe, runtime.dispatcher, runtime.chat_id))
+    if SNIPER_MODE != "stream":
+        job_data = {'fetch_engine': fetch_engine, 'dispatcher': runtime.dispatcher, 'chat_id': runtime.chat_id}
+        runtime.schedule(scan_for_pumps, SCAN_INTERVAL_SECONDS, job_data, BOT_NAME)
+
 if __name__ == "__main__":
     logger.info("--- [Sniper] Starting Main Application ---")
-    server_thread = Thread(target=run_server)
-    server_thread.daemon = True
-    server_thread.start()
+    run_server()
     logger.info("--- [Sniper] Web Server has been started. ---")
     main()
 
@@ -0,0 +1,127 @@
+# -----------------------------------------------------------------------------
+# startup_bench.py - قياس التشغيل البارد: زمن الاستيراد، فتح المنفذ، الجاهزية، وأول جولة فحص
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from scan_bench import HERE, UNLIMITED, _free_port, _http
+
+IMPORT_MODULES = ('health_server', 'runtime', 'bot', 'sniper_bot', 'bot_bingx', 'ccxt_bot')
+ENTRYPOINTS = ('fast_start.py', 'runtime.py')
+DEFAULT_STRATEGIES = 'hybrid,sniper,bingx,mtfa'
+
+
+def import_seconds(module, repeats):
+    """أفضل زمن استيراد من عدة عمليات جديدة (بدون ذاكرة __pycache__ الساخنة لا يُقاس شيء مفيد)."""
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    best = None
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=HERE),
+                             capture_output=True, text=True, cwd=tempfile.gettempdir())
+        if out.returncode != 0:
+            raise RuntimeError(f"استيراد {module} فشل:\n{out.stderr[-2000:]}")
+        value = float(out.stdout.strip().splitlines()[-1])
+        best = value if best is None else min(best, value)
+    return best
+
+
+def _status(url):
+    try:
+        with urlopen(url, timeout=2) as r:
+            return r.status, json.loads(r.read() or b"{}")
+    except HTTPError as e:
+        return e.code, {}
+    except OSError:
+        return None, {}
+
+
+def start_simulator(size):
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "exchange_simulator.py"), "--port", str(port),
+                                "--symbols", str(size), "--weight-limit", str(UNLIMITED),
+                                "--bingx-limit", str(UNLIMITED)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=HERE)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            _http(f"{url}/__stats")
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("المحاكي لم يبدأ")
+
+
+def time_to_states(entrypoint, strategies, sim_url, size, timeout):
+    """يشغّل نقطة الدخول ضد المحاكي ويُرجع الثواني حتى: أول رد صحة، /ready، وأول جولة لكل استراتيجية."""
+    port = _free_port()
+    workdir = tempfile.mkdtemp(prefix="falcon_start_")
+    env = dict(os.environ, PYTHONPATH=HERE, PORT=str(port), TELEGRAM_TOKEN="0:bench", TELEGRAM_CHAT_ID="1",
+               TELEGRAM_BASE_URL=sim_url, BINANCE_BASE_URL=sim_url, BINGX_BASE_URL=sim_url,
+               RUNTIME_STRATEGIES=strategies, SCAN_ON_START="1", SNIPER_MODE="rest",
+               TOP_PAIRS_LIMIT=str(size), POSITION_DB_PATH=os.path.join(workdir, "positions.db"),
+               NEWS_SEEN_PATH=os.path.join(workdir, "news_seen.json"))
+    base = f"http://127.0.0.1:{port}"
+    expected = set(strategies.split(","))
+    results = {}
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, entrypoint)], env=env, cwd=workdir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        while time.perf_counter() - start < timeout and len(results) < 3:
+            if process.poll() is not None:
+                raise RuntimeError(f"{entrypoint} توقف:\n{process.stderr.read()[-2000:]}")
+            elapsed = time.perf_counter() - start
+            if 'health' not in results:
+                if _status(f"{base}/")[0] == 200:
+                    results['health'] = elapsed
+            else:
+                if 'ready' not in results and _status(f"{base}/ready")[0] == 200:
+                    results['ready'] = elapsed
+                cycles = _status(f"{base}/metrics.json")[1].get('cycles', {})
+                if 'first_scan' not in results and expected <= {b for b, c in cycles.items() if c['count'] >= 1}:
+                    results['first_scan'] = elapsed
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {k: round(v, 3) for k, v in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس زمن التشغيل البارد على المحاكي المحلي")
+    parser.add_argument('--strategies', default=DEFAULT_STRATEGIES)
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    print(f"{'الوحدة':<14} {'الاستيراد ms':>12}")
+    for module in IMPORT_MODULES:
+        print(f"{module:<14} {import_seconds(module, args.repeats) * 1000:>12.0f}")
+
+    process, url = start_simulator(args.symbols)
+    try:
+        print(f"\n{'نقطة الدخول':<16} {'الصحة ث':>8} {'الجاهزية ث':>10} {'أول جولة ث':>10}")
+        for entrypoint in ENTRYPOINTS:
+            runs = [time_to_states(entrypoint, args.strategies, url, args.symbols, args.timeout)
+                    for _ in range(args.repeats)]
+            best = {key: min((r[key] for r in runs if key in r), default=None) for key in ('health', 'ready', 'first_scan')}
+            print(f"{entrypoint:<16} " + " ".join(f"{'—' if v is None else f'{v:.3f}':>9}" for v in best.values()))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# -----------------------------------------------------------------------------
+# symbol_universe.py - خدمة كون العملات (ذاكرة بصلاحية TTL + رصد الإدراجات الجديدة)
+# -----------------------------------------------------------------------------
+
+import time
+import logging
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+EXCHANGE_INFO_TTL_SECONDS = 60 * 60
+RANKING_TTL_SECONDS = 15 * 60
+WATCH_INTERVAL_SECONDS = 60
+TRADING = 'TRADING'
+
+
+class SymbolUniverse:
+    """
+    يخزن معلومات المنصة (الرموز، العملة الأساسية، الحالة) وترتيب الحجم لكل عملة
+    بصلاحيتين منفصلتين، ويقارن كل لقطة بالسابقة ليطلق أحداث "إدراج جديد" و
+    "إيقاف/شطب" فوراً. كل البوتات في العملية تقرأ من نفس النسخة بدل إعادة الجلب.
+
+    load_symbols: دالة async تُرجع {الرمز: {'base': ..., 'status': ...}}
+    load_volumes: دالة async تُرجع {الرمز: حجم التداول بعملة التسعير}
+    """
+
+    def __init__(self, load_symbols, load_volumes, name='binance',
+                 info_ttl=EXCHANGE_INFO_TTL_SECONDS, ranking_ttl=RANKING_TTL_SECONDS):
+        self.load_symbols = load_symbols
+        self.load_volumes = load_volumes
+        self.name = name
+        self.info_ttl = info_ttl
+        self.ranking_ttl = ranking_ttl
+        self.symbols = {}
+        self.volumes = {}
+        self._info_at = 0.0
+        self._ranking_at = 0.0
+        self._info_lock = asyncio.Lock()
+        self._ranking_lock = asyncio.Lock()
+        self._listing_listeners = []
+        self._delisting_listeners = []
+        self._stopped = False
+
+    # --- الأحداث ---
+    def on_listing(self, callback):
+        """callback(symbols) دالة async تُستدعى بقائمة الرموز المدرجة حديثاً."""
+        self._listing_listeners.append(callback)
+
+    def on_delisting(self, callback):
+        """callback(symbols) دالة async تُستدعى بقائمة الرموز الموقوفة أو المشطوبة."""
+        self._delisting_listeners.append(callback)
+
+    async def _emit(self, listeners, symbols):
+        for callback in listeners:
+            try:
+                await callback(symbols)
+            except Exception as e:
+                logger.error(f"[Universe] خطأ في مستمع الأحداث: {e}")
+
+    # --- التحديث ---
+    async def refresh_info(self, force=False):
+        async with self._info_lock:
+            if not force and self.symbols and time.monotonic() - self._info_at < self.info_ttl:
+                return
+            snapshot = await self.load_symbols()
+            previous = self.symbols
+            self.symbols = snapshot
+            self._info_at = time.monotonic()
+
+        if not previous:
+            logger.info(f"[Universe] {self.name}: تم تحميل {len(snapshot)} رمز")
+            return
+        was_trading = {s for s, info in previous.items() if info['status'] == TRADING}
+        is_trading = {s for s, info in snapshot.items() if info['status'] == TRADING}
+        listed = sorted(is_trading - was_trading)
+        delisted = sorted(was_trading - is_trading)
+        if listed:
+            logger.info(f"[Universe] {self.name}: إدراج جديد {listed}")
+            await self._emit(self._listing_listeners, listed)
+        if delisted:
+            logger.info(f"[Universe] {self.name}: إيقاف/شطب {delisted}")
+            await self._emit(self._delisting_listeners, delisted)
+
+    async def refresh_rankings(self, force=False):
+        async with self._ranking_lock:
+            if not force and self.volumes and time.monotonic() - self._ranking_at < self.ranking_ttl:
+                return
+            self.volumes = await self.load_volumes()
+            self._ranking_at = time.monotonic()
+
+    # --- القراءة ---
+    async def usdt_pairs(self):
+        await self.refresh_info()
+        return [s for s, info in self.symbols.items() if s.endswith('USDT') and info['status'] == TRADING]
+
+    async def base_assets(self):
+        await self.refresh_info()
+        return {s: info['base'] for s, info in self.symbols.items() if s.endswith('USDT')}
+
+    async def top_by_volume(self, limit=100, exclude=('UP', 'DOWN')):
+        trading = set(await self.usdt_pairs())
+        await self.refresh_rankings()
+        candidates = [s for s in self.volumes
+                      if s in trading and not any(token in s for token in exclude)]
+        return sorted(candidates, key=lambda s: self.volumes[s], reverse=True)[:limit]
+
+    # --- المراقبة الدورية ---
+    async def watch(self, interval=WATCH_INTERVAL_SECONDS):
+        """يعيد تحميل معلومات المنصة كل interval ثانية لرصد الإدراجات بسرعة."""
+        while not self._stopped:
+            try:
+                await self.refresh_info(force=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Universe] {self.name}: فشل تحديث معلومات المنصة: {e}")
+            await asyncio.sleep(interval)
+
+    def stop(self):
+        self._stopped = True
+
+
+# --- مصادر البيانات لكل منصة ---
+def binance_sources(engine):
+    async def load_symbols():
+        info = await engine.exchange_info()
+        return {s['symbol']: {'base': s['baseAsset'], 'status': s['status']} for s in info['symbols']}
+
+    async def load_volumes():
+        return {t['symbol']: float(t['quoteVolume']) for t in await engine.tickers_24h()}
+
+    return load_symbols, load_volumes
+
+
+def bingx_sources(client):
+    async def load_symbols():
+        symbols = await client.symbols()
+        # BingX: status = 1 تعني أن الزوج متاح للتداول
+        return {s['symbol']: {'base': s['symbol'].split('-')[0],
+                              'status': TRADING if s.get('status') == 1 else 'HALT'}
+                for s in symbols}
+
+    async def load_volumes():
+        return {t['symbol']: float(t.get('quoteVolume', 0)) for t in await client.tickers()}
+
+    return load_symbols, load_volumes
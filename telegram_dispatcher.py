@@ -0,0 +1,162 @@
+# -----------------------------------------------------------------------------
+# telegram_dispatcher.py - طابور إرسال تيليجرام غير متزامن (حدود المعدل + الدمج)
+# -----------------------------------------------------------------------------
+
+import time
+import logging
+import asyncio
+from collections import deque
+from datetime import timedelta
+from telegram.error import RetryAfter, TimedOut, NetworkError, BadRequest, ChatMigrated, TelegramError
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية (حدود Telegram Bot API) ---
+PER_CHAT_INTERVAL_SECONDS = 1.0    # رسالة في الثانية لكل محادثة
+GLOBAL_MESSAGES_PER_SECOND = 25    # أقل قليلاً من الحد العام 30/ث
+DIGEST_THRESHOLD = 5               # أكثر من هذا العدد في دفعة واحدة يُدمج في رسالة ملخص
+COALESCE_WINDOW_SECONDS = 0.5      # مهلة تجميع الرسائل المتزامنة قبل الإرسال
+MAX_MESSAGE_LENGTH = 4096
+MAX_RETRIES = 3
+
+
+def _seconds(retry_after):
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+class TelegramDispatcher:
+    """
+    الماسح يضع الرسائل في الطابور عبر enqueue() ويعود فوراً، ومرسل خلفي واحد
+    يحترم حدود المحادثة والحد العام، وينتظر RetryAfter بدل إسقاط الرسالة،
+    ويدمج الدفعات الكبيرة المتزامنة في رسالة ملخص واحدة.
+    """
+
+    def __init__(self, bot, per_chat_interval=PER_CHAT_INTERVAL_SECONDS,
+                 global_rate=GLOBAL_MESSAGES_PER_SECOND, digest_threshold=DIGEST_THRESHOLD,
+                 coalesce_window=COALESCE_WINDOW_SECONDS, max_retries=MAX_RETRIES):
+        self.bot = bot
+        self.per_chat_interval = per_chat_interval
+        self.global_rate = global_rate
+        self.digest_threshold = digest_threshold
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self._queue = asyncio.Queue()
+        self._last_sent = {}
+        self._global_sent = deque()
+        self._task = None
+        self.sent = 0
+        self.dropped = 0
+
+    def enqueue(self, chat_id, text, parse_mode=None, **kwargs):
+        self._queue.put_nowait((chat_id, text, parse_mode, kwargs))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self, drain_timeout=5.0):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[Dispatcher] إيقاف مع {self._queue.qsize()} رسالة غير مرسلة")
+        self._task.cancel()
+        self._task = None
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _digest(self, texts):
+        """يقسم رسائل المجموعة إلى ملخصات لا تتجاوز حد طول رسالة تيليجرام."""
+        header = f"📦 {len(texts)} رسائل مجمّعة"
+        chunks, current = [], header
+        for text in texts:
+            candidate = f"{current}\n\n{text}"
+            if len(candidate) > MAX_MESSAGE_LENGTH and current:
+                chunks.append(current)
+                current = text
+            else:
+                current = candidate
+        chunks.append(current)
+        return chunks
+
+    async def run(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                groups = {}
+                for chat_id, text, parse_mode, kwargs in batch:
+                    key = (chat_id, parse_mode, tuple(sorted(kwargs.items())))
+                    groups.setdefault(key, []).append(text)
+                for (chat_id, parse_mode, kwargs), texts in groups.items():
+                    if len(texts) > self.digest_threshold:
+                        texts = self._digest(texts)
+                    for text in texts:
+                        await self._send(chat_id, text, parse_mode, dict(kwargs))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Dispatcher] خطأ غير متوقع في الإرسال: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _throttle(self, chat_id):
+        now = time.monotonic()
+        wait = self._last_sent.get(chat_id, 0) + self.per_chat_interval - now
+        while self._global_sent and now - self._global_sent[0] >= 1.0:
+            self._global_sent.popleft()
+        if len(self._global_sent) >= self.global_rate:
+            wait = max(wait, self._global_sent[0] + 1.0 - now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send(self, chat_id, text, parse_mode, kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self._throttle(chat_id)
+            try:
+                with METRICS.phase('telegram', 'signal_send'):
+                    await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, **kwargs)
+                now = time.monotonic()
+                self._last_sent[chat_id] = now
+                self._global_sent.append(now)
+                self.sent += 1
+                return True
+            except RetryAfter as e:
+                METRICS.count_error('telegram')
+                delay = _seconds(e.retry_after)
+                logger.warning(f"[Dispatcher] Flood control: انتظار {delay:.0f} ث")
+                await asyncio.sleep(delay)
+            except BadRequest as e:
+                METRICS.count_error('telegram')
+                if parse_mode is None:
+                    logger.error(f"[Dispatcher] رفض تيليجرام الرسالة: {e}")
+                    break
+                # تنسيق Markdown غير صالح: نرسل النص كما هو بدل فقدان الإشارة
+                logger.warning(f"[Dispatcher] تنسيق غير صالح ({e})، إعادة الإرسال كنص عادي")
+                parse_mode = None
+            except (TimedOut, NetworkError) as e:
+                METRICS.count_error('telegram')
+                logger.warning(f"[Dispatcher] خطأ شبكة ({e})، محاولة {attempt + 1}")
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                # Forbidden / ChatMigrated وغيرها: لا فائدة من الإعادة، وتُكمل بقية الدفعة
+                METRICS.count_error('telegram')
+                hint = f" (المعرف الجديد {e.new_chat_id})" if isinstance(e, ChatMigrated) else ""
+                logger.error(f"[Dispatcher] تعذر الإرسال إلى {chat_id}{hint}: {e}")
+                break
+        self.dropped += 1
+        return False
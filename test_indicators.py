@@ -0,0 +1,59 @@
+# -----------------------------------------------------------------------------
+# test_indicators.py - تطابق IndicatorState مع calculate_indicators (pandas) في bot.py
+# -----------------------------------------------------------------------------
+
+import random
+import pandas as pd
+import pytest
+from bot import KLINES_LIMIT, RSI_PERIOD, calculate_indicators
+from indicators import IndicatorState
+
+COLUMNS = ('RSI', 'EMA9', 'EMA25', 'MACD', 'Signal')
+HOUR_MS = 3_600_000
+
+
+@pytest.fixture(scope='module')
+def closes():
+    rng = random.Random(7)
+    values, price = [], 100.0
+    for _ in range(1500):
+        price *= 1 + rng.uniform(-0.03, 0.03)
+        values.append(price)
+    return values
+
+
+def baseline(window):
+    """ما كان bot.py يحسبه قبل IndicatorState: pandas على نافذة REST وحدها، والقراءة من آخر صف."""
+    return calculate_indicators(pd.DataFrame({'close': window})).iloc[-1]
+
+
+def assert_close(values, expected):
+    for column in COLUMNS:
+        assert values[column] == pytest.approx(expected[column], rel=1e-9, abs=1e-9), column
+
+
+def test_update_matches_full_history(closes):
+    reference = calculate_indicators(pd.DataFrame({'close': closes}))
+    state = IndicatorState(RSI_PERIOD)
+    for i, close in enumerate(closes):
+        assert_close(state.update(close, i * HOUR_MS), reference.iloc[i])
+
+
+def test_sync_matches_windowed_baseline(closes):
+    """نوافذ REST متتالية (آخر شمعة تتشكل وتتغير) تعطي نفس قيم pandas على كل نافذة."""
+    state = IndicatorState(RSI_PERIOD)
+    rng = random.Random(11)
+    for end in range(KLINES_LIMIT, 600):
+        first = end - KLINES_LIMIT
+        times = [i * HOUR_MS for i in range(first, end)]
+        window = closes[first:end]
+        for forming in (window[-1], window[-2] * (1 + rng.uniform(-0.01, 0.01))):
+            assert_close(state.sync(times, window[:-1] + [forming]), baseline(window[:-1] + [forming]))
+
+
+def test_sync_after_gap_and_shorter_windows(closes):
+    state = IndicatorState(RSI_PERIOD)
+    for first, size in ((0, KLINES_LIMIT), (1, KLINES_LIMIT), (300, KLINES_LIMIT), (301, 60), (302, KLINES_LIMIT)):
+        times = [i * HOUR_MS for i in range(first, first + size)]
+        window = closes[first:first + size]
+        assert_close(state.sync(times, window), baseline(window))
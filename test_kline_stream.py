@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+# test_kline_stream.py - KlineStreamEngine أمام بث المحاكي المحلي: إعادة الاتصال والاشتراك وسد الفجوات
+# -----------------------------------------------------------------------------
+
+import asyncio
+from aiohttp import web
+from exchange_simulator import ExchangeSimulator
+from fetch_engine import FetchEngine
+from kline_stream import KlineStreamEngine
+
+SYMBOLS = ['SIM0001USDT', 'SIM0002USDT', 'SIM0003USDT']
+INTERVAL = '1m'
+WINDOW = 30
+MINUTE_MS = 60_000
+
+
+async def wait_for(predicate, timeout=10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "انتهت المهلة"
+        await asyncio.sleep(0.02)
+
+
+def contiguous(window):
+    times = [row[0] for row in window]
+    return len(times) == WINDOW and all(b - a == MINUTE_MS for a, b in zip(times, times[1:]))
+
+
+async def run_scenario():
+    simulator = ExchangeSimulator(symbols=10, pump_rate=0, ws_push_seconds=0.05)
+    runner = web.AppRunner(simulator.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    fetch_engine = FetchEngine(base_url=f"http://{host}:{port}")
+
+    candles, backfills = [], []
+
+    async def on_candle(symbol, klines, is_closed):
+        candles.append(symbol)
+
+    async def backfill(symbols):
+        backfills.append(sorted(symbols))
+        return await fetch_engine.klines_many(symbols, INTERVAL, WINDOW)
+
+    engine = KlineStreamEngine(SYMBOLS, INTERVAL, WINDOW, on_candle, url=f"ws://{host}:{port}/stream",
+                               intra_candle=True, backfill=backfill)
+    for symbol, klines in (await fetch_engine.klines_many(SYMBOLS, INTERVAL, WINDOW)).items():
+        engine.seed(symbol, klines)
+    task = asyncio.create_task(engine.run())
+    streams = {f"{s.lower()}@kline_{INTERVAL}" for s in SYMBOLS}
+
+    def subscribed():
+        return set().union(*simulator.sockets.values()) if simulator.sockets else set()
+
+    def current_open():
+        return int(simulator._series(SYMBOLS[0][:-4], INTERVAL).open_time[-1])
+
+    def caught_up():
+        return all(contiguous(engine.candles[s]) and engine.candles[s][-1][0] == current_open() for s in SYMBOLS)
+
+    try:
+        # الاشتراك الأول وتحديثات لكل العملات
+        await wait_for(lambda: set(candles) == set(SYMBOLS))
+        assert subscribed() == streams
+        assert backfills == []
+
+        # انقطاع من الخادم بعد فوات ثلاث شموع: إعادة الاتصال، نفس الاشتراكات، وسد النوافذ من REST
+        simulator.advance(3 * MINUTE_MS)
+        await simulator.drop_sockets()
+        await wait_for(lambda: simulator.stats.get('ws.connect') == 2 and subscribed() == streams)
+        await wait_for(lambda: set(sum(backfills, [])) == set(SYMBOLS))
+        await wait_for(caught_up)
+
+        # فجوة دون انقطاع (إطارات مفقودة): كل عملة تُسد وحدها من REST
+        backfills.clear()
+        simulator.advance(2 * MINUTE_MS)
+        await wait_for(lambda: sorted(sum(backfills, [])) == sorted(SYMBOLS))
+        await wait_for(caught_up)
+        assert simulator.stats.get('ws.connect') == 2
+
+        # بعد السد تعود التحديثات اللحظية لكل العملات
+        candles.clear()
+        await wait_for(lambda: set(candles) == set(SYMBOLS))
+    finally:
+        await engine.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await fetch_engine.close()
+        await runner.cleanup()
+
+
+def test_reconnect_resubscribe_and_backfill():
+    asyncio.run(run_scenario())
@@ -0,0 +1,58 @@
+# -----------------------------------------------------------------------------
+# test_resampler.py - الفواصل المشتقة من 15m أمام شموع المنصة الأصلية (المحاكي مع --resample-from 15m)
+# -----------------------------------------------------------------------------
+
+import asyncio
+from aiohttp import web
+from exchange_simulator import ExchangeSimulator
+from fetch_engine import FetchEngine
+from kline_parser import parse_klines
+from resampler import BASE_INTERVAL, TIMEFRAMES, TimeframeCache, compare
+
+SYMBOLS = ['SIM0001USDT', 'SIM0002USDT']
+BASE_LIMIT = 1000
+NATIVE_LIMIT = 1000
+HOUR_MS = 3_600_000
+
+
+async def check_frames(cache, fetch_engine):
+    for symbol in SYMBOLS:
+        frames = await cache.fetch(('binance', symbol, BASE_INTERVAL), BASE_LIMIT, fetch_engine.klines)
+        assert set(frames) == set(TIMEFRAMES)
+        for interval in TIMEFRAMES:
+            derived = frames[interval]
+            native = await fetch_engine.klines(symbol, interval, NATIVE_LIMIT)
+            count, mismatches = compare(derived, native)
+            assert not mismatches, (symbol, interval, mismatches)
+            # كل شمعة مشتقة موجودة في الأصلية، والقص يقف عند آخر شمعة مغلقة (الأصلية الأخيرة تتشكل)
+            assert count == len(derived) > 0, (symbol, interval)
+            assert derived.open_time[-1] == parse_klines(native[-2:-1]).open_time[0], (symbol, interval)
+
+
+async def run_scenario():
+    simulator = ExchangeSimulator(symbols=10, pump_rate=0, resample_from=BASE_INTERVAL)
+    runner = web.AppRunner(simulator.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    fetch_engine = FetchEngine(base_url=f"http://{host}:{port}")
+    cache = TimeframeCache(TIMEFRAMES, closed_only=True)
+    # التحميل الأول في الماضي ثم العودة إلى الساعة الحقيقية، حتى يحسب plan حجم طلب الشموع الجديدة
+    # بنفس ساعة المحاكي (advance وحده يجعل الطلب أصغر من الفائت فيُعاد التحميل الكامل)
+    lag = 5 * HOUR_MS + 15 * 60_000
+    simulator.advance(-lag)
+    try:
+        await check_frames(cache, fetch_engine)
+        assert cache.full_fetches == len(SYMBOLS)
+        # شموع جديدة بعد التحميل الأول (تعبر حدود 1h و 4h وربما 1d): التحديث يبقى مطابقاً
+        simulator.advance(lag)
+        await check_frames(cache, fetch_engine)
+        assert cache.delta_fetches == len(SYMBOLS) and cache.full_fetches == len(SYMBOLS)
+    finally:
+        await fetch_engine.close()
+        await runner.cleanup()
+
+
+def test_derived_frames_match_native_klines():
+    asyncio.run(run_scenario())
@@ -0,0 +1,373 @@
+# -----------------------------------------------------------------------------
+# trade_burst.py - رصد الانفجارات داخل الشمعة من بث الصفقات (<symbol>@aggTrade)
+# -----------------------------------------------------------------------------
+#   python trade_burst.py replay trades.jsonl [--history-minutes 30]
+#   python trade_burst.py record trades.jsonl --symbols BTCUSDT,ETHUSDT --seconds 600
+#   python trade_burst.py bench --symbols 400 --trades 2000000
+
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+from array import array
+from kline_parser import parse_klines
+from kline_stream import BINANCE_WS_URL, MAX_STREAMS_PER_CONNECTION, StreamClient
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BURST_WINDOW_SECONDS = int(os.environ.get("BURST_WINDOW_SECONDS", 60))   # النافذة المتدحرجة بدل شمعة 5 دقائق كاملة
+BURST_HISTORY_MINUTES = 250     # 50 شمعة × 5 دقائق: نفس المتوسط الذي يستخدمه evaluate_explosion
+SYNTHETIC_START_MS, SYNTHETIC_HOURS = 1_700_000_000_000, 6
+
+
+class Burst:
+    __slots__ = ('symbol', 'price', 'volume', 'average_volume', 'price_change', 'time_ms')
+
+    def __init__(self, symbol, price, volume, average_volume, price_change, time_ms):
+        self.symbol = symbol
+        self.price = price
+        self.volume = volume
+        self.average_volume = average_volume
+        self.price_change = price_change
+        self.time_ms = time_ms
+
+    def __repr__(self):
+        return (f"Burst({self.symbol} @ {self.price} حجم {self.volume:.4g} = "
+                f"x{self.volume / self.average_volume:.1f} تغير {self.price_change:+.2f}%)")
+
+
+class SymbolBuckets:
+    """
+    حلقتان بحجم ثابت لكل عملة: حجم وسعر أول صفقة لكل ثانية داخل النافذة، وحجم كل دقيقة
+    للتاريخ. الطابع الزمني لكل خانة يميز الخانات القديمة بعد فترات بلا صفقات.
+    """
+    __slots__ = ('sec_stamp', 'sec_volume', 'sec_open', 'min_stamp', 'min_volume', 'since',
+                 'second', 'minute', 'window_volume', 'window_open', 'open_second', 'history_volume',
+                 'history_minutes', 'last_burst')
+
+    def __init__(self, window_seconds, ring_minutes):
+        self.sec_stamp = array('q', [-1]) * window_seconds
+        self.sec_volume = array('d', [0.0]) * window_seconds
+        self.sec_open = array('d', [0.0]) * window_seconds
+        self.min_stamp = array('q', [-1]) * ring_minutes
+        self.min_volume = array('d', [0.0]) * ring_minutes
+        self.since = None          # أول دقيقة مغطاة (من البذرة أو أول صفقة)
+        self.second = -1
+        self.minute = -1
+        self.window_volume = 0.0
+        self.window_open = 0.0
+        self.open_second = -1      # الثانية التي جاء منها window_open
+        self.history_volume = 0.0
+        self.history_minutes = 0
+        self.last_burst = -10 ** 12
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.sec_stamp, self.sec_volume, self.sec_open,
+                                                  self.min_stamp, self.min_volume))
+
+
+class BurstDetector:
+    """
+    نفس قاعدة evaluate_explosion على نافذة متدحرجة بدل الشمعة المغلقة: حجم آخر window_seconds
+    أكبر من متوسط حجم نفس المدة خلال التاريخ × volume_multiplier، وتغير السعر منذ أول صفقة
+    في النافذة >= price_change_threshold %. الذاكرة ثابتة لكل عملة (~6 KB بالإعدادات الافتراضية)،
+    ومجموع النافذة يُحدّث تزايدياً (O(1) مطفأة لكل صفقة)؛ التاريخ يُعاد جمعه مرة لكل دقيقة فقط.
+    """
+
+    def __init__(self, volume_multiplier, price_change_threshold, window_seconds=BURST_WINDOW_SECONDS,
+                 history_minutes=BURST_HISTORY_MINUTES, min_history_minutes=None, cooldown_seconds=None):
+        self.volume_multiplier = volume_multiplier
+        self.price_change_threshold = price_change_threshold
+        self.window_seconds = window_seconds
+        self.history_minutes = history_minutes
+        self.cooldown_seconds = window_seconds if cooldown_seconds is None else cooldown_seconds
+        # دقائق النافذة الحالية (وجزء الدقيقة قبلها) لا تدخل التاريخ، كما تُستثنى الشمعة الأخيرة من المتوسط
+        self.gap_minutes = window_seconds // 60 + 1
+        # بذرة REST (50 شمعة مغلقة) تغطي التاريخ كاملاً ناقص دقائق الفاصل في أول الشمعة الجارية
+        self.min_history_minutes = (history_minutes - self.gap_minutes if min_history_minutes is None
+                                    else min_history_minutes)
+        self.ring_minutes = history_minutes + self.gap_minutes + 1
+        self.buckets = {}
+
+    # --- إدارة العملات ---
+    def add(self, symbol):
+        if symbol not in self.buckets:
+            self.buckets[symbol] = SymbolBuckets(self.window_seconds, self.ring_minutes)
+        return self.buckets[symbol]
+
+    def remove(self, symbol):
+        self.buckets.pop(symbol, None)
+
+    def seed(self, symbol, klines):
+        """يملأ التاريخ من شموع REST (أي فترة) بتوزيع حجم كل شمعة على دقائقها؛ الشمعة الأخيرة غير مكتملة فتُتجاهل."""
+        b = self.add(symbol)
+        if not klines or len(klines) < 2:
+            return
+        k = parse_klines(klines)
+        minutes_per_candle = max(1, int(round((k.open_time[1] - k.open_time[0]) / 60_000)))
+        for open_time, volume in zip(k.open_time[:-1].tolist(), k.volume[:-1].tolist()):
+            first = int(open_time) // 60_000
+            per_minute = volume / minutes_per_candle
+            for m in range(first, first + minutes_per_candle):
+                slot = m % self.ring_minutes
+                b.min_stamp[slot] = m
+                b.min_volume[slot] = per_minute
+        first_minute = int(k.open_time[0]) // 60_000
+        b.since = first_minute if b.since is None else min(b.since, first_minute)
+        b.minute = max(b.minute, int(k.open_time[-1]) // 60_000 - 1)
+
+    def memory_bytes(self):
+        return sum(b.nbytes() for b in self.buckets.values())
+
+    # --- التحديث ---
+    def _roll_minute(self, b, minute):
+        ring = self.ring_minutes
+        for m in range(max(b.minute + 1, minute - ring + 1), minute + 1):
+            slot = m % ring
+            if b.min_stamp[slot] != m:
+                b.min_stamp[slot] = m
+                b.min_volume[slot] = 0.0
+        b.minute = minute
+        if b.since is None:
+            b.since = minute
+        low, high = max(b.since, minute - ring + 1), minute - self.gap_minutes
+        stamps, volumes = b.min_stamp, b.min_volume
+        b.history_volume = sum(volumes[i] for i in range(ring) if low <= stamps[i] < high)
+        b.history_minutes = max(0, high - low)
+
+    def _roll_second(self, b, second):
+        window = self.window_seconds
+        stamps = b.sec_stamp
+        oldest = second - window   # الثواني <= oldest خرجت من النافذة
+        if second - b.second >= window:
+            b.window_volume, b.window_open, b.open_second = 0.0, 0.0, -1
+        else:
+            # طرح الثواني التي خرجت فقط (بعدد الثواني المنقضية لا بطول النافذة)
+            for s in range(b.second - window + 1, oldest + 1):
+                slot = s % window
+                if stamps[slot] == s:
+                    b.window_volume -= b.sec_volume[slot]
+            if b.open_second <= oldest:
+                # سعر الافتتاح ينتقل لأقدم ثانية باقية؛ open_second لا يرجع للخلف فالبحث مطفأ O(1)
+                b.window_open, b.open_second = 0.0, -1
+                for s in range(oldest + 1, b.second + 1):
+                    if stamps[s % window] == s:
+                        b.window_open, b.open_second = b.sec_open[s % window], s
+                        break
+            if b.window_volume < 0.0:
+                b.window_volume = 0.0   # تراكم أخطاء الفاصلة العائمة
+        b.second = second
+        minute = second // 60
+        if minute != b.minute:
+            self._roll_minute(b, minute)
+
+    def on_trade(self, symbol, price, quantity, time_ms):
+        """يُرجع Burst عند تحقق الشرطين، وإلا None."""
+        b = self.buckets.get(symbol)
+        if b is None:
+            return None
+        second = time_ms // 1000
+        if second > b.second:
+            self._roll_second(b, second)
+        # الصفقات المتأخرة (بعد إعادة الاتصال) تُحسب في الثانية الحالية
+        slot = b.second % self.window_seconds
+        if b.sec_stamp[slot] != b.second:
+            b.sec_stamp[slot] = b.second
+            b.sec_volume[slot] = 0.0
+            b.sec_open[slot] = price
+        b.sec_volume[slot] += quantity
+        if b.open_second < 0:
+            b.window_open, b.open_second = price, b.second
+        b.window_volume += quantity
+        b.min_volume[b.minute % self.ring_minutes] += quantity
+
+        if b.history_minutes < self.min_history_minutes or b.history_volume <= 0.0:
+            return None
+        average = b.history_volume / (b.history_minutes * 60) * self.window_seconds
+        if b.window_volume <= average * self.volume_multiplier:
+            return None
+        price_change = (price / b.window_open - 1) * 100
+        if price_change < self.price_change_threshold or b.second - b.last_burst < self.cooldown_seconds:
+            return None
+        b.last_burst = b.second
+        return Burst(symbol, price, b.window_volume, average, price_change, time_ms)
+
+
+class TradeBurstEngine:
+    """يشترك في <symbol>@aggTrade عبر StreamClient ويستدعي on_burst(burst) عند كل انفجار."""
+
+    def __init__(self, detector, on_burst, url=BINANCE_WS_URL):
+        self.detector = detector
+        self.on_burst = on_burst
+        self.url = url
+        self.trades = 0
+        self._clients = []
+
+    @staticmethod
+    def _stream_name(symbol):
+        return f"{symbol.lower()}@aggTrade"
+
+    @property
+    def symbols(self):
+        return list(self.detector.buckets)
+
+    async def _handle(self, stream, data):
+        self.trades += 1
+        burst = self.detector.on_trade(data['s'], float(data['p']), float(data['q']), data['T'])
+        if burst is not None:
+            await self.on_burst(burst)
+
+    async def add_symbols(self, symbols, klines_map=None):
+        klines_map = klines_map or {}
+        new = [s for s in symbols if s not in self.detector.buckets]
+        for symbol in new:
+            self.detector.seed(symbol, klines_map.get(symbol, []))
+        for symbol in new:
+            client = min(self._clients, key=lambda c: len(c.streams), default=None)
+            if client is not None:
+                await client.subscribe([self._stream_name(symbol)])
+
+    async def remove_symbols(self, symbols):
+        for symbol in symbols:
+            if symbol not in self.detector.buckets:
+                continue
+            self.detector.remove(symbol)
+            for client in self._clients:
+                await client.unsubscribe([self._stream_name(symbol)])
+
+    async def run(self):
+        symbols = sorted(self.detector.buckets)
+        self._clients = [
+            StreamClient([self._stream_name(s) for s in symbols[i:i + MAX_STREAMS_PER_CONNECTION]],
+                         self._handle, url=self.url)
+            for i in range(0, len(symbols), MAX_STREAMS_PER_CONNECTION)
+        ] or [StreamClient([], self._handle, url=self.url)]
+        logger.info(f"[Burst] الاشتراك في صفقات {len(symbols)} عملة عبر {len(self._clients)} اتصال "
+                    f"(الذاكرة {self.detector.memory_bytes() / 2**20:.1f} MB)")
+        await asyncio.gather(*(c.run() for c in self._clients))
+
+    async def stop(self):
+        for client in self._clients:
+            await client.stop()
+
+
+# --- إعادة تشغيل ملفات الصفقات المسجلة ---
+def read_trades(path):
+    """
+    يقرأ JSONL كما يصل من البث المجمّع ({"stream", "data"}) أو أحداث aggTrade مباشرة،
+    أو CSV من data.binance.vision (الرمز من اسم الملف: BTCUSDT-aggTrades-2024-01-01.csv).
+    يُرجع مولداً لـ (الرمز، السعر، الكمية، الزمن ms).
+    """
+    if path.endswith('.csv'):
+        symbol = os.path.basename(path).split('-')[0]
+        with open(path) as f:
+            for line in f:
+                fields = line.split(',')
+                if not fields[0].isdigit():
+                    continue   # سطر العناوين
+                time_ms = int(fields[5])
+                yield symbol, float(fields[1]), float(fields[2]), time_ms // 1000 if time_ms > 10 ** 14 else time_ms
+        return
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            msg = json.loads(line)
+            data = msg.get('data', msg)
+            yield data['s'], float(data['p']), float(data['q']), data['T']
+
+
+def replay(trades, detector, seeds=None):
+    """يمرر الصفقات إلى المكتشف ويُرجع (الانفجارات، عدد الصفقات، الثواني)."""
+    for symbol, klines in (seeds or {}).items():
+        detector.seed(symbol, klines)
+    bursts, count = [], 0
+    start = time.perf_counter()
+    for symbol, price, quantity, time_ms in trades:
+        if symbol not in detector.buckets:
+            detector.add(symbol)
+        count += 1
+        burst = detector.on_trade(symbol, price, quantity, time_ms)
+        if burst is not None:
+            bursts.append(burst)
+    return bursts, count, time.perf_counter() - start
+
+
+async def record(path, symbols, seconds, url=BINANCE_WS_URL):
+    """يسجل بث aggTrade الحي إلى JSONL لإعادة تشغيله لاحقاً."""
+    with open(path, 'a') as f:
+        async def on_message(stream, data):
+            f.write(json.dumps({'stream': stream, 'data': data}) + "\n")
+        client = StreamClient([f"{s.lower()}@aggTrade" for s in symbols], on_message, url=url)
+        task = asyncio.create_task(client.run())
+        await asyncio.sleep(seconds)
+        await client.stop()
+        task.cancel()
+
+
+def synthetic_trades(symbols, trades, pumps, seed=3):
+    """تدفق صفقات عشوائي مرتب زمنياً لعدة عملات؛ أول pumps عملة تشهد انفجاراً في الربع الأخير."""
+    import random
+    rng = random.Random(seed)
+    names = [f"SYN{i:04d}USDT" for i in range(symbols)]
+    prices = {s: rng.uniform(0.01, 500) for s in names}
+    pumped = set(names[:pumps])
+    duration_ms = SYNTHETIC_HOURS * 60 * 60 * 1000
+    start_ms = SYNTHETIC_START_MS
+    pump_at = start_ms + duration_ms * 3 // 4
+    for i in range(trades):
+        time_ms = start_ms + duration_ms * i // trades
+        symbol = names[rng.randrange(symbols)]
+        quantity = rng.expovariate(1.0)
+        drift = rng.uniform(-0.0005, 0.0005)
+        if symbol in pumped and pump_at <= time_ms < pump_at + 90_000:
+            quantity *= 60
+            drift = 0.004
+        prices[symbol] *= 1 + drift
+        yield symbol, prices[symbol], quantity, time_ms
+
+
+def main(argv):
+    import argparse
+    from sniper_bot import VOLUME_THRESHOLD_MULTIPLIER, PRICE_CHANGE_THRESHOLD
+    parser = argparse.ArgumentParser(description="رصد الانفجارات من بث الصفقات")
+    parser.add_argument('command', choices=('replay', 'record', 'bench'))
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--symbols', default="400", help="replay/bench: عدد العملات، record: قائمة الرموز")
+    parser.add_argument('--seconds', type=float, default=600)
+    parser.add_argument('--trades', type=int, default=2_000_000)
+    parser.add_argument('--window', type=int, default=BURST_WINDOW_SECONDS)
+    parser.add_argument('--history-minutes', type=int, default=BURST_HISTORY_MINUTES)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        asyncio.run(record(args.path, args.symbols.split(","), args.seconds))
+        return
+    detector = BurstDetector(VOLUME_THRESHOLD_MULTIPLIER, PRICE_CHANGE_THRESHOLD, args.window,
+                             history_minutes=args.history_minutes)
+    if args.command == 'replay':
+        bursts, count, elapsed = replay(read_trades(args.path), detector)
+    else:
+        symbols = int(args.symbols)
+        pumps = max(1, symbols // 50)
+        trades = list(synthetic_trades(symbols, args.trades, pumps))
+        bursts, count, elapsed = replay(trades, detector)
+        detected = {b.symbol: b for b in reversed(bursts)}   # أول إنذار لكل عملة
+        expected = {f"SYN{i:04d}USDT" for i in range(pumps)}
+        pump_at = SYNTHETIC_START_MS + SYNTHETIC_HOURS * 60 * 60 * 1000 * 3 // 4
+        delays = sorted((detected[s].time_ms - pump_at) / 1000 for s in expected & set(detected))
+        print(f"الانفجارات المزروعة: {len(expected)} | المرصودة منها: {len(delays)} | "
+              f"إنذارات أخرى: {len(set(detected) - expected)} | زمن الرصد الوسيط بعد البداية: "
+              f"{delays[len(delays) // 2] if delays else float('nan'):.0f} ث (الشمعة الكاملة: 300 ث)")
+    for burst in bursts[:20]:
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(burst.time_ms / 1000))} {burst}")
+    print(f"{count:,} صفقة لـ {len(detector.buckets)} عملة في {elapsed:.2f} ث = {count / elapsed:,.0f} صفقة/ث "
+          f"(نواة واحدة) | الذاكرة {detector.memory_bytes() / len(detector.buckets) / 1024:.1f} KB لكل عملة")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    main(sys.argv[1:])
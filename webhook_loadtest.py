@@ -0,0 +1,125 @@
+# -----------------------------------------------------------------------------
+# webhook_loadtest.py - اختبار حمل محلي لوضع webhook في ccxt_bot (آلاف التحديثات الاصطناعية)
+# -----------------------------------------------------------------------------
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+import aiohttp
+from telegram.request import BaseRequest
+import ccxt_bot
+
+SECRET = "loadtest-secret"
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Falcon", "username": "falcon_loadtest_bot"}
+
+
+class LocalRequest(BaseRequest):
+    """
+    بديل شبكة Bot API داخل العملية: getMe ترجع مستخدم البوت، وكل استدعاء آخر
+    (sendMessage من ردود /start) يُحسب ويُرد عليه برسالة ناجحة دون اتصال خارجي.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.done = asyncio.Event()
+        self.expected = None
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            result = BOT_USER
+        else:
+            self.calls += 1
+            if self.expected is not None and self.calls >= self.expected:
+                self.done.set()
+            params = request_data.parameters if request_data else {}
+            result = {"message_id": self.calls, "date": int(time.time()),
+                      "chat": {"id": params.get("chat_id", 0), "type": "private"}, "text": params.get("text", "")}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def synthetic_update(update_id):
+    user = {"id": 1000 + update_id % 500, "is_bot": False, "first_name": f"user{update_id % 500}"}
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "from": user,
+        "chat": {"id": user["id"], "type": "private"}, "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run(total, concurrency, port, concurrent_updates):
+    request = LocalRequest()
+    request.expected = total
+    application = ccxt_bot.build_application("0:loadtest", request=request, get_updates_request=LocalRequest(),
+                                             concurrent_updates=concurrent_updates)
+    stop_event, started = asyncio.Event(), asyncio.Event()
+
+    async def on_started():
+        started.set()
+
+    server = asyncio.create_task(ccxt_bot.serve(application, SECRET, port, webhook_url=None,
+                                                on_started=on_started, stop_event=stop_event))
+    await started.wait()
+    url = f"http://127.0.0.1:{port}/{ccxt_bot.WEBHOOK_PATH}"
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        # طلب بدون الرمز السري يجب أن يُرفض
+        async with session.post(url, json=synthetic_update(0)) as r:
+            rejected = r.status
+
+        async def send(update_id):
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url, json=synthetic_update(update_id),
+                                        headers={ccxt_bot.SECRET_HEADER: SECRET}) as r:
+                    await r.read()
+                latencies.append(time.perf_counter() - start)
+                statuses[r.status] = statuses.get(r.status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(1, total + 1)))
+        accepted = time.perf_counter() - start
+        await asyncio.wait_for(request.done.wait(), timeout=max(30, total / 100))
+        processed = time.perf_counter() - start
+
+    stop_event.set()
+    await server
+    print(f"{total} تحديث، تزامن {concurrency}، concurrent_updates={concurrent_updates}")
+    print(f"بدون رمز سري: {rejected} | حالات الردود: {statuses}")
+    print(f"الاستقبال: {total / accepted:,.0f} تحديث/ث  (p50 {statistics.median(latencies) * 1000:.1f} ms، "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms، p99 {percentile(latencies, 0.99) * 1000:.1f} ms)")
+    print(f"المعالجة حتى آخر رد: {processed:.2f} ث ({total / processed:,.0f} تحديث/ث، {request.calls} رد)")
+    return rejected == 403 and statuses == {200: total} and request.calls == total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="اختبار حمل محلي لـ webhook")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--concurrent-updates", type=int, default=1,
+                        help="عدد التحديثات التي يعالجها PTB في نفس الوقت (1 = بالترتيب)")
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.updates, args.concurrency, args.port, args.concurrent_updates))
+    raise SystemExit(0 if ok else 1)
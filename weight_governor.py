@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------
+# weight_governor.py - ميزانية أوزان الطلبات مشتركة لكل الاتصالات بالمنصة (مع أولويات)
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import sqlite3
+import logging
+import asyncio
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات الافتراضية ---
+BINANCE_WEIGHT_LIMIT = int(os.environ.get("BINANCE_WEIGHT_LIMIT", 6000))          # حد الوزن في الدقيقة لكل IP
+BINGX_REQUESTS_PER_MINUTE = int(os.environ.get("BINGX_REQUESTS_PER_MINUTE", 600))
+WEIGHT_LEASE_PATH = os.environ.get("WEIGHT_LEASE_PATH")   # ملف SQLite لمشاركة الميزانية بين العمليات
+WINDOW_SECONDS = 60
+HIGH, NORMAL, LOW = 0, 1, 2   # HIGH: أسعار الصفقات المفتوحة، NORMAL: الاكتشاف، LOW: معلومات المنصة
+# نسبة الحد المتاحة لكل أولوية: الاكتشاف يتوقف عند 80% فيبقى هامش دائم لفحص الصفقات
+PRIORITY_SHARE = {HIGH: 1.0, NORMAL: 0.8, LOW: 0.6}
+PRIORITY_MAX_WAIT = {HIGH: None, NORMAL: 120.0, LOW: 300.0}
+DEFAULT_BAN_SECONDS = {429: 5.0, 418: 120.0}
+
+GOVERNOR_DEFAULTS = {
+    'binance': {'limit': BINANCE_WEIGHT_LIMIT, 'weight_header': 'X-MBX-USED-WEIGHT-1M'},
+    'bingx': {'limit': BINGX_REQUESTS_PER_MINUTE, 'weight_header': None},
+}
+
+
+class WeightBudgetExceeded(Exception):
+    """الانتظار المطلوب للحصول على الوزن أطول من المسموح لهذه الأولوية."""
+
+
+class WeightLease:
+    """
+    عداد مشترك في SQLite (WAL) لكل العمليات على نفس الجهاز/IP: الوزن المستخدم في
+    الدقيقة الحالية ونهاية الحظر. كل حجز معاملة BEGIN IMMEDIATE قصيرة جداً، يستدعيها
+    WeightGovernor عبر asyncio.to_thread حتى لا ينتظر قفل الملف على حلقة الأحداث.
+    """
+
+    def __init__(self, path, name):
+        self.name = name
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS weight_budget "
+                          "(name TEXT PRIMARY KEY, window INTEGER, used INTEGER, banned_until REAL)")
+        self.conn.execute("INSERT OR IGNORE INTO weight_budget VALUES (?, 0, 0, 0)", (name,))
+
+    def _update(self, window, weight, cap, used_floor=0, banned_until=0.0):
+        """يحجز weight إن لم يتجاوز المجموع cap، ويُرجع (نجح؟، المستخدم، نهاية الحظر)."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row_window, used, banned = conn.execute(
+                "SELECT window, used, banned_until FROM weight_budget WHERE name = ?", (self.name,)).fetchone()
+            if row_window != window:
+                used = 0
+            used = max(used, used_floor)
+            banned = max(banned, banned_until)
+            granted = banned <= time.time() and used + weight <= cap
+            if granted:
+                used += weight
+            conn.execute("UPDATE weight_budget SET window = ?, used = ?, banned_until = ? WHERE name = ?",
+                         (window, used, banned, self.name))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return granted, used, banned
+
+    def reserve(self, window, weight, cap):
+        return self._update(window, weight, cap)
+
+    def observe(self, window, used, banned_until):
+        return self._update(window, 0, float('inf'), used, banned_until)
+
+
+class WeightGovernor:
+    """
+    يحجز وزن كل طلب قبل إرساله ضمن حد الدقيقة، ويصحح العداد من ترويسة الوزن
+    المستخدم التي تُرجعها المنصة (تشمل طلبات العمليات الأخرى على نفس IP).
+    عند 429/418 يتوقف كل الإرسال حتى انتهاء Retry-After بدل تكرار الخطأ.
+    الطلبات ذات الأولوية الأعلى تُخدم أولاً، والاكتشاف لا يتجاوز حصته من الحد.
+    """
+
+    def __init__(self, name='binance', limit=BINANCE_WEIGHT_LIMIT, weight_header='X-MBX-USED-WEIGHT-1M',
+                 window_seconds=WINDOW_SECONDS, lease_path=WEIGHT_LEASE_PATH):
+        self.name = name
+        self.limit = limit
+        self.weight_header = weight_header
+        self.window_seconds = window_seconds
+        self.lease = WeightLease(lease_path, name) if lease_path else None
+        self.window = None
+        self.used = 0
+        self.banned_until = 0.0
+        self._waiting = {HIGH: 0, NORMAL: 0, LOW: 0}
+        self._condition = None
+
+    def _roll(self, now):
+        window = int(now // self.window_seconds)
+        if window != self.window:
+            self.window, self.used = window, 0
+        return window
+
+    async def _try_reserve(self, weight, priority):
+        """تُرجع 0 عند نجاح الحجز، وإلا عدد الثواني المقترح للانتظار."""
+        now = time.time()
+        window = self._roll(now)
+        if self.banned_until > now:
+            return self.banned_until - now
+        if any(self._waiting[p] for p in self._waiting if p < priority):
+            # طلب أعلى أولوية ينتظر: لا نسبقه، ونستيقظ عند نجاحه أو بداية الدقيقة التالية
+            return (window + 1) * self.window_seconds - now
+        cap = self.limit * PRIORITY_SHARE[priority]
+        if self.lease is not None:
+            granted, self.used, self.banned_until = await asyncio.to_thread(self.lease.reserve, window, weight, cap)
+            if granted:
+                return 0
+            if self.banned_until > now:
+                return self.banned_until - now
+        elif self.used + weight <= cap:
+            self.used += weight
+            return 0
+        return (window + 1) * self.window_seconds - now
+
+    async def acquire(self, weight, priority=NORMAL):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        max_wait = PRIORITY_MAX_WAIT[priority]
+        start = time.monotonic()
+        waiting = False
+        try:
+            async with self._condition:
+                while True:
+                    wait = await self._try_reserve(weight, priority)
+                    if wait == 0:
+                        break
+                    waited = time.monotonic() - start
+                    if max_wait is not None and waited + wait > max_wait:
+                        raise WeightBudgetExceeded(
+                            f"{self.name}: ميزانية الوزن مستنفدة ({self.used}/{self.limit})، الانتظار {wait:.0f} ث")
+                    # يُحسب منتظراً فقط بعد رفض الحجز، فلا يؤخر طلبٌ سيُخدم فوراً الأولويات الأدنى
+                    if not waiting:
+                        self._waiting[priority] += 1
+                        waiting = True
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if waiting:
+                self._waiting[priority] -= 1
+        if self._condition is not None:
+            async with self._condition:
+                self._condition.notify_all()
+        waited = time.monotonic() - start
+        if waited > 0.01:
+            METRICS.observe_phase(self.name, 'weight_wait', waited)
+
+    async def observe(self, status, headers):
+        """يُستدعى مع كل استجابة: يحدّث الوزن المستخدم من الترويسة ويطبق حظر 429/418."""
+        now = time.time()
+        window = self._roll(now)
+        used = headers.get(self.weight_header) if self.weight_header else None
+        banned_until = 0.0
+        if status in DEFAULT_BAN_SECONDS:
+            try:
+                retry_after = float(headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                retry_after = DEFAULT_BAN_SECONDS[status]
+            banned_until = now + retry_after
+            logger.warning(f"[Governor] {self.name}: رد {status}، إيقاف كل الطلبات لمدة {retry_after:.0f} ث")
+        if used is None and not banned_until:
+            return
+        used = int(used) if used is not None else 0
+        if self.lease is not None:
+            _, self.used, self.banned_until = await asyncio.to_thread(self.lease.observe, window, used, banned_until)
+        else:
+            self.used = max(self.used, used)
+            self.banned_until = max(self.banned_until, banned_until)
+
+
+# --- نسخة واحدة لكل منصة داخل العملية ---
+_governors = {}
+
+
+def get_governor(name):
+    """كل عملاء المنصة نفسها في العملية يتشاركون نفس الميزانية."""
+    if name not in _governors:
+        _governors[name] = WeightGovernor(name, **GOVERNOR_DEFAULTS.get(name, {}))
+    return _governors[name]